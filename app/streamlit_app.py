@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import json
+import time
+
 import requests
 import streamlit as st
 
 import os
 
 API_BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
+LOAD_POLL_TIMEOUT = float(os.getenv("LOAD_POLL_TIMEOUT", "600"))  # load 작업 polling 최대 대기(초)
 
 
 st.set_page_config(page_title="DART RAG Agent Demo (iM뱅크)", layout="wide")
@@ -46,6 +50,7 @@ if st.button("🔍 공시 검색"):
 
     items = data.get("items", [])
     st.session_state.search_items = items
+    st.session_state.search_corp = {"corp_code": data.get("corp_code", ""), "corp_name": corp_name}
     st.success(f"검색 결과: {len(items)}건")
     if len(items) == 0:
          st.warning("검색 결과가 0건입니다. 날짜 범위를 넓혀보세요.")
@@ -62,13 +67,44 @@ if items:
     sel = items[sel_idx]
 
     if st.button("📥 선택 공시 로드(다운로드/파싱/인덱싱)"):
+        # load는 백그라운드 작업: job_id를 바로 받고 단계별 진행률을 polling
         res = requests.post(
             f"{API_BASE}/disclosures/load",
-            json={"rcept_no": sel["rcept_no"], "report_nm": sel["report_nm"]},
-            timeout=180,
+            json={
+                "rcept_no": sel["rcept_no"],
+                "report_nm": sel["report_nm"],
+                "rcept_dt": sel.get("rcept_dt", ""),
+                **st.session_state.get("search_corp", {}),
+                # 브라우저 세션마다 백엔드 세션 하나 (다른 사용자의 load와 섞이지 않음)
+                "session_id": st.session_state.get("api_session_id"),
+            },
+            timeout=30,
         )
         res.raise_for_status()
-        loaded = res.json()
+        job = res.json()
+        if not job.get("ok"):
+            st.error(job.get("message", "load failed"))
+            st.stop()
+
+        stage_names = {"download": "다운로드", "extract": "압축해제", "parse": "파싱", "chunk": "청킹", "index": "인덱싱"}
+        bar = st.progress(0.0, text="대기 중...")
+        deadline = time.time() + LOAD_POLL_TIMEOUT
+        while True:
+            status = requests.get(f"{API_BASE}{job['status_url']}", timeout=10).json()
+            if status.get("status") in ("done", "error") or not status.get("ok") or time.time() > deadline:
+                break
+            stage = status.get("stage", "")
+            bar.progress(status.get("progress", 0.0), text=f"{stage_names.get(stage, '대기 중')}...")
+            time.sleep(0.5)
+
+        if status.get("status") != "done":
+            bar.empty()
+            st.error(f"로드 실패: {status.get('error') or status.get('message') or '시간 초과'}")
+            st.stop()
+
+        bar.progress(1.0, text=f"완료 ({status.get('elapsed_s', 0):.1f}s)")
+        loaded = status["result"]
+        st.session_state.api_session_id = loaded.get("session_id")
         st.success(f"로드 완료: chunks={loaded.get('chunks')}")
         st.write("viewer:", loaded.get("viewer_url"))
         # 현재 로드된 공시를 session_state에 저장 (질문/리포트할 때 '지금 뭐로 하고 있는지' 표시용)
@@ -88,26 +124,100 @@ st.subheader("RAG Q&A (API)")
 q = st.text_input("질문을 입력하세요", value="총발행금액은 얼마야?")
 top_k = st.slider("Top-K Evidence", min_value=1, max_value=5, value=3)
 
+# 코퍼스 검색: 지금까지 load한 모든 공시에서 한 번에 검색
+use_corpus = st.checkbox("📚 로드된 전체 공시에서 검색 (코퍼스)", value=False)
+corpus_filters = {}
+if use_corpus:
+    f1, f2, f3, f4 = st.columns(4)
+    with f1:
+        corpus_filters["corp_name"] = st.text_input("회사명 필터", value="")
+    with f2:
+        corpus_filters["start_date"] = st.text_input("시작일 필터(YYYYMMDD)", value="")
+    with f3:
+        corpus_filters["end_date"] = st.text_input("종료일 필터(YYYYMMDD)", value="")
+    with f4:
+        corpus_filters["report_nm"] = st.text_input("보고서명 필터", value="")
+
+use_stream = st.checkbox("⚡ 스트리밍으로 답변 받기 (SSE)", value=True)
+
+
+def iter_sse(res: requests.Response):
+    """text/event-stream 응답 -> (event, data dict)"""
+    event, data_lines = "message", []
+    for line in res.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+def render_evidences(evidences: list[dict]):
+    st.markdown("### 📌 Evidence")
+    for ev in evidences:
+        if ev.get("table_id") is not None:
+            title = f"[{ev['sid']}] 표 table={ev['table_id']} row={ev['row']}"
+        else:
+            title = f"[{ev['sid']}] chunk_id={ev['chunk_id']} | score={ev['score']:.4f}"
+            if ev.get("section"):
+                title += f" | {ev['section']}"
+        if ev.get("rcept_no"):
+            title += f" | {ev.get('report_nm', '')} ({ev['rcept_no']})"
+        with st.expander(title, expanded=(ev["sid"] in ("S1", "T1"))):
+            st.write(ev["preview"])
+
+
 if st.button("🔎 근거 기반 답변 생성", type="primary"):
-    payload = {"question": q, "top_k": top_k}
-    res = requests.post(f"{API_BASE}/ask", json=payload, timeout=60)
-    res.raise_for_status()
-    data = res.json()
+    payload = {"question": q, "top_k": top_k, "session_id": st.session_state.get("api_session_id")}
+    if use_corpus:
+        payload["corpus"] = True
+        payload.update({k: v.strip() for k, v in corpus_filters.items() if v.strip()})
 
     col1, col2 = st.columns([1, 1], gap="large")
 
-    with col1:
-        st.markdown("### ✅ Answer")
-        st.code(data["answer"], language="markdown")
-        st.markdown("### 🔗 Viewer")
-        st.write(data["viewer_url"])
+    if use_stream:
+        # 근거는 LLM 호출 전에 먼저 오고, 답변은 토큰 단위로 이어 붙여서 갱신
+        with col1:
+            st.markdown("### ✅ Answer")
+            answer_box = st.empty()
+            viewer_box = st.empty()
+
+        answer = ""
+        with requests.post(f"{API_BASE}/ask/stream", json=payload, stream=True, timeout=60) as res:
+            res.raise_for_status()
+            for event, data in iter_sse(res):
+                if event == "evidences":
+                    with viewer_box.container():
+                        st.markdown("### 🔗 Viewer")
+                        st.write(data["viewer_url"])
+                    with col2:
+                        render_evidences(data["evidences"])
+                elif event == "token":
+                    answer += data["text"]
+                    answer_box.code(answer + "▌", language="markdown")
+                elif event == "done":
+                    answer = data["answer"]
+                elif event == "error":
+                    st.error(f"답변 생성 중 오류: {data.get('message')}")
+        answer_box.code(answer, language="markdown")
+    else:
+        res = requests.post(f"{API_BASE}/ask", json=payload, timeout=60)
+        res.raise_for_status()
+        data = res.json()
 
-    with col2:
-        st.markdown("### 📌 Evidence")
-        for ev in data["evidences"]:
-            title = f"[{ev['sid']}] chunk_id={ev['chunk_id']} | score={ev['score']:.4f}"
-            with st.expander(title, expanded=(ev["sid"] == "S1")):
-                st.write(ev["preview"])
+        with col1:
+            st.markdown("### ✅ Answer")
+            st.code(data["answer"], language="markdown")
+            st.markdown("### 🔗 Viewer")
+            st.write(data["viewer_url"])
+
+        with col2:
+            render_evidences(data["evidences"])
 
 
 
@@ -128,7 +238,11 @@ with st.expander("📌 Current Loaded Disclosure", expanded=True):
 st.write("버튼을 누르면 백엔드에서 리포트를 생성합니다 (data/reports에 저장).")
 
 if st.button("🧾 리포트 생성", type="secondary"):
-    res = requests.post(f"{API_BASE}/report", timeout=180)
+    res = requests.post(
+        f"{API_BASE}/report",
+        params={"session_id": st.session_state.get("api_session_id")},
+        timeout=180,
+    )
     res.raise_for_status()
     data = res.json()
 
@@ -7,45 +7,118 @@ uvicorn backend.main:app --reload --port 8000
 
 from __future__ import annotations
 
+import itertools
 import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
 
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 
 from scripts._rag_answer_with_citations import (
-    build_chunks,
-    build_bm25,
+    query_tokens,
     retrieve_topk,
     build_prompt,
     ask_llm,
+    ask_llm_stream,
 )
 
 from scripts._agent_generate_report import generate_report
+from scripts.dense_index import DenseIndex, embed_query, hybrid_enabled
+from scripts.index_manager import dense_of, index_manager
+from scripts.index_store import load_or_build_index
+from scripts.lexicon import lexicon, lookup_field
+from scripts.load_jobs import load_jobs
+from scripts.llm_cache import answer_cache
+from scripts.metrics import Timings, metrics, request_timings, timed, use_timings
+from scripts.profiler import ENABLED as PROFILING_ENABLED, authorized, profile_store, profiled, request_profile
+from scripts.doc_cache import document_cache
+from scripts.corp_index import get_corp_index
+from scripts.corpus_index import (
+    CorpusIndex,
+    DocMeta,
+    corpus_signature,
+    load_or_build_corpus_dense,
+    load_or_build_corpus_index,
+    read_doc_meta,
+    same_signature,
+    write_doc_meta,
+)
+from scripts.session_store import DocSession, new_session_id, session_store
+from scripts.table_store import field_answer, load_field_store
 
 from scripts.dart_service import (
+    CLEAN_DIR,
     find_corp_code,
     search_disclosures,
-    download_disclosure_zip,
-    extract_zip,
-    parse_first_xml_to_text,
+    load_disclosure_text,
 )
 
 app = FastAPI(title="DART RAG Agent API", version="0.1.0")
 
 ROOT = Path(__file__).resolve().parents[1]
 
-CURRENT_RCEPT_NO = None
-CURRENT_REPORT_NM = None
-CURRENT_TXT_PATH = None
-CURRENT_VIEWER_URL = None
+# "지금 어떤 공시로 질문 중인지"는 전역 변수가 아니라 요청마다 결정
+# - rcept_no를 직접 넘기거나, /disclosures/load가 돌려준 session_id를 넘김 (session_store)
+_RCEPT_NO = re.compile(r"^\d{14}$")
+
+# rcept_no별 청크 + BM25 + 필드 저장소는 index_manager가 메모리 예산(INDEX_CACHE_MAX_MB) 안에서 관리
+# (오래 안 쓴 공시는 메모리에서 내리고, 다시 조회하면 디스크 인덱스에서 자동으로 올림)
+
+# data/clean 전체를 묶은 코퍼스 인덱스 (처음 필요할 때 로드, 새 공시 load 시 무효화)
+# - 한 스레드만 만들고(_corpus_lock) 나머지는 기다렸다가 같은 스냅샷을 씀
+# - load가 끝날 때마다 세대(_corpus_gen)가 바뀜 -> 만드는 중에 바뀌었으면 다음 질의 때 다시 확인
+# - 다른 워커 / bulk_ingest가 쓴 문서도 반영되도록 CORPUS_CHECK_S(초)마다 data/clean 시그니처를 다시 잼
+#   (바뀐 게 새 문서뿐이면 새 문서 posting / 벡터만 이전 스냅샷 뒤에 붙임)
+@dataclass
+class CorpusSnapshot:
+    gen: int
+    index: CorpusIndex
+    dense: DenseIndex | None = None  # hybrid 검색용 코퍼스 벡터 (memmap, 같은 index의 청크 순서)
+
+
+_corpus: CorpusSnapshot | None = None
+_corpus_lock = threading.Lock()
+_corpus_gens = itertools.count(1)
+_corpus_gen = 0
+_corpus_checked = 0.0
+CORPUS_CHECK_S = float(os.getenv("CORPUS_CHECK_S", "2"))
+
+
+def use_hybrid(flag: bool | None) -> bool:
+    """요청에 hybrid 값이 없으면 HYBRID_RETRIEVAL 환경변수 기본값"""
+    return hybrid_enabled() if flag is None else flag
 
-_chunks_map = {}
-_bm25_map = {}
+
+def viewer_url_of(rcept_no: str) -> str:
+    return f"https://dart.fss.or.kr/dsaf001/main.do?rcpNo={rcept_no}"
+
+
+def resolve_document(rcept_no: str | None, session_id: str | None) -> DocSession | None:
+    """
+    요청이 가리키는 공시
+    - rcept_no가 있으면 그것 (data/clean에 txt가 있어야 함, 메타는 load 때 저장한 것)
+    - 없으면 session_id가 가리키는 공시
+    - 둘 다 없거나 못 찾으면 None
+    """
+    if rcept_no:
+        if not _RCEPT_NO.match(rcept_no):
+            return None
+        txt_path = CLEAN_DIR / f"{rcept_no}.txt"
+        if not txt_path.exists():
+            return None
+        meta = read_doc_meta(txt_path)
+        return DocSession(session_id or "", rcept_no, meta.report_nm, str(txt_path), viewer_url_of(rcept_no))
+    return session_store.get(session_id)
 
 
 
@@ -75,51 +148,155 @@ def disclosures_search(req: SearchRequest):
 
 
 
+@app.get("/corps/search")
+def corps_search(q: str, limit: int = 10):
+    """회사명/종목코드 후보 검색 (정확 일치 -> 부분 일치 순으로 랭킹)"""
+    hits = get_corp_index().search(q, limit=limit)
+    return {
+        "ok": True,
+        "query": q,
+        "items": [
+            {"corp_code": r.corp_code, "corp_name": r.corp_name, "stock_code": r.stock_code}
+            for r in hits
+        ],
+    }
+
+
+
 class LoadRequest(BaseModel):
     rcept_no: str
     report_nm: str
+    # 코퍼스 검색 필터용 메타 (search 결과에서 그대로 넘겨주면 됨)
+    rcept_dt: str = ""
+    corp_code: str = ""
+    corp_name: str = ""
+    # 이어서 쓸 세션 (없으면 새로 만들어서 응답으로 돌려줌)
+    session_id: str | None = None
+    # True면 예전처럼 요청 안에서 load를 끝까지 수행하고 결과를 바로 반환 (스크립트/테스트용)
+    wait: bool = False
+    debug: bool = False  # True면 결과에 단계별 소요 시간(debug.stages_ms) 포함
+
+
+@profiled("/disclosures/load")
+def run_load(req: LoadRequest, session_id: str, progress: Callable[[str], None]) -> dict[str, Any]:
+    """load 파이프라인 본체 (백그라운드 작업 / wait=True 공용)"""
+    with request_timings() as timings:
+        result = _run_load(req, session_id, progress)
+    if req.debug:
+        result["debug"] = timings.as_dict()
+    return result
+
+
+def _run_load(req: LoadRequest, session_id: str, progress: Callable[[str], None]) -> dict[str, Any]:
+
+    # 다운로드 -> 텍스트 변환 저장 (zip은 메모리에서 바로 읽음, 중간 파일 없음)
+    txt_path = load_disclosure_text(req.rcept_no, req.report_nm, progress=progress)
+
+    # 인덱싱 (rcept_no별 캐시, 디스크 인덱스가 유효하면 토큰화 생략)
+    chunks, bm25 = load_or_build_index(txt_path, progress=progress)
+    loaded = index_manager.put(req.rcept_no, txt_path, chunks, bm25, load_field_store(txt_path))
+    if hybrid_enabled():
+        dense_of(loaded)  # 청크 임베딩도 load 때 미리 (첫 질문이 임베딩을 기다리지 않도록)
+
+    # 코퍼스 검색용 메타 저장 -> 다음 코퍼스 질의 때 인덱스 재구성
+    write_doc_meta(txt_path, DocMeta(
+        rcept_no=req.rcept_no,
+        report_nm=req.report_nm,
+        rcept_dt=req.rcept_dt or req.rcept_no[:8],
+        corp_code=req.corp_code,
+        corp_name=req.corp_name,
+    ))
+    invalidate_corpus()
+
+    # 이 세션이 이후 /ask, /report에서 쓸 공시 (다른 사용자의 세션에는 영향 없음)
+    # (load가 끝난 뒤에 세션을 바꾸므로, 진행 중에는 기존 공시로 계속 질문 가능)
+    session = session_store.put(DocSession(
+        session_id=session_id,
+        rcept_no=req.rcept_no,
+        report_nm=req.report_nm,
+        txt_path=str(txt_path),
+        viewer_url=viewer_url_of(req.rcept_no),
+    ))
+
+    return {
+        "ok": True,
+        "message": "loaded",
+        "session_id": session.session_id,
+        "rcept_no": session.rcept_no,
+        "report_nm": session.report_nm,
+        "viewer_url": session.viewer_url,
+        "txt_path": session.txt_path,
+        "chunks": len(chunks),
+        "fields": len(loaded.fields or []),
+    }
 
 
 @app.post("/disclosures/load")
 def disclosures_load(req: LoadRequest):
-    global CURRENT_RCEPT_NO, CURRENT_REPORT_NM, CURRENT_TXT_PATH, CURRENT_VIEWER_URL
-
-    # 다운로드/압축해제
-    zip_path = download_disclosure_zip(req.rcept_no, req.report_nm)
-    extracted_dir = extract_zip(zip_path)
-
-    # 텍스트 변환 저장 (일단 최소 파서)
-    txt_path = parse_first_xml_to_text(extracted_dir, req.rcept_no)
-
-    # 인덱싱 (rcept_no별 캐시)
-    text = txt_path.read_text(encoding="utf-8", errors="ignore")
-    chunks = build_chunks(text)
-    bm25 = build_bm25(chunks)
-    _chunks_map[req.rcept_no] = chunks
-    _bm25_map[req.rcept_no] = bm25
+    """
+    load 작업을 백그라운드에 넣고 job_id를 바로 반환
+    - 진행 상황: GET /disclosures/load/{job_id} (단계 download/extract/parse/chunk/index)
+    - session_id는 지금 정해서 같이 돌려줌 (작업이 끝나면 이 세션이 새 공시를 가리킴)
+    """
+    if not _RCEPT_NO.match(req.rcept_no):
+        return {"ok": False, "message": "rcept_no는 14자리 숫자여야 합니다."}
 
-    CURRENT_RCEPT_NO = req.rcept_no
-    CURRENT_REPORT_NM = req.report_nm
-    CURRENT_TXT_PATH = str(txt_path)
-    CURRENT_VIEWER_URL = f"https://dart.fss.or.kr/dsaf001/main.do?rcpNo={req.rcept_no}"
+    session_id = req.session_id if session_store.valid_id(req.session_id) else new_session_id()
+    if req.wait:
+        # 요청 안에서 바로 돌려도 같은 공시의 백그라운드 작업과는 순서대로
+        with load_jobs.doc_lock(req.rcept_no):
+            return run_load(req, session_id, lambda stage: None)
 
+    job = load_jobs.submit(req.rcept_no, req.report_nm, lambda progress: run_load(req, session_id, progress))
     return {
         "ok": True,
-        "message": "loaded",
-        "rcept_no": CURRENT_RCEPT_NO,
-        "report_nm": CURRENT_REPORT_NM,
-        "viewer_url": CURRENT_VIEWER_URL,
-        "txt_path": CURRENT_TXT_PATH,
-        "chunks": len(chunks),
+        "message": "queued",
+        "job_id": job.job_id,
+        "session_id": session_id,
+        "rcept_no": req.rcept_no,
+        "status_url": f"/disclosures/load/{job.job_id}",
     }
 
 
+@app.get("/disclosures/load/{job_id}")
+def disclosures_load_status(job_id: str):
+    """load 작업 상태 (status: queued/running/done/error, 끝나면 result에 기존 load 응답)"""
+    job = load_jobs.get(job_id)
+    if job is None:
+        return {"ok": False, "message": "없는 job_id 입니다 (오래된 작업은 정리됨)."}
+    return {"ok": True, **job}
+
+
 
 
 # Request/Response Schemas
 class AskRequest(BaseModel):
     question: str
     top_k: int = 3
+    # 코퍼스 검색: corpus=True 이거나 필터가 하나라도 있으면 data/clean 전체에서 검색
+    corpus: bool = False
+    corp_code: str | None = None
+    corp_name: str | None = None
+    # YYYYMMDD (빈 문자열 = 조건 없음, 형식이 다르면 422)
+    start_date: str | None = Field(None, pattern=r"^(\d{8})?$")
+    end_date: str | None = Field(None, pattern=r"^(\d{8})?$")
+    report_nm: str | None = None   # 보고서명 부분일치 (예: 사업보고서)
+    no_cache: bool = False         # True면 답변 캐시를 건너뛰고 LLM 새로 호출
+    use_fields: bool = True        # 표 필드(총발행금액 등) 하나만 묻는 단순 조회 질문이면 검색/LLM 없이 바로 답
+    hybrid: bool | None = None     # BM25 + 임베딩 검색(RRF), None이면 HYBRID_RETRIEVAL 기본값
+    # 단일 공시 질문 대상: rcept_no를 직접 주거나, load 응답의 session_id (rcept_no 우선)
+    rcept_no: str | None = None
+    session_id: str | None = None
+    debug: bool = False            # True면 응답 debug 필드에 단계별 소요 시간/토큰 사용량
+
+    def corpus_filters(self) -> dict[str, str | None]:
+        return {
+            "corp_code": self.corp_code,
+            "corp_name": self.corp_name,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "report_nm": self.report_nm,
+        }
 
 
 class AskResponse(BaseModel):
@@ -128,6 +305,7 @@ class AskResponse(BaseModel):
     viewer_url: str
     answer: str
     evidences: list[dict[str, Any]]
+    debug: dict[str, Any] | None = None
 
 
 @app.get("/")
@@ -135,7 +313,7 @@ def root():
     return {
         "ok": True,
         "service": "DART RAG Agent API",
-        "endpoints": ["/health", "/disclosures/search", "/disclosures/load", "/ask", "/report"],
+        "endpoints": ["/health", "/corps/search", "/disclosures/search", "/disclosures/load", "/disclosures/load/{job_id}", "/ask", "/ask/stream", "/report", "/cache/stats", "/metrics", "/profiles"],
     }
 
 
@@ -144,86 +322,396 @@ def health():
     return {"ok": True}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    """LLM 답변 캐시 / 공시 원문 캐시 / 인덱스 메모리 캐시 카운터 (+ 금융 용어 사전 상태)"""
+    return {
+        "ok": True,
+        "llm_answer_cache": answer_cache.stats(),
+        "document_cache": document_cache.stats(),
+        "index_cache": index_manager.stats(),
+        "sessions": session_store.stats(),
+        "load_jobs": load_jobs.stats(),
+        "lexicon": lexicon.stats(),
+    }
 
-@app.post("/ask", response_model=AskResponse)
-def ask(req: AskRequest):
-    if not CURRENT_RCEPT_NO:
+
+
+def invalidate_corpus() -> None:
+    """새 공시 load 후: 다음 코퍼스 질의 때 다시 합침 (만드는 중인 스레드를 기다리지 않음)"""
+    global _corpus_gen
+    _corpus_gen = next(_corpus_gens)
+
+
+def get_corpus(hybrid: bool = False) -> CorpusSnapshot:
+    """코퍼스 인덱스 (+ hybrid면 같은 청크 목록으로 만든 dense) 스냅샷"""
+    global _corpus, _corpus_checked
+    with _corpus_lock:
+        snap = _corpus
+        now = time.monotonic()
+        if snap is None or snap.gen != _corpus_gen or now - _corpus_checked >= CORPUS_CHECK_S:
+            gen = _corpus_gen
+            _corpus_checked = now
+            signature = corpus_signature(CLEAN_DIR)
+            if snap is not None and same_signature(snap.index.signature, signature):
+                snap.gen = gen
+            else:
+                with timed("corpus_index"):
+                    index = load_or_build_corpus_index(CLEAN_DIR, base=snap.index if snap else None, signature=signature)
+                    dense = None
+                    if snap is not None and snap.dense is not None:
+                        # 이미 hybrid로 쓰던 스냅샷이면 새 문서 벡터만 붙여서 바로 교체
+                        dense = load_or_build_corpus_dense(CLEAN_DIR, index=index, prev_index=snap.index, prev_dense=snap.dense)
+                snap = _corpus = CorpusSnapshot(gen, index, dense)
+        if hybrid and snap.dense is None:
+            snap.dense = load_or_build_corpus_dense(CLEAN_DIR, index=snap.index)
+        return snap
+
+
+def prepare_corpus(req: AskRequest) -> tuple[dict[str, Any], str | None]:
+    """
+    data/clean 전체(코퍼스)에서 필터 + Top-k 검색
+    - 응답 상단의 rcept_no/report_name은 1순위 근거의 문서
+    """
+    hybrid = use_hybrid(req.hybrid)
+    snap = get_corpus(hybrid)
+    index, dense = snap.index, snap.dense if hybrid else None
+    q_vec = embed_query(req.question) if hybrid else None
+    hits = index.search(query_tokens(req.question), k=req.top_k, dense=dense, q_vec=q_vec, **req.corpus_filters())
+    if not hits:
         return {
             "rcept_no": "",
             "report_name": "",
             "viewer_url": "",
-            "answer": "먼저 공시를 검색하고 load 해주세요.",
+            "answer": "조건에 맞는 공시가 없습니다. 필터를 바꾸거나 공시를 먼저 load 해주세요.",
             "evidences": [],
-        }
+        }, None
 
-    chunks = _chunks_map.get(CURRENT_RCEPT_NO)
-    bm25 = _bm25_map.get(CURRENT_RCEPT_NO)
+    # LLM이 어느 공시의 근거인지 알 수 있도록 청크 앞에 문서 정보를 붙임
+    evidences = [
+        (idx, score, f"[{doc.report_nm} / rcept_no={doc.rcept_no} / {doc.rcept_dt}]\n{chunk}")
+        for idx, score, chunk, doc in hits
+    ]
+    prompt = build_prompt(req.question, evidences)
 
-    if chunks is None or bm25 is None:
+    top_doc = hits[0][3]
+    return {
+        "rcept_no": top_doc.rcept_no,
+        "report_name": top_doc.report_nm,
+        "viewer_url": viewer_url_of(top_doc.rcept_no),
+        "answer": "",
+        "evidences": [
+            {
+                "sid": f"S{rank}",
+                "chunk_id": idx,
+                "score": score,
+                "preview": chunk[:300] + ("..." if len(chunk) > 300 else ""),
+                "rcept_no": doc.rcept_no,
+                "report_nm": doc.report_nm,
+                "rcept_dt": doc.rcept_dt,
+                "corp_name": doc.corp_name,
+                "viewer_url": viewer_url_of(doc.rcept_no),
+            }
+            for rank, (idx, score, chunk, doc) in enumerate(hits, 1)
+        ],
+    }, prompt
+
+
+def prepare_answer(req: AskRequest) -> tuple[dict[str, Any], str | None]:
+    """
+    검색(Top-k 근거)까지 수행하고 (응답 본문, LLM 프롬프트)를 반환
+    - 프롬프트가 None이면 LLM 호출 없이 응답 본문의 answer(안내 메시지)를 그대로 씀
+    - /ask 와 /ask/stream 이 공유
+    """
+    if req.corpus or any(req.corpus_filters().values()):
+        return prepare_corpus(req)
+
+    doc = resolve_document(req.rcept_no, req.session_id)
+    if doc is None:
         return {
-            "rcept_no": CURRENT_RCEPT_NO,
-            "report_name": CURRENT_REPORT_NM or "",
-            "viewer_url": CURRENT_VIEWER_URL or "",
-            "answer": "인덱스가 없습니다. 공시를 다시 load 해주세요.",
+            "rcept_no": req.rcept_no or "",
+            "report_name": "",
+            "viewer_url": "",
+            "answer": "먼저 공시를 검색하고 load 한 뒤, rcept_no 또는 session_id를 함께 보내주세요.",
             "evidences": [],
-        }
+        }, None
+
+    loaded = index_manager.get(doc.rcept_no)
 
-    evidences = retrieve_topk(bm25, chunks, req.question, k=req.top_k)
+    if loaded is None:
+        return {
+            "rcept_no": doc.rcept_no,
+            "report_name": doc.report_nm,
+            "viewer_url": doc.viewer_url,
+            "answer": "인덱스가 없습니다. 공시를 다시 load 해주세요.",
+            "evidences": [],
+        }, None
+
+    chunks, bm25, fields = loaded.chunks, loaded.bm25, loaded.fields
+
+    # 표에서 뽑아 둔 필드 하나만 묻는 단순 조회 질문이면 BM25/LLM 생략 (조건이 붙은 질문은 검색 + LLM)
+    label = lookup_field(req.question) if req.use_fields and fields is not None else None
+    if label is not None:
+        with timed("fields"):
+            hit = field_answer(fields, label)
+        if hit is not None:
+            answer, field_evidences = hit
+            return {
+                "rcept_no": doc.rcept_no,
+                "report_name": doc.report_nm,
+                "viewer_url": doc.viewer_url,
+                "answer": answer,
+                "evidences": field_evidences,
+            }, None
+
+    dense = dense_of(loaded) if use_hybrid(req.hybrid) else None
+    evidences = retrieve_topk(bm25, chunks, req.question, k=req.top_k, dense=dense)
     prompt = build_prompt(req.question, evidences)
-    answer = ask_llm(prompt)
 
     return {
-        "rcept_no": CURRENT_RCEPT_NO,
-        "report_name": CURRENT_REPORT_NM or "",
-        "viewer_url": CURRENT_VIEWER_URL or "",
-        "answer": answer,
+        "rcept_no": doc.rcept_no,
+        "report_name": doc.report_nm,
+        "viewer_url": doc.viewer_url,
+        "answer": "",
         "evidences": [
             {
                 "sid": f"S{rank}",
                 "chunk_id": idx,
                 "score": score,
-                "preview": chunk[:300] + ("..." if len(chunk) > 300 else ""),
+                "preview": chunks.preview(idx),
+                # 원문 txt 기준 문자 위치 (뷰어 하이라이트용)
+                **dict(zip(("start", "end", "section"), chunks.span(idx))),
             }
-            for rank, (idx, score, chunk) in enumerate(evidences, 1)
+            for rank, (idx, score, _) in enumerate(evidences, 1)
         ],
-    }
+    }, prompt
+
+
+@app.post("/ask", response_model=AskResponse)
+@profiled("/ask")
+def ask(req: AskRequest):
+    with request_timings() as timings:
+        body, prompt = prepare_answer(req)
+        if prompt is not None:
+            body["answer"] = ask_llm(prompt, use_cache=not req.no_cache)
+    if req.debug:
+        body["debug"] = timings.as_dict()
+    return body
+
+
+def sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ask/stream")
+def ask_stream(req: AskRequest):
+    """
+    Server-Sent Events 버전의 /ask
+    - event: evidences -> 검색 결과(근거)를 LLM 호출 전에 먼저 보냄
+    - event: token     -> LLM 토큰이 생성되는 대로 {"text": ...}
+    - event: done      -> 최종 answer 전체
+    - event: error     -> 스트리밍 도중 LLM 오류
+    """
+    timings = Timings()
+    with use_timings(timings):
+        body, prompt = prepare_answer(req)
+
+    def done(answer: str) -> str:
+        data = {"answer": answer}
+        if req.debug:
+            data["debug"] = timings.as_dict()
+        return sse("done", data)
+
+    def events():
+        meta = {k: v for k, v in body.items() if k != "answer"}
+        yield sse("evidences", meta)
+
+        if prompt is None:
+            yield sse("token", {"text": body["answer"]})
+            yield done(body["answer"])
+            return
+
+        parts = []
+        stream = ask_llm_stream(prompt, use_cache=not req.no_cache)
+        try:
+            while True:
+                # 제너레이터 한 스텝씩만 타이밍 컨텍스트 안에서 실행 (yield를 넘어 컨텍스트를 걸치지 않음)
+                with use_timings(timings):
+                    delta = next(stream, None)
+                if delta is None:
+                    break
+                parts.append(delta)
+                yield sse("token", {"text": delta})
+        except Exception as e:
+            yield sse("error", {"message": str(e)})
+            return
+        yield done("".join(parts))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 
 
 @app.post("/report")
-def report():
+@profiled("/report")
+def report(
+    rcept_no: str | None = None,
+    session_id: str | None = None,
+    no_cache: bool = False,
+    use_fields: bool = True,
+    hybrid: bool | None = None,
+    debug: bool = False,
+):
     """
     리포트 생성 → 생성된 결과(MD/JSON)를 바로 반환
+    - ?rcept_no=... 또는 ?session_id=... 로 대상 공시 지정 (rcept_no 우선)
+    - ?no_cache=true 면 답변 캐시를 건너뛰고 LLM 새로 호출
+    - ?use_fields=false 면 표 필드 조회 없이 모든 문항을 검색 + LLM으로
+    - ?hybrid=true 면 검색을 BM25 + 임베딩(RRF)으로 (기본: HYBRID_RETRIEVAL)
+    - ?debug=true 면 응답 debug 필드에 단계별 소요 시간/토큰 사용량
     """
-    if not CURRENT_RCEPT_NO:
-        return {"ok": False, "message": "먼저 공시를 검색하고 load 해주세요."}
+    with request_timings() as timings:
+        body = _report(rcept_no, session_id, no_cache, use_fields, use_hybrid(hybrid))
+    if debug:
+        body["debug"] = timings.as_dict()
+    return body
 
-    # ✅ 리포트 생성 (선택된 공시 기준)
-    payload = generate_report(
-        rcept_no=CURRENT_RCEPT_NO,
-        report_nm=CURRENT_REPORT_NM or "",
-        txt_path=CURRENT_TXT_PATH,
-        viewer_url=CURRENT_VIEWER_URL or "",
-    )
 
-    # ✅ generate_report()가 저장한 경로를 그대로 사용 (glob 필요 없음)
-    md_path = Path(payload["saved"]["md"])
-    json_path = Path(payload["saved"]["json"])
+def _report(rcept_no: str | None, session_id: str | None, no_cache: bool, use_fields: bool, hybrid: bool) -> dict[str, Any]:
+    doc = resolve_document(rcept_no, session_id)
+    if doc is None:
+        return {"ok": False, "message": "먼저 공시를 검색하고 load 한 뒤, rcept_no 또는 session_id를 함께 보내주세요."}
+
+    # ✅ 리포트 생성 (요청이 가리키는 공시 기준)
+    # - load 때 올려 둔 인덱스(청크/BM25/필드)를 그대로 넘김 -> 재청킹/재인덱싱 없음
+    # - 파일 저장은 백그라운드, 응답은 메모리에서 렌더링한 MD/JSON 그대로
+    loaded = index_manager.get(doc.rcept_no)
+    if loaded is None:
+        return {"ok": False, "message": "인덱스가 없습니다. 공시를 다시 load 해주세요."}
 
-    md_text = md_path.read_text(encoding="utf-8")
-    json_text = json_path.read_text(encoding="utf-8") if json_path.exists() else None
+    payload = generate_report(
+        rcept_no=doc.rcept_no,
+        report_nm=doc.report_nm,
+        txt_path=loaded.txt_path,
+        viewer_url=doc.viewer_url,
+        use_cache=not no_cache,
+        use_fields=use_fields,
+        chunks=loaded.chunks,
+        bm25=loaded.bm25,
+        fields=loaded.fields,
+        dense=dense_of(loaded) if hybrid else None,
+        background_save=True,
+    )
 
     return {
         "ok": True,
         "message": "Report generated",
         "rcept_no": payload["rcept_no"],
         "viewer_url": payload["viewer"],
-        "md_filename": md_path.name,
-        "md_text": md_text,
-        "json_filename": json_path.name if json_path.exists() else None,
-        "json_text": json_text,
+        "md_filename": Path(payload["saved"]["md"]).name,
+        "md_text": payload["md_text"],
+        "json_filename": Path(payload["saved"]["json"]).name,
+        "json_text": payload["json_text"],
     }
 
 
 
+
+# 지표 (Prometheus 텍스트 포맷)
+def _cache_samples():
+    """다른 모듈이 들고 있는 캐시/작업 카운터를 /metrics 때 읽어서 내보냄"""
+    llm = answer_cache.stats()
+    for event in ("mem_hits", "disk_hits", "misses", "bypassed", "evictions"):
+        yield "llm_cache_events_total", "counter", {"event": event}, llm.get(event, 0)
+
+    doc = document_cache.stats()
+    for event in ("hits", "misses", "corrupt", "evictions"):
+        yield "document_cache_events_total", "counter", {"event": event}, doc.get(event, 0)
+    yield "document_cache_bytes", "gauge", {}, doc.get("bytes", 0)
+
+    idx = index_manager.stats()
+    for event in ("hits", "reloads", "not_found", "evictions"):
+        yield "index_cache_events_total", "counter", {"event": event}, idx[event]
+    yield "index_cache_resident", "gauge", {}, idx["resident"]
+    yield "index_cache_resident_bytes", "gauge", {}, idx["resident_bytes"]
+
+    jobs = load_jobs.stats()
+    for state in ("queued", "running"):
+        yield "load_jobs", "gauge", {"state": state}, jobs[state]
+    for state in ("done", "error"):
+        yield "load_jobs_finished_total", "counter", {"state": state}, jobs[state]
+
+
+metrics.register_collector(_cache_samples)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """단계별 latency 히스토그램 + LLM 토큰/답변 카운터 + 캐시 카운터"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+
+
+# 요청 프로파일링 (PROFILE_TOKEN을 설정했을 때만)
+# - X-Profile: 1 (또는 ?profile=1) + X-Profile-Token (또는 ?profile_token=) 이 맞는 요청만 cProfile로 실행
+# - 응답 헤더 X-Profile-Id -> GET /profiles/{profile_id}
+# - 백그라운드 load는 작업이 끝날 때 저장됨 (POST 응답 시점에는 아직 없을 수 있음)
+PROFILED_PATHS = {"/ask", "/report", "/disclosures/load"}
+
+
+def _profile_token(request: Request) -> str | None:
+    return request.headers.get("x-profile-token") or request.query_params.get("profile_token")
+
+
+if PROFILING_ENABLED:
+    # 꺼져 있으면 미들웨어 자체를 등록하지 않음 -> 일반 요청 경로에 추가 비용 없음
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        flag = request.headers.get("x-profile") or request.query_params.get("profile")
+        if (
+            not flag
+            or flag.lower() in ("0", "false")
+            or request.url.path not in PROFILED_PATHS
+            or not authorized(_profile_token(request))
+        ):
+            return await call_next(request)
+
+        # 여기서 정한 컨텍스트가 엔드포인트(스레드풀) / load 작업 스레드까지 이어짐
+        pr = request_profile()
+        response = await call_next(request)
+        response.headers["X-Profile-Id"] = pr.profile_id
+        return response
+
+
+@app.get("/profiles")
+def profiles_list(request: Request, endpoint: str | None = None, rcept_no: str | None = None, limit: int = 50):
+    """저장된 프로파일 목록 (최신순, endpoint / rcept_no로 필터)"""
+    if not authorized(_profile_token(request)):
+        return {"ok": False, "message": "프로파일링이 꺼져 있거나 토큰이 맞지 않습니다."}
+    return {"ok": True, "profiles": profile_store.list(endpoint=endpoint, rcept_no=rcept_no, limit=limit)}
+
+
+@app.get("/profiles/{profile_id}")
+def profiles_download(request: Request, profile_id: str, format: str = "prof"):
+    """
+    프로파일 하나
+    - format=prof (기본): pstats 파일 다운로드 (python -m pstats / snakeviz)
+    - format=text: 누적 시간 상위 50개 함수 표
+    - format=json: 메타 (endpoint / rcept_no / 소요 시간 / 상위 함수)
+    """
+    if not authorized(_profile_token(request)):
+        return {"ok": False, "message": "프로파일링이 꺼져 있거나 토큰이 맞지 않습니다."}
+
+    path = profile_store.path(profile_id)
+    if path is None:
+        return {"ok": False, "message": "없는 profile_id 입니다 (백그라운드 load는 작업이 끝나야 저장됨)."}
+    if format == "text":
+        return PlainTextResponse(profile_store.text(profile_id) or "")
+    if format == "json":
+        return {"ok": True, **json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))}
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
@@ -4,25 +4,31 @@
 목표:
 - OPENDART에서 corpCode.zip을 다운로드
 - 압축 해제해서 CORPCODE.xml 확보
-- 회사명으로 corp_code를 검색할 수 있도록 DataFrame으로 로드
+- CORPCODE.xml을 스트리밍 파싱해서 corp_codes.npz(컬럼 저장) + corp_codes.csv로 저장
 
 왜 이걸 먼저 하냐?
 - DART 대부분 API가 "corp_code(8자리)"를 요구함
 - "iM뱅크"는 공시 주체가 '지주/상장사'일 수 있어 회사명으로 검색해서 정확한 법인/지주 corp_code를 찾아야 함
 """
 
+import csv
 import os
+import resource
+import sys
+import time
 import zipfile
 from pathlib import Path
 
-import requests
-import pandas as pd
 from dotenv import load_dotenv
-from lxml import etree
 
 
 # 1. 경로/환경변수 세팅
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))  # python scripts/01_... 로 실행해도 scripts 패키지 import 가능
+
+from scripts.corp_index import CORP_STORE, CorpIndex, iter_corp_xml, read_corp_store, write_corp_store
+from scripts.dart_client import client_from_env
+
 DATA_DIR = ROOT / "data" / "corp_codes"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -37,15 +43,13 @@ if not API_KEY:
 
 
 # 2. corpCode.zip 다운로드
-url = "https://opendart.fss.or.kr/api/corpCode.xml"
-params = {"crtfc_key": API_KEY}
-
+# 공유 DART 클라이언트: 커넥션 재사용 + 속도 제한 + 일시 오류 재시도
 print("Downloading corpCode.zip ...")
-resp = requests.get(url, params=params, timeout=30)
-resp.raise_for_status()  # 네트워크/HTTP 에러면 즉시 예외 발생
+client = client_from_env(API_KEY)
+content = client.get_bytes("corpCode.xml", {}, timeout=60)  # 재시도 후에도 실패하면 예외 발생
 
 # zip 바이너리를 그대로 저장
-ZIP_PATH.write_bytes(resp.content)
+ZIP_PATH.write_bytes(content)
 print(f"Saved: {ZIP_PATH}")
 
 
@@ -67,29 +71,36 @@ print(f"Extracted: {XML_PATH}")
 
 
 
-# 4. XML을 DataFrame으로 로드 (회사명 검색용)
-print("Parsing XML to DataFrame ...")
-tree = etree.parse(str(XML_PATH))
-rows = []
+# 4. XML 스트리밍 파싱 -> 컬럼 저장(corp_codes.npz) + CSV
+# - etree.parse로 트리 전체를 올리지 않고 iterparse로 <list>마다 처리 후 비움
+# - 백엔드(corp_index)는 corp_codes.npz를 바로 로드 (CSV 재파싱 없음)
+# - CSV는 02 스크립트 등 pandas로 보는 용도로 같은 패스에서 함께 저장
+print("Parsing XML (iterparse) ...")
+out_csv = DATA_DIR / "corp_codes.csv"
+
+t0 = time.perf_counter()
+with out_csv.open("w", encoding="utf-8-sig", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["corp_code", "corp_name", "stock_code", "modify_date"])
+
+    def rows():
+        for row in iter_corp_xml(XML_PATH):
+            writer.writerow(row)
+            yield row
 
-# XML 구조: <result><list> ... </list></result> 형태
-for node in tree.xpath("//list"):
-    corp_code = node.findtext("corp_code", default="").strip()
-    corp_name = node.findtext("corp_name", default="").strip()
-    stock_code = node.findtext("stock_code", default="").strip()
-    modify_date = node.findtext("modify_date", default="").strip()
-    rows.append((corp_code, corp_name, stock_code, modify_date))
+    n_rows = write_corp_store(rows(), CORP_STORE)
+elapsed = time.perf_counter() - t0
 
-df = pd.DataFrame(rows, columns=["corp_code", "corp_name", "stock_code", "modify_date"])
-print(df.head())
+# ru_maxrss: Linux는 KB, macOS는 bytes 단위
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+peak_mb = peak / 1024 if sys.platform != "darwin" else peak / 2**20
+print(f"rows={n_rows:,} | parse+write {elapsed:.2f}s | peak RSS {peak_mb:.1f} MB")
+print(f"Saved store: {CORP_STORE} ({CORP_STORE.stat().st_size / 2**20:.1f} MB)")
+print(f"Saved CSV  : {out_csv}")
 
 # 회사명으로 빠르게 찾아보기 (예: iM, 아이엠, 대구은행, iM금융지주 등으로 시도)
-keywords = ["iM", "아이엠", "대구", "금융", "DGB"]
-mask = df["corp_name"].str.contains("|".join(keywords), case=False, na=False)
+index = CorpIndex(*read_corp_store(CORP_STORE))
 print("\n[Search preview]")
-print(df.loc[mask].head(30))
-
-# csv로 저장
-out_csv = DATA_DIR / "corp_codes.csv"
-df.to_csv(out_csv, index=False, encoding="utf-8-sig")
-print(f"\nSaved CSV: {out_csv}")
+for kw in ["iM", "아이엠", "대구", "금융", "DGB"]:
+    hits = index.search(kw, limit=5)
+    print(f"- {kw}: " + ", ".join(f"{r.corp_name}({r.corp_code})" for r in hits))
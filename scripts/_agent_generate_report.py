@@ -6,31 +6,36 @@
 - 답변/근거/출처링크를 "리포트"로 저장 (JSON + Markdown)
 
 실행:
-python scripts/_agent_generate_report.py
+python -m scripts._agent_generate_report
 """
 
 from __future__ import annotations
 
+import contextvars
 import os
-import re
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import List, Tuple
 
 from dotenv import load_dotenv
-from rank_bm25 import BM25Okapi
-from openai import OpenAI
+
+from scripts._rag_answer_with_citations import ask_llm, retrieve_topk
+from scripts.bm25_index import SparseBM25
+from scripts.chunker import ChunkStore
+from scripts.dense_index import DenseIndex
+from scripts.index_store import load_or_build_index
+from scripts.lexicon import lookup_field
+from scripts.table_store import FieldStore, field_answer, load_field_store
 
 
 
 # 1. 환경변수 / 경로
+# OpenAI 클라이언트는 rag 모듈과 같은 공유 클라이언트를 처음 LLM을 부를 때 만듦 (scripts/llm_client.py)
+# LLM_STUB=1 이면 OpenAI 없이 가짜 LLM으로 동작 (오프라인 테스트용)
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY를 다시 확인 바랍니다.")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 ROOT = Path(__file__).resolve().parents[1]
 
@@ -38,96 +43,21 @@ ROOT = Path(__file__).resolve().parents[1]
 
 
 # 2. 정규화/토큰화
-def normalize_fin_terms(s: str) -> str:
-    replacements = {
-        "신용평가 등급": "신용평가등급",
-        "상환 기일": "상환기일",
-        "발행 금액": "발행금액",
-        "총 발행금액": "총발행금액",
-        "인수 기관": "인수기관",
-    }
-    for a, b in replacements.items():
-        s = s.replace(a, b)
-    return s
-
-
-def tokenize_ko_fin(s: str) -> list[str]:
-    s = normalize_fin_terms(s)
-    s = s.lower()
-    s = re.sub(r"(\d),(\d)", r"\1\2", s)  # 100,000 -> 100000
-    tokens = re.findall(r"[가-힣]+|[a-zA-Z]+|\d+", s)
-
-    stop = {"입니다", "합니다", "관한", "사항", "보고서", "주식회사", "회사", "회차"}
-    tokens = [t for t in tokens if t not in stop and len(t) >= 2]
-    return tokens
-
-
-def to_query_keyword(q: str) -> str:
-    q = normalize_fin_terms(q)
-    rules = [
-        ("총발행금액", ["총발행금액", "발행금액", "발행 금액", "총 발행금액"]),
-        ("신용평가등급", ["신용평가등급", "신용평가 등급", "등급"]),
-        ("상환기일", ["상환기일", "상환 기일", "만기", "만기일"]),
-        ("인수기관", ["인수기관", "인수 기관", "주관사", "인수사"]),
-    ]
-    for kw, pats in rules:
-        for p in pats:
-            if p in q:
-                return kw
-    return q
-
+# normalize_fin_terms / tokenize_ko_fin은 scripts/tokenizer.py 공용 구현 사용 (미리 컴파일된 정규식, 단일 패스 정규화)
+# 질문 확장(대표 용어 / 관련 용어)은 scripts/lexicon.py (금융 용어 사전, rag 모듈과 같은 규칙)
 
 
 
 
 # 3. 공시용 청킹
-def split_by_markers(t: str) -> list[str]:
-    pattern = r"(?=^[ⅠⅡⅢⅣⅤⅥⅦⅧⅨⅩ]\.\s)|(?=^\d+\.\s)"
-    parts = re.split(pattern, t, flags=re.MULTILINE)
-    return [p.strip() for p in parts if p and p.strip()]
-
-
-def split_by_length(t: str, max_chars: int = 900, overlap: int = 120) -> list[str]:
-    t = t.strip()
-    if len(t) <= max_chars:
-        return [t]
-
-    out = []
-    start = 0
-    while start < len(t):
-        end = min(start + max_chars, len(t))
-        out.append(t[start:end])
-        start = end - overlap
-        if start < 0:
-            start = 0
-        if end == len(t):
-            break
-    return out
+# build_chunks는 scripts/chunker.py 공용 구현 사용 (rag 모듈과 같은 청크)
 
 
-def build_chunks(text: str) -> list[str]:
-    parts = split_by_markers(text)
-    chunks: list[str] = []
-    for p in parts:
-        chunks.extend(split_by_length(p, max_chars=900, overlap=120))
-    return chunks
-
 
 
 
 # 4. Retriever (BM25)
-def build_bm25(chunks: list[str]) -> BM25Okapi:
-    tokenized = [tokenize_ko_fin(c) for c in chunks]
-    return BM25Okapi(tokenized)
-
-
-def retrieve_topk(bm25: BM25Okapi, chunks: list[str], query: str, k: int = 3) -> list[tuple[int, float, str]]:
-    query = to_query_keyword(query)  # ✅ 검색 전에 키워드 축약
-    q_tok = tokenize_ko_fin(query)
-    scores = bm25.get_scores(q_tok)
-    top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-    return [(i, float(scores[i]), chunks[i]) for i in top_idx]
-
+# build_bm25 / retrieve_topk는 rag 모듈 구현을 그대로 사용 (같은 인덱스, 같은 질문 확장, 같은 hybrid 검색)
 
 
 
@@ -166,17 +96,9 @@ Citations: [S?]
     return prompt
 
 
-def ask_llm(prompt: str) -> str:
-    res = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You answer in Korean and follow the rules strictly."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.0,
-        max_tokens=350,
-    )
-    return res.choices[0].message.content
+# LLM 호출(캐시 / 지표 / stub / 토큰 사용량)은 rag 모듈의 ask_llm을 같이 씀, 리포트는 더 큰 모델 + 긴 답변
+LLM_MODEL = "gpt-4o"
+LLM_MAX_TOKENS = 350
 
 
 
@@ -190,97 +112,190 @@ QUESTIONS = [
     ("인수기관", "인수기관은 어디야?"),
 ]
 
+# 질문별 검색 + LLM 호출을 동시에 몇 개까지 돌릴지 (OpenAI rate limit 고려해서 조절)
+REPORT_CONCURRENCY = int(os.getenv("REPORT_CONCURRENCY", "4"))
 
-def generate_report(
+
+def answer_question(
+    bm25: SparseBM25,
+    chunks: ChunkStore | list[str],
+    label: str,
+    q: str,
     *,
-    rcept_no: str,
-    report_nm: str,
-    txt_path: str | Path,
-    viewer_url: str,
+    use_cache: bool = True,
+    fields: FieldStore | None = None,
+    dense: DenseIndex | None = None,
 ) -> dict:
-    """
-    ✅ 선택된 공시(rcept_no) 기준으로 리포트를 생성하고,
-    JSON/MD를 저장한 뒤, payload를 반환.
-    """
-    txt_path = Path(txt_path)
-    if not txt_path.exists():
-        raise FileNotFoundError(f"텍스트 파일이 없습니다: {txt_path}")
-
-    text = txt_path.read_text(encoding="utf-8", errors="ignore")
-    chunks = build_chunks(text)
-    bm25 = build_bm25(chunks)
-
-    results = []
-    for label, q in QUESTIONS:
-        evidences = retrieve_topk(bm25, chunks, q, k=3)
-        prompt = build_prompt(q, evidences)
-        answer = ask_llm(prompt)
-
-        results.append({
+    # 질문이 label 필드 하나만 묻는 단순 조회면 표 필드로 답하고 검색/LLM 생략 (/ask와 같은 기준)
+    hit = field_answer(fields, label) if fields is not None and lookup_field(q) == label else None
+    if hit is not None:
+        answer, evidences = hit
+        return {
             "label": label,
             "question": q,
             "answer": answer,
             "sources": [
-                {
-                    "sid": f"S{rank}",
-                    "chunk_id": idx,
-                    "score": score,
-                }
-                for rank, (idx, score, _) in enumerate(evidences, 1)
+                {"sid": ev["sid"], "chunk_id": -1, "score": ev["score"], "table_id": ev["table_id"], "row": ev["row"]}
+                for ev in evidences
             ],
-        })
-
-    out_dir = ROOT / "data" / "reports"
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    json_path = out_dir / f"{rcept_no}_report_{ts}.json"
-    md_path = out_dir / f"{rcept_no}_report_{ts}.md"
-
-    payload = {
-        "rcept_no": rcept_no,
-        "report_name": report_nm,
-        "viewer": viewer_url,
-        "items": results,
-        "saved": {
-            "json": str(json_path),
-            "md": str(md_path),
         }
+
+    evidences = retrieve_topk(bm25, chunks, q, k=3, dense=dense)
+    prompt = build_prompt(q, evidences)
+    answer = ask_llm(prompt, use_cache=use_cache, model=LLM_MODEL, max_tokens=LLM_MAX_TOKENS)
+
+    return {
+        "label": label,
+        "question": q,
+        "answer": answer,
+        "sources": [
+            {
+                "sid": f"S{rank}",
+                "chunk_id": idx,
+                "score": score,
+            }
+            for rank, (idx, score, _) in enumerate(evidences, 1)
+        ],
     }
 
-    json_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
 
+def render_markdown(payload: dict) -> str:
     md_lines = []
     md_lines.append("# iM뱅크 공시 요약 리포트")
     md_lines.append("")
-    md_lines.append(f"- 문서: **{report_nm}**")
-    md_lines.append(f"- rcept_no: `{rcept_no}`")
-    md_lines.append(f"- 원문 링크: {viewer_url}")
+    md_lines.append(f"- 문서: **{payload['report_name']}**")
+    md_lines.append(f"- rcept_no: `{payload['rcept_no']}`")
+    md_lines.append(f"- 원문 링크: {payload['viewer']}")
     md_lines.append("")
     md_lines.append("---")
     md_lines.append("")
 
-    for item in results:
+    for item in payload["items"]:
         md_lines.append(f"## {item['label']}")
         md_lines.append("")
         md_lines.append(item["answer"].strip())
         md_lines.append("")
         md_lines.append("Sources:")
         for s in item["sources"]:
-            md_lines.append(f"- [{s['sid']}] chunk_id={s['chunk_id']} (score={s['score']:.4f})")
+            if "table_id" in s:
+                md_lines.append(f"- [{s['sid']}] table={s['table_id']} row={s['row']}")
+            else:
+                md_lines.append(f"- [{s['sid']}] chunk_id={s['chunk_id']} (score={s['score']:.4f})")
         md_lines.append("")
         md_lines.append("---")
         md_lines.append("")
 
-    md_path.write_text("\n".join(md_lines), encoding="utf-8")
+    return "\n".join(md_lines)
+
+
+def _write_text(path: Path, text: str) -> None:
+    # 쓰는 중인 파일이 보이지 않도록 임시파일 -> replace
+    # (같은 리포트를 동시에 저장해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름)
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
 
+
+def save_report(json_path: Path, json_text: str, md_path: Path, md_text: str) -> None:
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_text(json_path, json_text)
+    _write_text(md_path, md_text)
     print("Saved JSON:", json_path)
     print("Saved MD  :", md_path)
 
-    return payload
+
+# 리포트 파일 저장은 응답과 상관없으므로 백그라운드 1개 스레드에서 순서대로
+_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-save")
+
+
+def _save_in_background(*args) -> None:
+    def run():
+        try:
+            save_report(*args)
+        except OSError as e:
+            print(f"리포트 저장 실패: {e}")
+
+    _save_pool.submit(run)
+
+
+def generate_report(
+    *,
+    rcept_no: str,
+    report_nm: str,
+    txt_path: str | Path,
+    viewer_url: str,
+    max_workers: int | None = None,
+    use_cache: bool = True,
+    use_fields: bool = True,
+    chunks: ChunkStore | None = None,
+    bm25: SparseBM25 | None = None,
+    fields: FieldStore | None = None,
+    dense: DenseIndex | None = None,
+    background_save: bool = False,
+) -> dict:
+    """
+    ✅ 선택된 공시(rcept_no) 기준으로 리포트를 생성하고,
+    JSON/MD를 저장한 뒤, payload를 반환.
+    - QUESTIONS는 스레드 풀에서 동시에 실행 (max_workers, 기본 REPORT_CONCURRENCY)
+    - 결과 순서는 QUESTIONS 순서 그대로
+    - use_cache=False 면 답변 캐시를 건너뛰고 LLM을 새로 호출
+    - txt 옆에 표 필드 저장소(<rcept_no>.fields.npz)가 있으면 해당 질문은 필드 조회로 답함 (use_fields)
+    - dense가 있으면 검색은 BM25 + 임베딩 hybrid (scripts/dense_index.py)
+    - chunks/bm25/fields: 이미 올라와 있는 인덱스(백엔드 index_manager)를 그대로 씀
+      없으면 디스크 인덱스(<rcept_no>.bm25.npz)를 읽고, 그것도 없을 때만 새로 빌드
+    - payload["md_text"] / payload["json_text"]: 렌더링 결과 (파일을 다시 읽을 필요 없음)
+    - background_save=True 면 파일 저장은 백그라운드에서 (응답이 디스크 쓰기를 기다리지 않음)
+    """
+    txt_path = Path(txt_path)
+    if chunks is None or bm25 is None:
+        if not txt_path.exists():
+            raise FileNotFoundError(f"텍스트 파일이 없습니다: {txt_path}")
+        chunks, bm25 = load_or_build_index(txt_path)
+    if use_fields and fields is None:
+        fields = load_field_store(txt_path)
+    if not use_fields:
+        fields = None
+
+    workers = max(1, min(max_workers or REPORT_CONCURRENCY, len(QUESTIONS)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as pool:
+        # 작업마다 현재 컨텍스트를 복사해서 실행 -> 요청 단위 타이밍(metrics.request_timings)이 워커 스레드에도 모임
+        futures = [
+            pool.submit(contextvars.copy_context().run, answer_question, bm25, chunks, label, q,
+                        use_cache=use_cache, fields=fields, dense=dense)
+            for label, q in QUESTIONS
+        ]
+        # 입력 순서대로 결과를 모음 -> 리포트 항목 순서 유지
+        results = [f.result() for f in futures]
+
+    out_dir = ROOT / "data" / "reports"
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = out_dir / f"{rcept_no}_report_{ts}.json"
+    md_path = out_dir / f"{rcept_no}_report_{ts}.md"
+
+    payload = {
+        "rcept_no": rcept_no,
+        "report_name": report_nm,
+        "viewer": viewer_url,
+        "items": results,
+        "saved": {
+            "json": str(json_path),
+            "md": str(md_path),
+        }
+    }
+
+    json_text = json.dumps(payload, ensure_ascii=False, indent=2)
+    md_text = render_markdown(payload)
+
+    if background_save:
+        _save_in_background(json_path, json_text, md_path, md_text)
+    else:
+        save_report(json_path, json_text, md_path, md_text)
+
+    return {**payload, "md_text": md_text, "json_text": json_text}
 
 
-# ✅ CLI 실행도 가능하게 (로컬에서 python scripts/_agent_generate_report.py 할 때)
+# ✅ CLI 실행도 가능하게 (로컬에서 python -m scripts._agent_generate_report 할 때)
 def main():
     # 기본값은 "직접 실행"용 (백엔드에서는 generate_report()를 씀)
     rcept_no = os.getenv("RCEPT_NO", "").strip()
@@ -291,7 +306,7 @@ def main():
     if not (rcept_no and report_nm and txt_path and viewer_url):
         raise ValueError(
             "CLI로 실행하려면 환경변수 RCEPT_NO, REPORT_NM, TXT_PATH, VIEWER_URL이 필요합니다.\n"
-            "예) RCEPT_NO=... REPORT_NM=... TXT_PATH=... VIEWER_URL=... python scripts/_agent_generate_report.py"
+            "예) RCEPT_NO=... REPORT_NM=... TXT_PATH=... VIEWER_URL=... python -m scripts._agent_generate_report"
         )
 
     generate_report(
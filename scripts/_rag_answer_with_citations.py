@@ -12,129 +12,84 @@
 
 from __future__ import annotations
 
-import os
-import re
+import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 from dotenv import load_dotenv
-from rank_bm25 import BM25Okapi
-from openai import OpenAI
+
+from scripts.bm25_index import SparseBM25
+from scripts.chunker import ChunkStore, build_chunks
+from scripts.dense_index import DenseIndex, embed_query, hybrid_top_k
+from scripts.lexicon import query_terms
+from scripts.llm_cache import answer_cache
+from scripts.llm_client import get_openai_client
+from scripts.llm_stub import stub_answer, stub_enabled, stub_stream
+from scripts.metrics import metrics, record_llm_usage, timed
+from scripts.tokenizer import Vocabulary, tokenizer
 
 
 
 
 # 1. 환경변수 / 경로
+# OpenAI 클라이언트는 처음 LLM을 부를 때 만듦 (scripts/llm_client.py, 키 없이도 import 가능)
+# LLM_STUB=1 이면 OpenAI 없이 가짜 LLM으로 동작 (오프라인 테스트용)
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY를 다시 확인해 주세요")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 ROOT = Path(__file__).resolve().parents[1]
 RCEPT_NO = "20251127000739"
-TXT_PATH = ROOT / "data" / "clean" / f"{RCEPT_NO}.txt"
-
-if not TXT_PATH.exists():
-    raise FileNotFoundError(f"텍스트 파일이 없습니다: {TXT_PATH}")
+TXT_PATH = ROOT / "data" / "clean" / f"{RCEPT_NO}.txt"  # CLI(main) 전용 샘플 공시
 
 REPORT_NM = "증권발행실적보고서"  # 지금은 고정, 나중엔 메타에서 자동화
 
 
 
 # 2. 정규화/토큰화
-def normalize_fin_terms(s: str) -> str:
-    replacements = {
-        "신용평가 등급": "신용평가등급",
-        "상환 기일": "상환기일",
-        "발행 금액": "발행금액",
-        "총 발행금액": "총발행금액",
-        "인수 기관": "인수기관",
-    }
-    for a, b in replacements.items():
-        s = s.replace(a, b)
-    return s
-
-
-def tokenize_ko_fin(s: str) -> list[str]:
-    s = normalize_fin_terms(s)
-    s = s.lower()
-    s = re.sub(r"(\d),(\d)", r"\1\2", s)  # 100,000 -> 100000
-    tokens = re.findall(r"[가-힣]+|[a-zA-Z]+|\d+", s)
-
-    stop = {"입니다", "합니다", "관한", "사항", "보고서", "주식회사", "회사", "회차"}
-    tokens = [t for t in tokens if t not in stop and len(t) >= 2]
-    return tokens
+# normalize_fin_terms / tokenize_ko_fin은 scripts/tokenizer.py 공용 구현 사용 (미리 컴파일된 정규식, 단일 패스 정규화)
+# 질문 확장(대표 용어 / 관련 용어)은 scripts/lexicon.py (금융 용어 사전)
 
 
 
 
 
 # 3. 공시용 청킹(섹션 마커 + 길이)
-def split_by_markers(t: str) -> list[str]:
-    pattern = r"(?=^[ⅠⅡⅢⅣⅤⅥⅦⅧⅨⅩ]\.\s)|(?=^\d+\.\s)"
-    parts = re.split(pattern, t, flags=re.MULTILINE)
-    return [p.strip() for p in parts if p and p.strip()]
-
-
-def split_by_length(t: str, max_chars: int = 900, overlap: int = 120) -> list[str]:
-    t = t.strip()
-    if len(t) <= max_chars:
-        return [t]
+# build_chunks는 scripts/chunker.py 공용 구현 사용 (원문 + span, 청크 문자열은 필요할 때 생성)
 
-    out = []
-    start = 0
-    while start < len(t):
-        end = min(start + max_chars, len(t))
-        out.append(t[start:end])
-        start = end - overlap
-        if start < 0:
-            start = 0
-        if end == len(t):
-            break
-    return out
 
 
-def build_chunks(text: str) -> list[str]:
-    parts = split_by_markers(text)
-    chunks: list[str] = []
-    for p in parts:
-        chunks.extend(split_by_length(p, max_chars=900, overlap=120))
-    return chunks
-
 
 
+# 4. Retriever (BM25)
+@timed("bm25")
+def build_bm25(chunks: ChunkStore | list[str]) -> SparseBM25:
+    # 청크별 문자열 토큰 리스트 없이 토큰 id 배열로 바로 posting 생성
+    vocab = Vocabulary()
+    ids, offsets = tokenizer.encode_batch(list(chunks), vocab)
+    return SparseBM25.from_token_ids(ids, offsets, vocab.ids)
 
 
-# 4. Retriever (BM25)
-def build_bm25(chunks: list[str]) -> BM25Okapi:
-    tokenized = [tokenize_ko_fin(c) for c in chunks]
-    return BM25Okapi(tokenized)
-
-
-def to_query_keyword(q: str) -> str:
-    q = normalize_fin_terms(q)
-    # 질문을 키워드로 축약 (규칙은 계속 추가 가능)
-    rules = [
-        ("총발행금액", ["총발행금액", "발행금액", "발행 금액", "총 발행금액"]),
-        ("신용평가등급", ["신용평가등급", "신용평가 등급", "등급"]),
-        ("상환기일", ["상환기일", "상환 기일", "만기", "만기일"]),
-        ("인수기관", ["인수기관", "인수 기관", "주관사", "인수사"]),
-    ]
-    for kw, pats in rules:
-        for p in pats:
-            if p in q:
-                return kw
-    return q
+def query_tokens(query: str) -> dict[str, float]:
+    # 질문 토큰 + 용어 사전(scripts/lexicon.py)으로 찾은 대표 용어 / 관련 용어를 가중치와 함께
+    return query_terms(query)
 
 
-def retrieve_topk(bm25: BM25Okapi, chunks: list[str], query: str, k: int = 3) -> list[tuple[int, float, str]]:
-    query = to_query_keyword(query)
-    q_tok = tokenize_ko_fin(query)
-    scores = bm25.get_scores(q_tok)
-    top_idx = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-    return [(i, float(scores[i]), chunks[i]) for i in top_idx]
+@timed("retrieve")
+def retrieve_topk(
+    bm25: SparseBM25,
+    chunks: ChunkStore | list[str],
+    query: str,
+    k: int = 3,
+    *,
+    dense: DenseIndex | None = None,
+) -> list[tuple[int, float, str]]:
+    """dense가 있으면 BM25 + 임베딩 검색을 RRF로 합친 hybrid (score = RRF 점수)"""
+    q_tok = query_tokens(query)
+    if dense is None:
+        hits = bm25.top_k(q_tok, k=k)
+    else:
+        # 임베딩은 사전으로 확장하기 전 원래 질문으로 (말을 바꾼 질문을 잡는 쪽)
+        hits = hybrid_top_k(bm25, dense, q_tok, embed_query(query), k=k)
+    return [(i, score, chunks[i]) for i, score in hits]
 
 
 
@@ -182,22 +137,113 @@ Citations: [S?]
     return prompt
 
 
-def ask_llm(prompt: str) -> str:
-    res = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You answer in Korean and follow the rules strictly."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.0,
-        max_tokens=300,
-    )
-    return res.choices[0].message.content
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0.0
+SYSTEM_PROMPT = "You answer in Korean and follow the rules strictly."
+
+
+def llm_cache_key(prompt: str, *, model: str = LLM_MODEL) -> str:
+    # stub 답변이 실제 모델 캐시에 섞이지 않도록 모델명을 구분
+    name = "stub" if stub_enabled() else model
+    return answer_cache.make_key(name, SYSTEM_PROMPT + "\n" + prompt, LLM_TEMPERATURE)
+
+
+def ask_llm(prompt: str, *, use_cache: bool = True, model: str = LLM_MODEL, max_tokens: int = 300) -> str:
+    """
+    - use_cache=False 면 캐시 조회를 건너뛰고 새로 생성 (결과는 캐시에 갱신)
+    - model / max_tokens: 리포트 에이전트처럼 다른 모델로 부를 때 (캐시 키도 모델별)
+    """
+    key = llm_cache_key(prompt, model=model)
+    if use_cache:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            metrics.inc("llm_answers_total", source="cache")
+            return cached
+    else:
+        answer_cache.bypass()
+
+    metrics.inc("llm_answers_total", source="model")
+    client = get_openai_client()
+    with timed("llm"):
+        if client is None:
+            answer = stub_answer(prompt)
+        else:
+            res = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=LLM_TEMPERATURE,
+                max_tokens=max_tokens,
+            )
+            answer = res.choices[0].message.content
+            record_llm_usage(res.usage)
+
+    answer_cache.put(key, answer)
+    return answer
+
+
+def ask_llm_stream(prompt: str, *, use_cache: bool = True) -> Iterator[str]:
+    """
+    ask_llm의 스트리밍 버전: 토큰(delta)이 생성되는 대로 yield
+    - 첫 토큰까지의 시간(TTFT)이 사용자가 체감하는 지연이 됨
+    - 캐시 히트면 답변 전체를 한 번에 yield, 미스면 스트림이 끝난 뒤 캐시에 저장
+    """
+    key = llm_cache_key(prompt)
+    if use_cache:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            metrics.inc("llm_answers_total", source="cache")
+            yield cached
+            return
+    else:
+        answer_cache.bypass()
+
+    metrics.inc("llm_answers_total", source="model")
+    client = get_openai_client()
+    parts = []
+    t0 = time.perf_counter()
+    if client is None:
+        for delta in stub_stream(prompt):
+            if not parts:
+                metrics.observe("llm_first_token", time.perf_counter() - t0)
+            parts.append(delta)
+            yield delta
+    else:
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=LLM_TEMPERATURE,
+            max_tokens=300,
+            stream=True,
+            stream_options={"include_usage": True},  # 마지막 이벤트에 토큰 사용량
+        )
+        for event in stream:
+            if event.usage is not None:
+                record_llm_usage(event.usage)
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                if not parts:
+                    metrics.observe("llm_first_token", time.perf_counter() - t0)
+                parts.append(delta)
+                yield delta
+    metrics.observe("llm_stream", time.perf_counter() - t0)
+
+    # 끝까지 받은 경우에만 저장 (중간에 끊기면 부분 답변이 캐시되지 않도록)
+    answer_cache.put(key, "".join(parts))
 
 
 
 # 6. 실행
 def main():
+    if not TXT_PATH.exists():
+        raise FileNotFoundError(f"텍스트 파일이 없습니다: {TXT_PATH}")
     text = TXT_PATH.read_text(encoding="utf-8")
     chunks = build_chunks(text)
     bm25 = build_bm25(chunks)
@@ -0,0 +1,98 @@
+"""
+bench_bm25.py
+
+목표:
+- rank_bm25.BM25Okapi vs SparseBM25 비교 (빌드 시간 / 메모리 / 질의 시간)
+- 실제 공시 청크의 토큰 분포를 흉내 낸 합성 코퍼스로 10k / 100k / 1M 청크 규모 측정
+
+실행:
+python -m scripts.bench_bm25
+python -m scripts.bench_bm25 --sizes 10000 100000 --baseline-max 100000
+
+참고:
+- BM25Okapi는 1M 청크에서 수 GB 메모리를 쓰므로 기본값은 100k까지만 비교하고 그 이상은 skip
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from scripts.bm25_index import SparseBM25
+
+
+def make_corpus(n_docs: int, *, vocab_size: int = 50_000, doc_len: int = 120, seed: int = 7) -> list[list[str]]:
+    """Zipf 분포 단어로 합성 청크 생성 (900자 청크 ≈ 토큰 120개 정도)"""
+    rng = np.random.default_rng(seed)
+    vocab = [f"t{i}" for i in range(vocab_size)]
+    ids = np.minimum(rng.zipf(1.2, size=n_docs * doc_len), vocab_size) - 1
+    return [[vocab[j] for j in ids[i * doc_len:(i + 1) * doc_len]] for i in range(n_docs)]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, elapsed, current, peak
+
+
+def time_queries(fn, queries: list[list[str]]) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def baseline_topk(bm25: BM25Okapi, q: list[str], k: int = 3):
+    # 기존 retrieve_topk와 같은 방식 (get_scores + 전체 sort)
+    scores = bm25.get_scores(q)
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+
+
+def run(n_docs: int, *, baseline: bool, n_queries: int) -> None:
+    corpus = make_corpus(n_docs)
+    rnd = random.Random(0)
+    queries = [rnd.sample(corpus[rnd.randrange(n_docs)], 3) for _ in range(n_queries)]
+
+    print(f"\n=== {n_docs:,} chunks ===")
+
+    sparse, t_build, mem, peak = measure(lambda: SparseBM25.from_tokenized(corpus))
+    q_ms = time_queries(lambda q: sparse.top_k(q, k=3), queries)
+    print(f"SparseBM25 : build {t_build:7.2f}s | resident {mem / 2**20:8.1f} MiB "
+          f"(peak {peak / 2**20:8.1f}) | top-3 {q_ms:8.2f} ms/query")
+    del sparse
+
+    if not baseline:
+        print("BM25Okapi  : skipped (--baseline-max 로 조정)")
+        return
+
+    okapi, t_build, mem, peak = measure(lambda: BM25Okapi(corpus))
+    q_ms = time_queries(lambda q: baseline_topk(okapi, q), queries)
+    print(f"BM25Okapi  : build {t_build:7.2f}s | resident {mem / 2**20:8.1f} MiB "
+          f"(peak {peak / 2**20:8.1f}) | top-3 {q_ms:8.2f} ms/query")
+    del okapi
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--baseline-max", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+
+    for n in args.sizes:
+        run(n, baseline=n <= args.baseline_max, n_queries=args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+bench_corp_codes.py
+
+목표:
+- CORPCODE.xml 처리 방식 비교 (파싱 시간 / peak RSS / 다음 로드 시간)
+  - before: etree.parse + //list xpath + DataFrame + utf-8-sig CSV -> pd.read_csv로 다시 로드
+  - after : iterparse(노드 비우기) -> corp_codes.npz -> np.load로 로드
+- 각 방식은 별도 프로세스에서 돌려서 peak RSS가 섞이지 않게 함
+
+실행:
+python -m scripts.bench_corp_codes data/corp_codes/CORPCODE.xml
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_before(xml_path: str, out_dir: str, q: mp.Queue) -> None:
+    import pandas as pd
+    from lxml import etree
+
+    t0 = time.perf_counter()
+    tree = etree.parse(xml_path)
+    rows = []
+    for node in tree.xpath("//list"):
+        rows.append((
+            node.findtext("corp_code", default="").strip(),
+            node.findtext("corp_name", default="").strip(),
+            node.findtext("stock_code", default="").strip(),
+            node.findtext("modify_date", default="").strip(),
+        ))
+    df = pd.DataFrame(rows, columns=["corp_code", "corp_name", "stock_code", "modify_date"])
+    out_csv = Path(out_dir) / "corp_codes.csv"
+    df.to_csv(out_csv, index=False, encoding="utf-8-sig")
+    parse_s = time.perf_counter() - t0
+    parse_rss = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    pd.read_csv(out_csv, dtype=str).fillna("")
+    load_s = time.perf_counter() - t0
+
+    q.put(("before", parse_s, parse_rss, load_s, out_csv.stat().st_size))
+
+
+def run_after(xml_path: str, out_dir: str, q: mp.Queue) -> None:
+    from scripts.corp_index import iter_corp_xml, read_corp_store, write_corp_store
+
+    out = Path(out_dir) / "corp_codes.npz"
+    t0 = time.perf_counter()
+    write_corp_store(iter_corp_xml(Path(xml_path)), out)
+    parse_s = time.perf_counter() - t0
+    parse_rss = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    read_corp_store(out)
+    load_s = time.perf_counter() - t0
+
+    q.put(("after", parse_s, parse_rss, load_s, out.stat().st_size))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("xml_path")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for target in (run_before, run_after):
+            q = ctx.Queue()
+            p = ctx.Process(target=target, args=(args.xml_path, tmp, q))
+            p.start()
+            name, parse_s, rss, load_s, size = q.get()
+            p.join()
+            print(f"{name:6s} | parse+write {parse_s:6.2f}s | peak RSS {rss:7.1f} MB "
+                  f"| reload {load_s:6.3f}s | file {size / 2**20:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+bench_import.py
+
+목표:
+- 백엔드 콜드 스타트(import backend.main) 시간을 새 프로세스에서 여러 번 재서 예산과 비교
+  - API 키(OPENAI_API_KEY / DART_API_KEY) 없이 import 되는지도 같이 확인
+  - 기동 때 올라오면 안 되는 무거운 모듈(openai, pandas)이 import 됐는지 확인
+- 예산을 넘거나 import가 실패하면 종료 코드 1 (CI / 배포 전 확인용)
+- --top N: python -X importtime 기준 누적 시간이 큰 모듈 N개
+
+실행:
+python -m scripts.bench_import --repeat 5 --budget-ms 1000 --top 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+TARGET = "backend.main"
+LAZY_MODULES = ("openai", "pandas")  # 처음 쓸 때 import해야 하는 모듈
+
+_PROBE = f"""
+import sys, time
+t0 = time.perf_counter()
+import {TARGET}
+ms = (time.perf_counter() - t0) * 1000
+print(ms, ",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))
+"""
+
+
+def clean_env() -> dict[str, str]:
+    """키 / 스텁 없이 (테스트 환경처럼)"""
+    return {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "DART_API_KEY", "LLM_STUB")}
+
+
+def probe() -> tuple[float, list[str]]:
+    res = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=ROOT, env=clean_env(), capture_output=True, text=True
+    )
+    if res.returncode != 0:
+        raise RuntimeError(f"{TARGET} import 실패:\n{res.stderr}")
+    ms, _, loaded = res.stdout.strip().splitlines()[-1].partition(" ")
+    return float(ms), [m for m in loaded.split(",") if m]
+
+
+def top_modules(n: int) -> list[tuple[int, str]]:
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        cwd=ROOT, env=clean_env(), capture_output=True, text=True,
+    )
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")))
+    ap.add_argument("--top", type=int, default=0, help="누적 import 시간 상위 모듈 수")
+    args = ap.parse_args()
+
+    probe()  # 첫 실행은 .pyc 생성 비용이 섞이므로 제외
+    runs = [probe() for _ in range(args.repeat)]
+    times = [ms for ms, _ in runs]
+    loaded = sorted({m for _, mods in runs for m in mods})
+
+    median = statistics.median(times)
+    print(f"import {TARGET}: median {median:.0f}ms | min {min(times):.0f}ms | max {max(times):.0f}ms "
+          f"(n={args.repeat}, budget {args.budget_ms:.0f}ms)")
+
+    if args.top:
+        for us, name in top_modules(args.top):
+            print(f"  {us / 1000:8.1f}ms  {name}")
+
+    ok = True
+    if loaded:
+        print(f"FAIL: 기동 때 import되면 안 되는 모듈: {', '.join(loaded)}")
+        ok = False
+    if median > args.budget_ms:
+        print(f"FAIL: 예산 초과 ({median:.0f}ms > {args.budget_ms:.0f}ms)")
+        ok = False
+    if ok:
+        print("OK")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
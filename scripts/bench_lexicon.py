@@ -0,0 +1,88 @@
+"""
+bench_lexicon.py
+
+목표:
+- 금융 용어 사전이 커져도 질문 확장 비용이 그대로인지 확인
+  - 합성 용어 N개(별칭 포함)를 실제 사전 뒤에 붙여서 컴파일 -> 질문당 expand 시간
+  - 비교: 규칙을 하나씩 `alias in question`으로 훑는 기존 방식(to_query_keyword 규칙 루프)
+- 컴파일 시간(핫 리로드 때 드는 비용)도 같이 출력
+
+실행:
+python -m scripts.bench_lexicon --terms 5000 --repeat 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import yaml
+
+from scripts.lexicon import CompiledLexicon, _alias_key
+from scripts.tokenizer import LEXICON_PATH
+
+
+QUESTIONS = [
+    "총발행금액은 얼마야?",
+    "신용평가기관별 신용평가등급을 정리해줘.",
+    "만기가 언제야? 조기상환 조건도 알려줘",
+    "주관사와 인수수수료, 표면금리는 어떻게 돼?",
+    "이 회사가 이번에 조달한 자금은 어디에 쓰나요?",
+]
+
+_SYLLABLES = "가나다라마바사아자차카타파하거너더러머버서어저처커터퍼허고노도로모보소오조초"
+
+
+def synthetic_terms(n: int, seed: int = 0) -> list[dict]:
+    rnd = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(3, 6)))
+
+    return [{"term": word(), "aliases": [word() for _ in range(3)], "expand": [word()]} for _ in range(n)]
+
+
+def linear_keyword(rules: list[tuple[str, list[str]]], q: str) -> str:
+    """기존 방식: 규칙 순서대로 별칭을 하나씩 검사"""
+    for kw, pats in rules:
+        for p in pats:
+            if p in q:
+                return kw
+    return q
+
+
+def per_query_us(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        fn(QUESTIONS[i % len(QUESTIONS)])
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--terms", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    base = yaml.safe_load(LEXICON_PATH.read_text(encoding="utf-8")) or {}
+    for n in sorted({0, args.terms // 10, args.terms}):
+        data = {**base, "terms": [*(base.get("terms") or []), *synthetic_terms(n)]}
+
+        t0 = time.perf_counter()
+        lex = CompiledLexicon(data)
+        compile_ms = (time.perf_counter() - t0) * 1000
+
+        rules = [(e["term"], [_alias_key(a) for a in (e["term"], *e.get("aliases", []))]) for e in data["terms"]]
+        trie_us = per_query_us(lex.expand, args.repeat)
+        # 질문에 맞는 용어가 없으면 규칙을 끝까지 다 훑음 (사전이 클수록 느려지는 쪽)
+        linear_us = per_query_us(lambda q: linear_keyword(rules, _alias_key("x" + q[::-1])), args.repeat)
+
+        print(
+            f"terms={len(lex.entries):5d} aliases={lex.n_aliases:6d} | compile {compile_ms:7.1f}ms | "
+            f"expand(trie) {trie_us:6.1f}us/query | linear scan(miss) {linear_us:8.1f}us/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
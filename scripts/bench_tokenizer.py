@@ -0,0 +1,98 @@
+"""
+bench_tokenizer.py
+
+목표:
+- 기존 tokenize_ko_fin(str.replace 체인 + 매번 re/stop set) vs scripts/tokenizer.py 비교
+  - 토큰화 시간 (청크별 / batch / 프로세스 풀)
+  - BM25 빌드 시간 (문자열 토큰 리스트 + from_tokenized vs 토큰 id + from_token_ids)
+- 두 방식의 토큰 / 인덱스 배열이 완전히 같은지도 같이 확인
+
+실행:
+python -m scripts.bench_tokenizer data/clean/20251127000739.txt --repeat 200 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from scripts.bm25_index import SparseBM25
+from scripts.chunker import build_chunks
+from scripts.tokenizer import FIN_TERM_REPLACEMENTS, Vocabulary, tokenizer
+
+
+def legacy_normalize_fin_terms(s: str) -> str:
+    # 규칙 표는 사전 파일(normalize 섹션)과 같은 것, 적용 방식만 기존 str.replace 체인
+    for a, b in FIN_TERM_REPLACEMENTS.items():
+        s = s.replace(a, b)
+    return s
+
+
+def legacy_tokenize_ko_fin(s: str) -> list[str]:
+    s = legacy_normalize_fin_terms(s)
+    s = s.lower()
+    s = re.sub(r"(\d),(\d)", r"\1\2", s)
+    tokens = re.findall(r"[가-힣]+|[a-zA-Z]+|\d+", s)
+
+    stop = {"입니다", "합니다", "관한", "사항", "보고서", "주식회사", "회사", "회차"}
+    tokens = [t for t in tokens if t not in stop and len(t) >= 2]
+    return tokens
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def same_index(a: SparseBM25, b: SparseBM25) -> bool:
+    return list(a.vocab) == list(b.vocab) and all(
+        np.array_equal(getattr(a, k), getattr(b, k)) for k in ("indptr", "doc_ids", "tfs", "doc_len", "weights")
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("txt_path")
+    ap.add_argument("--repeat", type=int, default=1, help="원문 반복 횟수 (대형 보고서 흉내)")
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    text = "\n\n".join([Path(args.txt_path).read_text(encoding="utf-8")] * args.repeat)
+    chunks = list(build_chunks(text))
+    print(f"text {len(text) / 2**20:.1f} MB | chunks {len(chunks)}")
+
+    legacy, t_legacy = timed(lambda: [legacy_tokenize_ko_fin(c) for c in chunks])
+    single, t_single = timed(lambda: [tokenizer.tokenize(c) for c in chunks])
+    batch, t_batch = timed(lambda: tokenizer.tokenize_batch(chunks, workers=0))
+    tokenizer.tokenize_batch(chunks[:10], workers=args.workers)  # 풀 띄우는 비용은 제외
+    pooled, t_pool = timed(lambda: tokenizer.tokenize_batch(chunks, workers=args.workers))
+    assert legacy == single == batch == pooled, "토큰 결과가 다름"
+
+    print(f"tokenize legacy         {t_legacy:7.3f}s")
+    print(f"tokenize Tokenizer      {t_single:7.3f}s  (x{t_legacy / t_single:.2f})")
+    print(f"tokenize batch          {t_batch:7.3f}s  (x{t_legacy / t_batch:.2f})")
+    print(f"tokenize pool({args.workers})        {t_pool:7.3f}s  (x{t_legacy / t_pool:.2f})")
+
+    old, t_old = timed(lambda: SparseBM25.from_tokenized([legacy_tokenize_ko_fin(c) for c in chunks]))
+
+    def build_ids(workers: int) -> SparseBM25:
+        vocab = Vocabulary()
+        ids, offsets = tokenizer.encode_batch(chunks, vocab, workers=workers)
+        return SparseBM25.from_token_ids(ids, offsets, vocab.ids)
+
+    new, t_new = timed(lambda: build_ids(0))
+    new_pool, t_new_pool = timed(lambda: build_ids(args.workers))
+    assert same_index(old, new) and same_index(old, new_pool), "인덱스 배열이 다름"
+
+    print(f"bm25 build legacy       {t_old:7.3f}s")
+    print(f"bm25 build token ids    {t_new:7.3f}s  (x{t_old / t_new:.2f})")
+    print(f"bm25 build ids+pool({args.workers})  {t_new_pool:7.3f}s  (x{t_old / t_new_pool:.2f})")
+
+
+if __name__ == "__main__":
+    main()
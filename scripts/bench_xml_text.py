@@ -0,0 +1,117 @@
+"""
+bench_xml_text.py
+
+목표:
+- document.xml -> txt 변환 방식 비교 (변환 시간 / peak RSS / txt 크기 / 청크 수 / BM25 vocab·인덱스 크기 / load 시간)
+  - raw   : 기존 backend load 경로 (XML 원문을 태그째 txt로 복사)
+  - xpath : 03_parse_document_xml_to_text.py 방식 (etree.parse + //text())
+  - stream: scripts/xml_text.py (iterparse + 섹션/표 행 마커)
+- 각 방식은 별도 프로세스에서 돌려서 peak RSS가 섞이지 않게 함
+- --repeat N: 본문(BODY)을 N번 반복한 큰 XML을 만들어서 대형 사업보고서 메모리 비교
+
+실행:
+python -m scripts.bench_xml_text data/disclosures/20251127000739_증권발행실적보고서/20251127000739.xml
+python -m scripts.bench_xml_text <xml> --repeat 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from scripts.bench_corp_codes import peak_rss_mb
+
+
+def convert(method: str, xml_path: str) -> str:
+    if method == "raw":
+        return Path(xml_path).read_text(encoding="utf-8", errors="ignore")
+
+    if method == "xpath":
+        from lxml import etree
+
+        root = etree.parse(xml_path, etree.XMLParser(recover=True, huge_tree=True)).getroot()
+        text = "\n".join(t.strip() for t in root.xpath("//text()") if t and t.strip())
+        text = re.sub(r"[ \t]+", " ", text)
+        return re.sub(r"\n{3,}", "\n\n", text)
+
+    from scripts.xml_text import xml_to_text
+
+    return xml_to_text(xml_path)
+
+
+def run(method: str, xml_path: str, index_stats: bool, q: mp.Queue) -> None:
+    t0 = time.perf_counter()
+    text = convert(method, xml_path)
+    convert_s = time.perf_counter() - t0
+    rss = peak_rss_mb()
+
+    row = {"method": method, "convert_s": convert_s, "rss": rss, "txt_kb": len(text.encode("utf-8")) / 1024}
+    if index_stats:
+        # 백엔드 load 경로와 같은 청킹/인덱싱 (LLM 호출 없음)
+        import os
+
+        os.environ.setdefault("LLM_STUB", "1")
+        from scripts._rag_answer_with_citations import build_bm25
+        from scripts.chunker import build_chunks
+
+        t0 = time.perf_counter()
+        chunks = build_chunks(text)
+        bm25 = build_bm25(chunks)
+        row.update(
+            index_s=time.perf_counter() - t0,
+            chunks=len(chunks),
+            vocab=len(bm25.vocab),
+            index_kb=bm25.nbytes / 1024,
+        )
+    q.put(row)
+
+
+def make_repeated(xml_path: str, n: int, out: Path) -> str:
+    """BODY 안쪽을 n번 반복 (대형 보고서 흉내)"""
+    src = Path(xml_path).read_text(encoding="utf-8", errors="ignore")
+    m = re.search(r"(<BODY[^>]*>)(.*)(</BODY>)", src, flags=re.S)
+    if not m:
+        raise ValueError("BODY 태그를 찾지 못했습니다")
+    with out.open("w", encoding="utf-8") as f:
+        f.write(src[:m.end(1)])
+        for _ in range(n):
+            f.write(m.group(2))
+        f.write(src[m.start(3):])
+    return str(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("xml_path")
+    ap.add_argument("--repeat", type=int, default=1, help="본문 반복 횟수 (1이면 원본 그대로)")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = args.xml_path
+        if args.repeat > 1:
+            xml_path = make_repeated(xml_path, args.repeat, Path(tmp) / "repeated.xml")
+        print(f"xml: {Path(xml_path).stat().st_size / 2**20:.1f} MB")
+
+        # 큰 파일은 raw 인덱싱이 너무 오래 걸리므로 변환만 비교
+        index_stats = args.repeat <= 50
+        for method in ("raw", "xpath", "stream"):
+            q = ctx.Queue()
+            p = ctx.Process(target=run, args=(method, xml_path, index_stats, q))
+            p.start()
+            r = q.get()
+            p.join()
+            line = (f"{r['method']:6s} | convert {r['convert_s']:6.3f}s | peak RSS {r['rss']:7.1f} MB "
+                    f"| txt {r['txt_kb']:9.1f} KB")
+            if index_stats:
+                line += (f" | chunks {r['chunks']:5d} | vocab {r['vocab']:6d} "
+                         f"| index {r['index_kb']:8.1f} KB | index build {r['index_s']:6.3f}s")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
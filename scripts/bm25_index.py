@@ -0,0 +1,246 @@
+"""
+bm25_index.py
+
+목표:
+- rank_bm25.BM25Okapi를 대체하는 배열 기반 BM25 리트리버
+- 단어별 posting(doc_id, tf)을 CSR 배열(indptr/doc_ids/tfs)로 보관
+- posting마다 BM25 가중치를 미리 계산해두고, 질의는 희소 벡터 곱 1번으로 점수 계산
+- Top-k는 전체 정렬 대신 np.partition(부분 선택)
+
+왜?
+- BM25Okapi.get_scores는 질의 단어마다 모든 문서 dict를 파이썬 루프로 훑음
+- 문서마다 dict를 들고 있어서 청크 수가 커지면 메모리가 폭증
+- 점수 식(idf epsilon floor 포함)은 BM25Okapi와 동일하게 맞춤
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+
+
+# 토큰 리스트 또는 {토큰: 가중치} (scripts.lexicon.expand_query)
+Query = list[str] | dict[str, float]
+
+
+class SparseBM25:
+    """
+    posting 배열 레이아웃 (단어 t의 posting = [indptr[t], indptr[t+1]) 구간)
+    - doc_ids[p]: 문서(청크) 번호
+    - tfs[p]: 해당 문서에서의 단어 빈도
+    - weights[p]: idf[t] * tf*(k1+1) / (tf + k1*(1-b+b*dl/avgdl))
+    """
+
+    def __init__(
+        self,
+        vocab: dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab = vocab
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.tfs = np.asarray(tfs, dtype=np.int32)
+        self.doc_len = np.asarray(doc_len, dtype=np.int32)
+
+        self.corpus_size = int(len(self.doc_len))
+        self.avgdl = float(self.doc_len.mean()) if self.corpus_size else 0.0
+
+        self.idf = self._calc_idf()
+        self.weights = self._calc_weights()
+
+    @classmethod
+    def from_tokenized(cls, corpus: Iterable[list[str]], **params) -> "SparseBM25":
+        """토큰화된 청크 리스트 -> CSR posting"""
+        vocab: dict[str, int] = {}
+        term_col = array("i")
+        doc_col = array("i")
+        tf_col = array("i")
+        doc_len = array("i")
+
+        for d, tokens in enumerate(corpus):
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                tid = vocab.get(term)
+                if tid is None:
+                    tid = vocab[term] = len(vocab)
+                term_col.append(tid)
+                doc_col.append(d)
+                tf_col.append(tf)
+
+        terms = np.frombuffer(term_col, dtype=np.int32)
+        # 단어 번호로 안정 정렬 -> 같은 단어 안에서는 doc_id 오름차순 유지
+        order = np.argsort(terms, kind="stable")
+        df = np.bincount(terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        return cls(
+            vocab,
+            indptr,
+            np.frombuffer(doc_col, dtype=np.int32)[order],
+            np.frombuffer(tf_col, dtype=np.int32)[order],
+            np.frombuffer(doc_len, dtype=np.int32),
+            **params,
+        )
+
+    @classmethod
+    def from_token_ids(cls, ids: np.ndarray, offsets: np.ndarray, vocab: dict[str, int], **params) -> "SparseBM25":
+        """
+        토큰 id CSR (tokenizer.encode_batch 결과) -> CSR posting
+        - 청크 i의 토큰 id = ids[offsets[i]:offsets[i+1]], vocab은 id 순서대로 삽입된 dict
+        - (단어, 청크) 쌍을 정수 키 하나로 묶어서 np.unique 한 번으로 tf 계산 (파이썬 Counter 루프 없음)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        doc_len = np.diff(np.asarray(offsets, dtype=np.int64)).astype(np.int32)
+        n_docs = len(doc_len)
+
+        doc_of = np.repeat(np.arange(n_docs, dtype=np.int64), doc_len)
+        # 키 = term * n_docs + doc -> 정렬 결과가 곧 (단어, doc_id) 오름차순 posting 순서
+        keys, tfs = np.unique(ids * max(n_docs, 1) + doc_of, return_counts=True)
+        terms = keys // max(n_docs, 1)
+
+        df = np.bincount(terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        return cls(vocab, indptr, keys % max(n_docs, 1), tfs, doc_len, **params)
+
+    @classmethod
+    def concat(cls, parts: list["SparseBM25"], **params) -> "SparseBM25":
+        """
+        문서별 인덱스 여러 개 -> 하나의 인덱스 (재토큰화 없이 posting만 합침)
+        - parts 순서대로 chunk 번호가 이어짐
+        - idf/avgdl은 합친 코퍼스 기준으로 다시 계산
+        """
+        vocab: dict[str, int] = {}
+        terms, doc_ids, tfs, doc_len = [], [], [], []
+        offset = 0
+
+        for part in parts:
+            local_to_global = np.fromiter(
+                (vocab.setdefault(t, len(vocab)) for t in part.vocab),
+                dtype=np.int32,
+                count=len(part.vocab),
+            )
+            terms.append(np.repeat(local_to_global, np.diff(part.indptr)))
+            doc_ids.append(part.doc_ids + offset)
+            tfs.append(part.tfs)
+            doc_len.append(part.doc_len)
+            offset += part.corpus_size
+
+        if not parts:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls({}, np.zeros(1, dtype=np.int64), empty, empty, empty, **params)
+
+        term_col = np.concatenate(terms)
+        order = np.argsort(term_col, kind="stable")
+        df = np.bincount(term_col, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        return cls(
+            vocab,
+            indptr,
+            np.concatenate(doc_ids)[order],
+            np.concatenate(tfs)[order],
+            np.concatenate(doc_len),
+            **params,
+        )
+
+    # ---- 통계 ----
+    def _calc_idf(self) -> np.ndarray:
+        """BM25Okapi와 같은 식: 음수 idf는 epsilon * 평균 idf로 바닥을 깔아줌"""
+        df = np.diff(self.indptr).astype(np.float64)
+        idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            eps = self.epsilon * float(idf.mean())
+            idf[idf < 0] = eps
+        return idf
+
+    def _calc_weights(self) -> np.ndarray:
+        if not len(self.doc_ids):
+            return np.zeros(0, dtype=np.float32)
+        tf = self.tfs.astype(np.float32)
+        dl = self.doc_len[self.doc_ids].astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * dl / self.avgdl)
+        term_of = np.repeat(np.arange(len(self.vocab)), np.diff(self.indptr))
+        w = self.idf[term_of].astype(np.float32) * (tf * (self.k1 + 1) / (tf + norm))
+        return w.astype(np.float32, copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        """posting/통계 배열이 차지하는 메모리(단어 사전 제외)"""
+        arrays = (self.indptr, self.doc_ids, self.tfs, self.doc_len, self.idf, self.weights)
+        return int(sum(a.nbytes for a in arrays))
+
+    # ---- 검색 ----
+    def get_scores(self, query: Query) -> np.ndarray:
+        """
+        질의 -> 전체 청크 점수 (BM25Okapi.get_scores 대체)
+        - 토큰 리스트: 같은 토큰이 n번이면 가중치 n (BM25Okapi와 같음)
+        - {토큰: 가중치}: 용어 사전으로 확장한 질의 (점수 = 토큰별 BM25 점수 x 가중치의 합)
+        """
+        if isinstance(query, dict):
+            counts = {t: w for t, w in query.items() if w > 0 and t in self.vocab}
+        else:
+            counts = Counter(t for t in query if t in self.vocab)
+        if not counts:
+            return np.zeros(self.corpus_size, dtype=np.float32)
+
+        ids = []
+        ws = []
+        for term, c in counts.items():
+            tid = self.vocab[term]
+            s, e = self.indptr[tid], self.indptr[tid + 1]
+            ids.append(self.doc_ids[s:e])
+            ws.append(self.weights[s:e] * c if c != 1 else self.weights[s:e])
+
+        # 희소 질의 벡터 x posting 행렬: 겹치는 doc_id는 bincount가 합산
+        scores = np.bincount(
+            np.concatenate(ids),
+            weights=np.concatenate(ws),
+            minlength=self.corpus_size,
+        )
+        return scores.astype(np.float32, copy=False)
+
+    def top_k(self, query: Query, k: int = 3, *, mask: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """
+        점수 상위 k개 (idx, score)
+        - 동점이면 chunk 번호가 작은 것 우선 (기존 sorted(..., reverse=True)와 같은 순서)
+        - mask(bool, 청크 수 길이)가 주어지면 True인 청크만 후보
+        """
+        scores = self.get_scores(query)
+        n = len(scores)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf).astype(np.float32, copy=False)
+            k = min(k, int(np.count_nonzero(mask)))
+        k = max(0, min(k, n))
+        if k == 0:
+            return []
+
+        if k < n:
+            kth = np.partition(scores, n - k)[n - k]
+            above = np.flatnonzero(scores > kth)
+            tie = np.flatnonzero(scores == kth)[: k - len(above)]
+            cand = np.concatenate([above, tie])
+        else:
+            cand = np.arange(n)
+
+        order = np.lexsort((cand, -scores[cand]))
+        top = cand[order]
+        return [(int(i), float(scores[i])) for i in top]
+
@@ -0,0 +1,176 @@
+"""
+bulk_ingest.py
+
+목표:
+- 여러 회사 x 기간의 공시를 한 번에 수집 (검색 전 페이지 -> 다운로드 -> 텍스트 변환, zip은 메모리에서 바로 읽음)
+- 동시에 처리하는 공시 수 제한 (--workers), DART 호출 속도는 공유 클라이언트의 리미터가 조절
+- 매니페스트(jsonl)에 완료된 rcept_no를 한 줄씩 기록 -> 중간에 끊겨도 다시 실행하면 이어서 진행
+- 선택: 문서별 BM25 인덱스까지 미리 빌드 (--index)
+
+실행:
+python -m scripts.bulk_ingest --corps 아이엠뱅크 KB금융 --start 20240101 --end 20241231
+python -m scripts.bulk_ingest --corps 00109019 --start 20240101 --end 20241231 --workers 8 --index
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from tqdm import tqdm
+
+from scripts.corpus_index import DocMeta, write_doc_meta
+from scripts.dart_service import (
+    DISCLOSURE_DIR,
+    DisclosureItem,
+    find_corp_code,
+    iter_disclosures,
+    load_disclosure_text,
+)
+from scripts.index_store import load_or_build_index
+
+
+MANIFEST_PATH = DISCLOSURE_DIR / "_manifest.jsonl"
+
+
+
+
+# 1. 매니페스트 (append-only jsonl)
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: dict[str, dict] = {}
+
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 쓰다가 끊긴 마지막 줄
+                if rec.get("status") == "done":
+                    self.done[rec["rcept_no"]] = rec
+
+    def is_done(self, rcept_no: str) -> bool:
+        return rcept_no in self.done
+
+    def record(self, rec: dict) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            if rec.get("status") == "done":
+                self.done[rec["rcept_no"]] = rec
+
+
+
+
+# 2. 공시 1건 처리
+def ingest_one(item: DisclosureItem, *, build_index: bool) -> dict:
+    t0 = time.perf_counter()
+    txt_path = load_disclosure_text(item.rcept_no, item.report_nm)
+
+    write_doc_meta(txt_path, DocMeta(
+        rcept_no=item.rcept_no,
+        report_nm=item.report_nm,
+        rcept_dt=item.rcept_dt,
+        corp_code=item.corp_code,
+        corp_name=item.corp_name,
+    ))
+
+    chunks = len(load_or_build_index(txt_path)[0]) if build_index else None
+
+    return {
+        "rcept_no": item.rcept_no,
+        "report_nm": item.report_nm,
+        "rcept_dt": item.rcept_dt,
+        "corp_code": item.corp_code,
+        "status": "done",
+        "txt_path": str(txt_path),
+        "chunks": chunks,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+
+
+# 3. 전체 실행
+def resolve_corp_code(corp: str) -> str:
+    """8자리 숫자면 corp_code로 보고, 아니면 회사명 검색"""
+    return corp if corp.isdigit() and len(corp) == 8 else find_corp_code(corp)
+
+
+def collect_items(corps: list[str], start_date: str, end_date: str) -> list[DisclosureItem]:
+    items: dict[str, DisclosureItem] = {}
+    for corp in tqdm(corps, desc="search", unit="corp"):
+        for it in iter_disclosures(resolve_corp_code(corp), start_date, end_date):
+            items.setdefault(it.rcept_no, it)
+    return list(items.values())
+
+
+def run(
+    corps: list[str],
+    start_date: str,
+    end_date: str,
+    *,
+    workers: int = 4,
+    build_index: bool = False,
+    manifest_path: Path = MANIFEST_PATH,
+) -> dict:
+    manifest = Manifest(manifest_path)
+    items = collect_items(corps, start_date, end_date)
+    todo = [it for it in items if not manifest.is_done(it.rcept_no)]
+
+    print(f"found={len(items)} | already done={len(items) - len(todo)} | todo={len(todo)}")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest") as pool:
+        futures = {pool.submit(ingest_one, it, build_index=build_index): it for it in todo}
+        with tqdm(total=len(futures), desc="ingest", unit="doc") as bar:
+            for fut in as_completed(futures):
+                it = futures[fut]
+                try:
+                    manifest.record(fut.result())
+                except Exception as e:
+                    failed += 1
+                    manifest.record({"rcept_no": it.rcept_no, "status": "failed", "error": str(e)})
+                    bar.write(f"[failed] {it.rcept_no} {it.report_nm}: {e}")
+                bar.update(1)
+
+    summary = {
+        "found": len(items),
+        "skipped": len(items) - len(todo),
+        "ingested": len(todo) - failed,
+        "failed": failed,
+        "manifest": str(manifest_path),
+    }
+    print(summary)
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="DART 공시 대량 수집 (재실행 시 이어서 진행)")
+    ap.add_argument("--corps", nargs="+", required=True, help="회사명 또는 8자리 corp_code")
+    ap.add_argument("--start", required=True, help="시작일 YYYYMMDD")
+    ap.add_argument("--end", required=True, help="종료일 YYYYMMDD")
+    ap.add_argument("--workers", type=int, default=4, help="동시에 처리할 공시 수")
+    ap.add_argument("--index", action="store_true", help="문서별 BM25 인덱스까지 빌드")
+    ap.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    args = ap.parse_args()
+
+    run(
+        args.corps,
+        args.start,
+        args.end,
+        workers=args.workers,
+        build_index=args.index,
+        manifest_path=args.manifest,
+    )
+
+
+if __name__ == "__main__":
+    main()
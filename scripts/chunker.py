@@ -0,0 +1,129 @@
+"""
+chunker.py
+
+목표:
+- 공시 텍스트 청킹을 한 곳으로 (rag / report / 04 스크립트가 같이 사용)
+- 청크 문자열을 잘라서 들고 있지 않고, 원문 하나 + (start, end, section) span 배열만 보관
+  - 청크 텍스트는 필요할 때(근거 미리보기/프롬프트) 잘라서 만듦
+  - start/end는 원문 txt 기준 문자 위치 -> 뷰어에서 근거 위치를 정확히 하이라이트 가능
+
+청킹 규칙 (기존 split_by_markers + split_by_length와 같은 결과):
+1) 섹션 마커 줄("## 제목", "Ⅰ. ", "1. ")에서 끊고 앞뒤 공백 제거
+2) 900자보다 길면 900자 창을 120자씩 겹치며 이동
+- 원문을 한 번 훑으면서 span만 계산 (중간 문자열 사본 없음)
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Iterator
+
+import numpy as np
+
+from scripts.metrics import timed
+
+
+MAX_CHARS = 900
+OVERLAP = 120
+
+# "## 제목"은 xml_text 추출기가 남긴 섹션 마커
+MARKER = re.compile(r"^(?:#{1,6}\s|[ⅠⅡⅢⅣⅤⅥⅦⅧⅨⅩ]\.\s|\d+\.\s)", re.MULTILINE)
+# 섹션 이름으로 쓰는 마커 (번호 "1. "은 하위 항목이라 섹션을 바꾸지 않음, 단 "### 1. ..." 제목은 섹션)
+SECTION_MARKER = re.compile(r"#{1,6}\s|[ⅠⅡⅢⅣⅤⅥⅦⅧⅨⅩ]\.\s")
+
+
+class ChunkStore:
+    """
+    원문 1개 + 청크 span 배열
+    - list[str]처럼 씀: len(chunks), chunks[i], for c in chunks
+    - span(i) -> (start, end, section)
+    - 섹션 제목도 문자열로 들고 있지 않고 제목 줄의 span만 보관 (section_spans: (n, 2))
+    """
+
+    def __init__(self, text: str, starts: np.ndarray, ends: np.ndarray, section_ids: np.ndarray, section_spans: np.ndarray):
+        self.text = text
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        self.section_ids = np.asarray(section_ids, dtype=np.int32)
+        self.section_spans = np.asarray(section_spans, dtype=np.int32).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def __iter__(self) -> Iterator[str]:
+        text = self.text
+        for s, e in zip(self.starts.tolist(), self.ends.tolist()):
+            yield text[s:e]
+
+    def section(self, i: int) -> str:
+        """청크 i가 속한 섹션 제목 ('## ' 같은 마커 제외)"""
+        sid = self.section_ids[i]
+        if sid < 0:
+            return ""
+        s, e = self.section_spans[sid]
+        return self.text[s:e].lstrip("#").strip()
+
+    def span(self, i: int) -> tuple[int, int, str]:
+        return int(self.starts[i]), int(self.ends[i]), self.section(i)
+
+    def preview(self, i: int, n: int = 300) -> str:
+        s, e = int(self.starts[i]), int(self.ends[i])
+        return self.text[s:min(e, s + n)] + ("..." if e - s > n else "")
+
+    @property
+    def nbytes(self) -> int:
+        """span 배열 메모리 (원문 제외)"""
+        return self.starts.nbytes + self.ends.nbytes + self.section_ids.nbytes + self.section_spans.nbytes
+
+
+def _strip_span(text: str, a: int, b: int) -> tuple[int, int]:
+    while a < b and text[a].isspace():
+        a += 1
+    while b > a and text[b - 1].isspace():
+        b -= 1
+    return a, b
+
+
+def chunk_spans(text: str, max_chars: int = MAX_CHARS, overlap: int = OVERLAP) -> ChunkStore:
+    """원문을 한 번 훑으면서 (start, end, section) span 계산"""
+    bounds = [m.start() for m in MARKER.finditer(text)]
+    if not bounds or bounds[0] != 0:
+        bounds.insert(0, 0)
+    bounds.append(len(text))
+
+    starts: list[int] = []
+    ends: list[int] = []
+    section_ids: list[int] = []
+    section_spans: list[int] = []
+    cur_section = -1
+
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        a, b = _strip_span(text, a, b)
+        if a >= b:
+            continue
+
+        if SECTION_MARKER.match(text, a):
+            nl = text.find("\n", a, b)
+            section_spans += (a, nl if nl >= 0 else b)
+            cur_section = len(section_spans) // 2 - 1
+
+        # 길이 기준 창 (split_by_length와 같은 이동 규칙)
+        start = a
+        while True:
+            end = min(start + max_chars, b)
+            starts.append(start)
+            ends.append(end)
+            section_ids.append(cur_section)
+            if end == b:
+                break
+            start = max(end - overlap, a)
+
+    return ChunkStore(text, np.array(starts), np.array(ends), np.array(section_ids), np.array(section_spans))
+
+
+@timed("chunk")
+def build_chunks(text: str) -> ChunkStore:
+    return chunk_spans(text, max_chars=MAX_CHARS, overlap=OVERLAP)
@@ -0,0 +1,314 @@
+"""
+corp_index.py
+
+목표:
+- 회사명 -> corp_code 검색을 요청마다 corp_codes.csv(약 10만 행)를 다시 읽지 않고
+  한 번 만든 메모리 인덱스로 처리
+- 인덱스 종류
+  - 정확한 회사명 / 정규화 회사명((주)·주식회사·공백 제거, 소문자) / 종목코드
+  - 정규화 회사명의 문자 1-gram / 2-gram posting (한글 부분 검색용)
+- 원천 파일(corp_codes.npz > corp_codes.csv > CORPCODE.xml 순)의 수정시각/크기가 바뀌면 자동으로 다시 빌드
+
+corp_codes.npz (01_download_corp_codes.py가 생성하는 컬럼 저장 포맷):
+- corp_code / modify_date: uint32 고정폭 배열
+- stock_code: 6바이트 고정폭(S6) 배열 (비상장은 빈 값)
+- name_blob / name_offsets: 회사명 문자열 테이블 (utf-8 버퍼 + 오프셋)
+"""
+
+from __future__ import annotations
+
+import csv
+import heapq
+import os
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from array import array
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from scripts.string_table import pack_strings, unpack_strings
+
+
+ROOT = Path(__file__).resolve().parents[1]
+CORP_DIR = ROOT / "data" / "corp_codes"
+CORP_CSV = CORP_DIR / "corp_codes.csv"
+CORP_XML = CORP_DIR / "CORPCODE.xml"
+CORP_STORE = CORP_DIR / "corp_codes.npz"
+
+_CORP_NOISE = re.compile(r"\(주\)|㈜|주식회사|\(유\)|유한회사|\s+")
+
+
+@dataclass
+class CorpRecord:
+    corp_code: str
+    corp_name: str
+    stock_code: str = ""
+    modify_date: str = ""
+
+
+def normalize_corp_name(name: str) -> str:
+    """'(주)아이엠뱅크' / '아이엠 뱅크' / 'IM뱅크' -> 'im뱅크' 형태로 통일"""
+    return _CORP_NOISE.sub("", name).lower()
+
+
+def bigrams(s: str) -> set[str]:
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+
+
+# 1. 원천 데이터 읽기
+def read_corp_csv(path: Path) -> list[CorpRecord]:
+    rows = []
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        for r in csv.DictReader(f):
+            rows.append(CorpRecord(
+                corp_code=(r.get("corp_code") or "").strip().zfill(8),
+                corp_name=(r.get("corp_name") or "").strip(),
+                stock_code=(r.get("stock_code") or "").strip(),
+                modify_date=(r.get("modify_date") or "").strip(),
+            ))
+    return rows
+
+
+def iter_corp_xml(path: Path) -> Iterator[tuple[str, str, str, str]]:
+    """
+    CORPCODE.xml 스트리밍 파싱 -> (corp_code, corp_name, stock_code, modify_date)
+    - 트리 전체를 메모리에 올리지 않도록 <list>를 처리할 때마다 비우고,
+      이미 처리한 형제 노드도 루트에서 떼어냄 (메모리 일정)
+    """
+    from lxml import etree
+
+    for _, node in etree.iterparse(str(path), events=("end",), tag="list"):
+        yield (
+            node.findtext("corp_code", default="").strip(),
+            node.findtext("corp_name", default="").strip(),
+            node.findtext("stock_code", default="").strip(),
+            node.findtext("modify_date", default="").strip(),
+        )
+        node.clear()
+        parent = node.getparent()
+        while node.getprevious() is not None:
+            del parent[0]
+
+
+def read_corp_xml(path: Path) -> list[CorpRecord]:
+    return [CorpRecord(*row) for row in iter_corp_xml(path)]
+
+
+def write_corp_store(rows: Iterator[tuple[str, str, str, str]], path: Path = CORP_STORE) -> int:
+    """
+    (corp_code, corp_name, stock_code, modify_date) 스트림 -> corp_codes.npz
+    - 코드/날짜는 정수 배열, 회사명은 문자열 테이블로 저장 (CSV 재파싱 없이 바로 로드)
+    """
+    codes = array("I")
+    dates = array("I")
+    stocks: list[bytes] = []
+    names: list[str] = []
+
+    for corp_code, corp_name, stock_code, modify_date in rows:
+        codes.append(int(corp_code) if corp_code.isdigit() else 0)
+        dates.append(int(modify_date) if modify_date.isdigit() else 0)
+        stocks.append(stock_code.encode("ascii", errors="ignore")[:6])
+        names.append(corp_name)
+
+    name_blob, name_offsets = pack_strings(names)
+    # 워커 여러 개가 처음 기동하면서 동시에 저장해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez(
+            f,
+            corp_code=np.frombuffer(codes, dtype=np.uint32),
+            modify_date=np.frombuffer(dates, dtype=np.uint32),
+            stock_code=np.array(stocks, dtype="S6"),
+            name_blob=name_blob,
+            name_offsets=name_offsets,
+        )
+    tmp.replace(path)
+    return len(names)
+
+
+def read_corp_store(path: Path) -> tuple[np.ndarray, list[str], list[str], np.ndarray]:
+    """corp_codes.npz -> (corp_code 배열, 회사명, 종목코드, modify_date 배열) 컬럼 그대로"""
+    with np.load(path, allow_pickle=False) as z:
+        codes = z["corp_code"]
+        dates = z["modify_date"]
+        stocks = [b.decode("ascii") for b in z["stock_code"].tolist()]
+        names = unpack_strings(z["name_blob"], z["name_offsets"])
+    return codes, names, stocks, dates
+
+
+
+
+# 2. 인덱스
+class CorpIndex:
+    """
+    회사 정보는 컬럼(배열/리스트)으로 들고 있고, 검색 결과로 나갈 때만 CorpRecord 생성
+    - corp_code / modify_date: 정수 배열 (출력 시 8자리 / YYYYMMDD 문자열)
+    """
+
+    def __init__(
+        self,
+        corp_codes: np.ndarray,
+        corp_names: list[str],
+        stock_codes: list[str],
+        modify_dates: np.ndarray | None = None,
+    ):
+        self.corp_codes = np.asarray(corp_codes, dtype=np.uint32)
+        self.corp_names = corp_names
+        self.stock_codes = stock_codes
+        self.modify_dates = (
+            np.asarray(modify_dates, dtype=np.uint32)
+            if modify_dates is not None
+            else np.zeros(len(corp_names), dtype=np.uint32)
+        )
+
+        self.by_name: dict[str, int] = {}
+        self.by_norm: dict[str, list[int]] = defaultdict(list)
+        self.by_stock: dict[str, int] = {}
+        self.grams: dict[str, list[int]] = defaultdict(list)
+        self._norm: list[str] = []
+
+        for i, name in enumerate(corp_names):
+            norm = normalize_corp_name(name)
+            self._norm.append(norm)
+            self.by_name.setdefault(name, i)
+            self.by_norm[norm].append(i)
+            if stock_codes[i]:
+                self.by_stock.setdefault(stock_codes[i], i)
+            for g in bigrams(norm) | set(norm):
+                self.grams[g].append(i)
+
+        self.by_norm = dict(self.by_norm)
+        self.grams = dict(self.grams)
+
+    @classmethod
+    def from_records(cls, records: list[CorpRecord]) -> "CorpIndex":
+        return cls(
+            np.array([int(r.corp_code) if r.corp_code.isdigit() else 0 for r in records], dtype=np.uint32),
+            [r.corp_name for r in records],
+            [r.stock_code for r in records],
+            np.array([int(r.modify_date) if r.modify_date.isdigit() else 0 for r in records], dtype=np.uint32),
+        )
+
+    def record(self, i: int) -> CorpRecord:
+        date = int(self.modify_dates[i])
+        return CorpRecord(
+            corp_code=f"{int(self.corp_codes[i]):08d}",
+            corp_name=self.corp_names[i],
+            stock_code=self.stock_codes[i],
+            modify_date=str(date) if date else "",
+        )
+
+    def __len__(self) -> int:
+        return len(self.corp_names)
+
+    def _rank_key(self, i: int) -> tuple:
+        # 상장사(종목코드 있음) 우선 -> 짧은 이름 우선 -> 원래 순서
+        return (not self.stock_codes[i], len(self._norm[i]), i)
+
+    def search(self, query: str, limit: int = 10) -> list[CorpRecord]:
+        """
+        순위
+        1) 회사명 정확 일치  2) 종목코드 일치  3) 정규화 이름 일치
+        4) 정규화 이름 부분 일치(contains)  5) 2-gram 절반 이상 겹침
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        out: list[int] = []
+        seen: set[int] = set()
+
+        def add(ids):
+            for i in ids:
+                if i not in seen and len(out) < limit:
+                    seen.add(i)
+                    out.append(i)
+
+        if query in self.by_name:
+            add([self.by_name[query]])
+        if query in self.by_stock:
+            add([self.by_stock[query]])
+
+        q = normalize_corp_name(query)
+        if not q:
+            return [self.record(i) for i in out]
+        add(heapq.nsmallest(limit, self.by_norm.get(q, []), key=self._rank_key))
+        if len(out) >= limit:
+            return [self.record(i) for i in out]
+
+        q_grams = bigrams(q)
+        if not q_grams:
+            # 한 글자 질의는 1-gram posting이 곧 contains 결과
+            add(heapq.nsmallest(limit, self.grams.get(q, ()), key=self._rank_key))
+            return [self.record(i) for i in out]
+
+        # 희소한 2-gram부터: contains 후보는 가장 짧은 posting 안에 반드시 있음
+        ordered = sorted(q_grams, key=lambda g: len(self.grams.get(g, ())))
+        contains = [i for i in self.grams.get(ordered[0], ()) if q in self._norm[i]]
+        add(heapq.nsmallest(limit, contains, key=self._rank_key))
+
+        if len(out) < limit:
+            # 2-gram 절반 이상 겹치는 이름은 희소한 (need - half + 1)개 중 하나는 반드시 포함
+            need = len(q_grams)
+            half = (need + 1) // 2
+            cand: set[int] = set()
+            for g in ordered[: need - half + 1]:
+                cand.update(self.grams.get(g, ()))
+            cand -= seen
+            overlap = {i: len(q_grams & bigrams(self._norm[i])) for i in cand}
+            partial = [i for i, c in overlap.items() if c >= half]
+            add(heapq.nsmallest(limit, partial, key=lambda i: (-overlap[i],) + self._rank_key(i)))
+
+        return [self.record(i) for i in out]
+
+    def find_corp_code(self, corp_name: str) -> str | None:
+        hits = self.search(corp_name, limit=1)
+        return hits[0].corp_code if hits else None
+
+
+
+
+# 3. 공유 인스턴스 (원천 파일이 바뀌면 다시 빌드)
+_lock = threading.Lock()
+_index: CorpIndex | None = None
+_source_sig: tuple | None = None
+
+
+def _source() -> Path:
+    if CORP_STORE.exists():
+        return CORP_STORE
+    if CORP_CSV.exists():
+        return CORP_CSV
+    if CORP_XML.exists():
+        return CORP_XML
+    raise FileNotFoundError(
+        f"corp_codes.csv가 없습니다: {CORP_CSV}\n"
+        f"먼저 scripts/01_download_corp_codes.py로 corp_codes를 생성하세요."
+    )
+
+
+def get_corp_index() -> CorpIndex:
+    global _index, _source_sig
+
+    src = _source()
+    st = src.stat()
+    sig = (str(src), st.st_mtime_ns, st.st_size)
+    if _index is not None and sig == _source_sig:
+        return _index
+
+    with _lock:
+        if _index is None or sig != _source_sig:
+            if src.suffix == ".npz":
+                _index = CorpIndex(*read_corp_store(src))
+            elif src.suffix == ".csv":
+                _index = CorpIndex.from_records(read_corp_csv(src))
+            else:
+                _index = CorpIndex.from_records(read_corp_xml(src))
+            _source_sig = sig
+    return _index
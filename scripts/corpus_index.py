@@ -0,0 +1,417 @@
+"""
+corpus_index.py
+
+목표:
+- data/clean/ 아래 모든 공시(txt)를 하나의 BM25 인덱스로 묶어서
+  질문 1번에 여러 rcept_no를 가로질러 Top-k 검색
+- 청크마다 문서 메타(rcept_no, report_nm, rcept_dt, corp_code)를 붙여서
+  회사/기간/보고서 종류로 필터링
+
+구성:
+- 문서 메타: load 시점에 data/clean/<rcept_no>.meta.json 으로 저장 (없으면 rcept_no에서 날짜만 추정)
+- 코퍼스 인덱스: data/clean/_corpus.bm25.npz
+  - 문서별 인덱스(<rcept_no>.bm25.npz)의 posting을 그대로 합쳐서 만듦 (재토큰화 없음)
+  - txt 파일 목록/크기/수정시각이 바뀌면 다시 합침
+  - 새 txt가 추가됐거나 메타만 바뀐 경우(load / bulk_ingest)는 이전 인덱스 뒤에 새 문서 posting만 붙임
+    (기존 청크 번호는 그대로, 청크 순서 = signature 순서라서 이름순이 아닐 수 있음)
+    기존 txt가 바뀌거나 지워졌을 때만 처음부터 다시 합침
+  - 한계: 붙일 때도 idf/avgdl/posting 가중치 재계산과 파일 저장은 코퍼스 전체 크기에 비례
+- 코퍼스 dense 인덱스(hybrid 검색용): data/clean/_corpus.dense.npy / .npz
+  - 문서별 벡터(<rcept_no>.dense.npy)를 같은 청크 순서로 이어 붙임 (재임베딩 없음), 청크가 많으면 IVF
+  - 이전 코퍼스 dense가 있으면 새 문서 벡터만 뒤에 붙임
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+
+from scripts.bm25_index import Query, SparseBM25
+from scripts.dense_index import (
+    DenseIndex,
+    Embedder,
+    embed_texts,
+    get_embedder,
+    hybrid_top_k,
+    load_dense,
+    load_or_build_dense,
+    save_dense,
+)
+from scripts.index_store import INDEX_SUFFIX, load_or_build_index, tokenizer_version
+from scripts.string_table import pack_strings, unpack_strings
+
+
+CORPUS_FORMAT = 1
+CORPUS_FILE = "_corpus" + INDEX_SUFFIX
+CORPUS_DENSE_STEM = "_corpus"
+META_SUFFIX = ".meta.json"
+
+
+@dataclass
+class DocMeta:
+    rcept_no: str
+    report_nm: str = ""
+    rcept_dt: str = ""  # YYYYMMDD
+    corp_code: str = ""
+    corp_name: str = ""
+
+
+
+
+# 1. 문서 메타 (load 시점에 저장)
+def meta_path(txt_path: str | Path) -> Path:
+    txt_path = Path(txt_path)
+    return txt_path.with_name(txt_path.stem + META_SUFFIX)
+
+
+def write_doc_meta(txt_path: str | Path, meta: DocMeta) -> Path:
+    path = meta_path(txt_path)
+    # 코퍼스 빌드가 동시에 read_doc_meta 해도 반쯤 쓴 JSON을 읽지 않도록 임시파일 -> replace
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(asdict(meta), ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def read_doc_meta(txt_path: str | Path) -> DocMeta:
+    """
+    메타 파일이 없으면 최소한 rcept_no / rcept_dt만 채움
+    - rcept_no 앞 8자리가 접수일(YYYYMMDD)
+    """
+    txt_path = Path(txt_path)
+    rcept_no = txt_path.stem
+    path = meta_path(txt_path)
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return DocMeta(**{k: str(data.get(k, "")) for k in DocMeta.__dataclass_fields__})
+        except (OSError, ValueError):
+            pass
+    return DocMeta(rcept_no=rcept_no, rcept_dt=rcept_no[:8] if rcept_no[:8].isdigit() else "")
+
+
+
+
+# 2. 코퍼스 인덱스
+class CorpusIndex:
+    """
+    - bm25: 모든 문서 청크를 이어 붙인 하나의 SparseBM25
+    - chunk_doc[i]: 청크 i가 속한 문서 번호 (docs 리스트 인덱스)
+    - 청크 텍스트는 utf-8 버퍼 + 오프셋으로 들고 있다가 결과로 나갈 때만 디코딩
+    """
+
+    def __init__(
+        self,
+        docs: list[DocMeta],
+        bm25: SparseBM25,
+        chunk_doc: np.ndarray,
+        chunks_blob: np.ndarray,
+        chunks_offsets: np.ndarray,
+        signature: list[list] | None = None,
+    ):
+        self.docs = docs
+        self.signature = signature  # 만들 때 본 txt 목록/크기/수정시각 (코퍼스 dense도 같은 목록으로)
+        self.bm25 = bm25
+        self.chunk_doc = np.asarray(chunk_doc, dtype=np.int32)
+        self._blob = chunks_blob.tobytes()
+        self._offsets = np.asarray(chunks_offsets, dtype=np.int64)
+
+        # 필터용 문서 단위 컬럼
+        self._rcept_dt = np.array([int(d.rcept_dt) if d.rcept_dt.isdigit() else 0 for d in docs], dtype=np.int64)
+        self._corp_code = np.array([d.corp_code for d in docs], dtype=object)
+
+    def __len__(self) -> int:
+        return self.bm25.corpus_size
+
+    def chunk(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def doc_mask(
+        self,
+        *,
+        corp_code: str | None = None,
+        corp_name: str | None = None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        report_nm: str | None = None,
+    ) -> np.ndarray:
+        """문서 단위 필터 (None/빈 문자열은 조건 없음)"""
+        mask = np.ones(len(self.docs), dtype=bool)
+        if corp_code:
+            mask &= self._corp_code == corp_code
+        if corp_name:
+            mask &= np.array([corp_name in d.corp_name for d in self.docs], dtype=bool)
+        if start_date:
+            mask &= self._rcept_dt >= int(start_date)
+        if end_date:
+            mask &= self._rcept_dt <= int(end_date)
+        if report_nm:
+            mask &= np.array([report_nm in d.report_nm for d in self.docs], dtype=bool)
+        return mask
+
+    def search(
+        self,
+        q_tok: Query,
+        k: int = 3,
+        *,
+        dense: DenseIndex | None = None,
+        q_vec: np.ndarray | None = None,
+        **filters,
+    ) -> list[tuple[int, float, str, DocMeta]]:
+        """
+        필터를 통과한 청크 중 Top-k
+        - dense + q_vec(질문 임베딩)가 있으면 BM25 + dense 순위를 RRF로 합침
+        - 반환: (global chunk_id, score, chunk, 문서 메타)
+        """
+        mask = None
+        if any(filters.values()):
+            mask = self.doc_mask(**filters)[self.chunk_doc]
+        if dense is not None and q_vec is not None:
+            hits = hybrid_top_k(self.bm25, dense, q_tok, q_vec, k=k, mask=mask)
+        else:
+            hits = self.bm25.top_k(q_tok, k=k, mask=mask)
+        return [(i, score, self.chunk(i), self.docs[self.chunk_doc[i]]) for i, score in hits]
+
+
+
+
+# 3. 빌드 / 저장 / 복원
+def corpus_signature(clean_dir: str | Path) -> list[list]:
+    """txt/메타 파일 목록 + 크기 + 수정시각 (하나라도 바뀌면 다시 합침)"""
+    clean_dir = Path(clean_dir)
+    sig = []
+    for txt in sorted(clean_dir.glob("*.txt")):
+        st = txt.stat()
+        mp = meta_path(txt)
+        m_mtime = mp.stat().st_mtime_ns if mp.exists() else 0
+        sig.append([txt.name, st.st_size, st.st_mtime_ns, m_mtime])
+    return sig
+
+
+def same_signature(a: list[list] | None, b: list[list] | None) -> bool:
+    """같은 파일 상태인지 (순서 무관: 덧붙여 만든 인덱스는 signature가 이름순이 아님)"""
+    return a is not None and b is not None and sorted(a) == sorted(b)
+
+
+def _signature_txts(clean_dir: Path, signature: list[list]) -> list[Path]:
+    return [clean_dir / name for name, *_ in signature]
+
+
+def build_corpus_index(clean_dir: Path, txts: list[Path] | None = None) -> CorpusIndex:
+    """txts(기본: data/clean의 txt 전체, 이름순) 문서별 인덱스를 이어 붙임"""
+    docs: list[DocMeta] = []
+    parts: list[SparseBM25] = []
+    chunk_doc: list[np.ndarray] = []
+    all_chunks: list[str] = []
+
+    for d, txt in enumerate(sorted(clean_dir.glob("*.txt")) if txts is None else txts):
+        chunks, bm25 = load_or_build_index(txt)
+        docs.append(read_doc_meta(txt))
+        parts.append(bm25)
+        chunk_doc.append(np.full(len(chunks), d, dtype=np.int32))
+        all_chunks.extend(chunks)
+
+    blob, offsets = pack_strings(all_chunks)
+    return CorpusIndex(
+        docs,
+        SparseBM25.concat(parts),
+        np.concatenate(chunk_doc) if chunk_doc else np.zeros(0, dtype=np.int32),
+        blob,
+        offsets,
+    )
+
+
+def extend_corpus_index(base: CorpusIndex, clean_dir: Path, signature: list[list]) -> CorpusIndex | None:
+    """
+    base 이후 바뀐 게 새 txt 추가 / 메타 수정뿐이면 새 문서의 posting만 base 뒤에 붙인 인덱스
+    - base의 청크 번호는 그대로 (코퍼스 dense도 새 문서 벡터만 붙이면 됨)
+    - 기존 txt가 바뀌었거나 지워졌으면 None (처음부터 다시 합쳐야 함)
+    """
+    if base.signature is None:
+        return None
+    current = {e[0]: e for e in signature}
+    if any(e[0] not in current or current[e[0]][1:3] != e[1:3] for e in base.signature):
+        return None
+
+    # 메타만 바뀐 문서는 메타만 다시 읽음
+    docs = [d if current[e[0]][3] == e[3] else read_doc_meta(clean_dir / e[0]) for d, e in zip(base.docs, base.signature)]
+    kept = {e[0] for e in base.signature}
+    added = [e for e in signature if e[0] not in kept]
+
+    parts: list[SparseBM25] = [base.bm25]
+    chunk_doc: list[np.ndarray] = [base.chunk_doc]
+    new_chunks: list[str] = []
+    for e in added:
+        txt = clean_dir / e[0]
+        chunks, bm25 = load_or_build_index(txt)
+        chunk_doc.append(np.full(len(chunks), len(docs), dtype=np.int32))
+        docs.append(read_doc_meta(txt))
+        parts.append(bm25)
+        new_chunks.extend(chunks)
+
+    blob, offsets = pack_strings(new_chunks)
+    return CorpusIndex(
+        docs,
+        SparseBM25.concat(parts) if added else base.bm25,
+        np.concatenate(chunk_doc),
+        np.frombuffer(base._blob + blob.tobytes(), dtype=np.uint8),
+        np.concatenate([base._offsets, offsets[1:] + base._offsets[-1]]),
+        [current[e[0]] for e in base.signature] + added,
+    )
+
+
+def save_corpus_index(path: Path, index: CorpusIndex, *, signature: list[list]) -> Path:
+    bm25 = index.bm25
+    meta = {
+        "format": CORPUS_FORMAT,
+        "tokenizer": tokenizer_version(),
+        "signature": signature,
+        "params": {"k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon},
+        "docs": [asdict(d) for d in index.docs],
+    }
+    vocab_blob, vocab_offsets = pack_strings(list(bm25.vocab))
+
+    # 질의 여러 개가 동시에 다시 합쳐도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez(
+            f,
+            meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+            chunks_blob=np.frombuffer(index._blob, dtype=np.uint8),
+            chunks_offsets=index._offsets,
+            chunk_doc=index.chunk_doc,
+            vocab_blob=vocab_blob,
+            vocab_offsets=vocab_offsets,
+            indptr=bm25.indptr,
+            doc_ids=bm25.doc_ids,
+            tfs=bm25.tfs,
+            doc_len=bm25.doc_len,
+        )
+    os.replace(tmp, path)
+    return path
+
+
+def load_corpus_index(path: Path, *, signature: list[list]) -> CorpusIndex | None:
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.get("format") != CORPUS_FORMAT:
+                return None
+            if meta.get("tokenizer") != tokenizer_version():
+                return None
+            if not same_signature(meta.get("signature"), signature):
+                return None
+
+            terms = unpack_strings(z["vocab_blob"], z["vocab_offsets"])
+            bm25 = SparseBM25(
+                {t: i for i, t in enumerate(terms)},
+                z["indptr"],
+                z["doc_ids"],
+                z["tfs"],
+                z["doc_len"],
+                **meta["params"],
+            )
+            return CorpusIndex(
+                [DocMeta(**d) for d in meta["docs"]],
+                bm25,
+                z["chunk_doc"],
+                z["chunks_blob"],
+                z["chunks_offsets"],
+                meta["signature"],  # 저장된 순서 그대로 (= 청크 순서)
+            )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_or_build_corpus_index(
+    clean_dir: str | Path,
+    *,
+    base: CorpusIndex | None = None,
+    signature: list[list] | None = None,
+) -> CorpusIndex:
+    """
+    저장된 코퍼스 인덱스가 최신이면 읽고, 아니면 문서별 인덱스를 합쳐서 저장
+    - base(이전 코퍼스 인덱스)가 있으면 새 문서만 덧붙여 봄 (extend_corpus_index)
+    - signature: 호출한 쪽이 이미 잰 corpus_signature (없으면 여기서 잼)
+    """
+    clean_dir = Path(clean_dir)
+    signature = corpus_signature(clean_dir) if signature is None else signature
+    path = clean_dir / CORPUS_FILE
+
+    cached = load_corpus_index(path, signature=signature)
+    if cached is not None:
+        return cached
+
+    # 시그니처를 잰 txt 목록 그대로 합침 (그 사이 load가 새 txt를 써도 시그니처와 내용이 어긋나지 않도록)
+    index = extend_corpus_index(base, clean_dir, signature) if base is not None else None
+    if index is None:
+        index = build_corpus_index(clean_dir, _signature_txts(clean_dir, signature))
+        index.signature = signature
+    save_corpus_index(path, index, signature=index.signature)
+    return index
+
+
+def _prefix_docs(
+    index: CorpusIndex | None,
+    prev_index: CorpusIndex | None,
+    prev_dense: DenseIndex | None,
+    embedder: Embedder,
+) -> int:
+    """index 앞부분이 prev_index와 같은 문서/청크면 그 문서 수 (prev_dense를 그대로 쓸 수 있을 때만, 아니면 0)"""
+    if index is None or prev_index is None or prev_dense is None:
+        return 0
+    if index.signature is None or prev_index.signature is None or prev_dense.embedder_name != embedder.name:
+        return 0
+    n = len(prev_index.signature)
+    same_files = [e[:3] for e in index.signature[:n]] == [e[:3] for e in prev_index.signature]
+    if not same_files or len(prev_dense) != len(prev_index) or len(index) < len(prev_index):
+        return 0
+    return n
+
+
+def load_or_build_corpus_dense(
+    clean_dir: str | Path,
+    embedder: Embedder | None = None,
+    *,
+    index: CorpusIndex | None = None,
+    prev_index: CorpusIndex | None = None,
+    prev_dense: DenseIndex | None = None,
+) -> DenseIndex:
+    """
+    코퍼스 dense 인덱스 (청크 순서 = load_or_build_corpus_index와 같은 txt 순서)
+    - 문서별 벡터가 없으면 그 문서만 임베딩해서 저장 (다음부터 재사용)
+    - index를 주면 그 인덱스를 만든 txt 목록(signature)으로 만들고 청크 수가 같은지 확인
+      (그 사이 문서가 바뀌었으면 index의 청크 텍스트를 그대로 임베딩 -> BM25 / dense 청크 번호가 항상 같음)
+    - index가 prev_index에 문서만 덧붙인 것이면 prev_dense 뒤에 새 문서 벡터만 붙임
+    """
+    clean_dir = Path(clean_dir)
+    embedder = embedder or get_embedder()
+    signature = index.signature if index is not None and index.signature is not None else corpus_signature(clean_dir)
+    expect = {"embedder": embedder.name, "signature": signature}
+    stem = clean_dir / CORPUS_DENSE_STEM
+
+    cached = load_dense(stem, expect=expect)
+    if cached is not None and (index is None or len(cached) == len(index)):
+        return cached
+
+    txts = _signature_txts(clean_dir, signature)
+    parts = []
+    n_prev = _prefix_docs(index, prev_index, prev_dense, embedder)
+    if n_prev:
+        parts.append(np.asarray(prev_dense.vectors))
+        txts = txts[n_prev:]
+    for txt in txts:
+        chunks, _ = load_or_build_index(txt)
+        parts.append(np.asarray(load_or_build_dense(txt, chunks, embedder).vectors))
+    vectors = np.concatenate(parts) if parts else np.zeros((0, embedder.dim), dtype=np.float16)
+    if index is not None and len(vectors) != len(index):
+        vectors = embed_texts([index.chunk(i) for i in range(len(index))], embedder)
+    return save_dense(stem, vectors, expect)
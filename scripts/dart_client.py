@@ -0,0 +1,181 @@
+"""
+dart_client.py
+
+목표:
+- OpenDART 호출을 하나의 공유 클라이언트로 모으기
+  - requests.Session + HTTPAdapter: keep-alive 커넥션 풀 재사용
+  - 토큰 버킷: 초당 호출 수 제한 (여러 스레드가 같이 써도 전체 기준)
+  - 재시도: 네트워크 오류/HTTP 429·5xx/DART 일시 오류(020, 800, 900)는 지수 백오프 후 재시도
+  - async 변형: 같은 풀/리미터를 쓰는 asyncio.to_thread 래퍼
+- base_url을 바꿀 수 있어서 로컬 스텁 서버로 테스트 가능 (DART_API_BASE)
+
+DART status 코드 (list.json 등 JSON 응답 / document.xml 오류 시 XML 응답):
+- 000 정상, 013 조회 데이터 없음
+- 020 요청 제한 초과, 800 시스템 점검, 900 정의되지 않은 오류 -> 재시도
+- 그 외(010 미등록 키, 011 사용 불가 키, 012 접근 불가 IP, 014 파일 없음, 100/101 잘못된 요청 등) -> 즉시 실패
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DART_API_BASE = os.getenv("DART_API_BASE", "https://opendart.fss.or.kr/api")
+
+RETRYABLE_STATUS = {"020", "800", "900"}
+RETRYABLE_HTTP = {429, 500, 502, 503, 504}
+
+
+class DartAPIError(RuntimeError):
+    def __init__(self, status: str, message: str):
+        super().__init__(f"DART API 오류 status={status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class TokenBucket:
+    """rate(초당 토큰)로 채워지고 burst개까지 모이는 버킷"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DartClient:
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        base_url: str = DART_API_BASE,
+        rate: float = 5.0,
+        burst: int = 10,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        pool_size: int = 16,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # ---- 내부 ----
+    def _sleep_backoff(self, attempt: int, retry_after: str | None = None) -> None:
+        if retry_after and retry_after.isdigit():
+            time.sleep(float(retry_after))
+            return
+        # 지수 백오프 + jitter (여러 워커가 동시에 재시도하지 않도록)
+        time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random() / 2))
+
+    def _request(self, endpoint: str, params: dict[str, Any], timeout: float) -> requests.Response:
+        url = f"{self.base_url}/{endpoint}"
+        params = {"crtfc_key": self.api_key, **params}
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                res = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep_backoff(attempt)
+                continue
+
+            if res.status_code in RETRYABLE_HTTP and attempt < self.max_retries:
+                self._sleep_backoff(attempt, res.headers.get("Retry-After"))
+                continue
+            res.raise_for_status()
+            return res
+
+        raise RuntimeError("unreachable")
+
+    # ---- 공개 API ----
+    def get_json(self, endpoint: str, params: dict[str, Any], *, timeout: float = 30) -> dict[str, Any]:
+        """
+        JSON API (예: list.json)
+        - 000 / 013(데이터 없음)은 그대로 반환, 일시 오류는 재시도, 나머지는 DartAPIError
+        """
+        for attempt in range(self.max_retries + 1):
+            data = self._request(endpoint, params, timeout).json()
+            status = str(data.get("status", ""))
+            if status in {"000", "013"}:
+                return data
+            if status in RETRYABLE_STATUS and attempt < self.max_retries:
+                self._sleep_backoff(attempt)
+                continue
+            raise DartAPIError(status, data.get("message", "unknown"))
+
+        raise RuntimeError("unreachable")
+
+    def get_bytes(self, endpoint: str, params: dict[str, Any], *, timeout: float = 60) -> bytes:
+        """
+        zip 바이너리 API (document.xml, corpCode.xml)
+        - 정상이면 zip(PK로 시작), 오류면 <status>가 담긴 XML이 옴
+        """
+        for attempt in range(self.max_retries + 1):
+            content = self._request(endpoint, params, timeout).content
+            if content[:2] == b"PK":
+                return content
+
+            m = re.search(rb"<status>\s*(\d+)\s*</status>", content)
+            status = m.group(1).decode() if m else ""
+            msg = re.search(rb"<message>(.*?)</message>", content, flags=re.S)
+            message = msg.group(1).decode("utf-8", errors="ignore") if msg else "zip이 아닌 응답"
+            if status in RETRYABLE_STATUS and attempt < self.max_retries:
+                self._sleep_backoff(attempt)
+                continue
+            raise DartAPIError(status or "unknown", message)
+
+        raise RuntimeError("unreachable")
+
+    # ---- async 변형 (같은 세션/리미터를 스레드에서 사용) ----
+    async def aget_json(self, endpoint: str, params: dict[str, Any], *, timeout: float = 30) -> dict[str, Any]:
+        return await asyncio.to_thread(self.get_json, endpoint, params, timeout=timeout)
+
+    async def aget_bytes(self, endpoint: str, params: dict[str, Any], *, timeout: float = 60) -> bytes:
+        return await asyncio.to_thread(self.get_bytes, endpoint, params, timeout=timeout)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def client_from_env(api_key: str) -> DartClient:
+    """환경변수로 접속 주소/리미터/재시도 조절 (DART_API_BASE, DART_RATE, DART_BURST, DART_MAX_RETRIES)"""
+    return DartClient(
+        api_key,
+        base_url=os.getenv("DART_API_BASE", DART_API_BASE),
+        rate=float(os.getenv("DART_RATE", "5")),
+        burst=int(os.getenv("DART_BURST", "10")),
+        max_retries=int(os.getenv("DART_MAX_RETRIES", "4")),
+    )
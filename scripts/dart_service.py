@@ -1,14 +1,25 @@
 from __future__ import annotations
 
+import io
 import os
+import re
 import zipfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+import threading
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterator, List, Optional
 
-import requests
 from dotenv import load_dotenv
-import pandas as pd
+
+from scripts.corp_index import get_corp_index
+from scripts.dart_client import DartAPIError, DartClient, client_from_env
+from scripts.doc_cache import document_cache
+from scripts.metrics import timed
+from scripts.table_store import FieldRecord, FieldStore, fields_path, save_field_store, table_records
+from scripts.xml_text import iter_text_lines
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -19,9 +30,25 @@ CLEAN_DIR = DATA_DIR / "clean"
 
 load_dotenv(ROOT / ".env")
 
-DART_API_KEY = os.getenv("DART_API_KEY")
-if not DART_API_KEY:
-    raise ValueError("DART_API_KEY가 없습니다. 루트 .env에 DART_API_KEY=... 를 넣어주세요.")
+# 메모리 load 경로에서도 원본 zip을 data/disclosures에 남길지 (기본: 남기지 않음)
+KEEP_DISCLOSURE_ZIP = os.getenv("KEEP_DISCLOSURE_ZIP", "0").strip().lower() in {"1", "true", "yes"}
+
+# DART_API_KEY는 실제로 OpenDART를 부를 때 확인 -> 키 없이도 import 가능 (테스트, 캐시된 공시만 쓰는 워커)
+_client: DartClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DartClient:
+    """프로세스 전체가 공유하는 DART 클라이언트 (커넥션 풀/리미터 공유, 처음 호출할 때 생성)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("DART_API_KEY")
+                if not api_key:
+                    raise ValueError("DART_API_KEY가 없습니다. 루트 .env에 DART_API_KEY=... 를 넣어주세요.")
+                _client = client_from_env(api_key)
+    return _client
 
 
 @dataclass
@@ -29,6 +56,8 @@ class DisclosureItem:
     rcept_no: str
     report_nm: str
     rcept_dt: str  # YYYYMMDD
+    corp_code: str = ""
+    corp_name: str = ""
 
 
 def ensure_dirs():
@@ -38,7 +67,8 @@ def ensure_dirs():
 
 
 def load_corp_codes_df() -> pd.DataFrame:
-    
+    import pandas as pd  # 이 함수에서만 씀 -> 백엔드 기동 때는 import하지 않음
+
     if not CORP_CSV.exists():
         raise FileNotFoundError(
             f"corp_codes.csv가 없습니다: {CORP_CSV}\n"
@@ -51,18 +81,13 @@ def load_corp_codes_df() -> pd.DataFrame:
 def find_corp_code(corp_name: str) -> str:
     """
     회사명으로 고유번호(corp_code) 찾기
-    - 정확히 일치 우선
-    - 없으면 contains로 후보 중 첫번째
+    - 정확히 일치 우선, 그다음 종목코드/정규화 이름/부분 일치 순 (corp_index.CorpIndex.search)
+    - corp_codes.csv는 프로세스당 한 번만 읽어서 인덱싱 (파일이 바뀌면 자동 재빌드)
     """
-    df = load_corp_codes_df()
-    exact = df[df["corp_name"] == corp_name]
-    if len(exact) > 0:
-        return str(exact.iloc[0]["corp_code"])
-
-    cand = df[df["corp_name"].str.contains(corp_name, na=False)]
-    if len(cand) == 0:
+    code = get_corp_index().find_corp_code(corp_name)
+    if code is None:
         raise ValueError(f"회사명을 corp_codes에서 찾지 못했습니다: {corp_name}")
-    return str(cand.iloc[0]["corp_code"])
+    return code
 
 
 def search_disclosures(corp_code: str, start_date: str, end_date: str, page_count: int = 20) -> List[DisclosureItem]:
@@ -70,34 +95,80 @@ def search_disclosures(corp_code: str, start_date: str, end_date: str, page_coun
     공시 검색 (DART list API)
     start_date/end_date는 YYYYMMDD 문자열
     """
-    url = "https://opendart.fss.or.kr/api/list.json"
     params = {
-        "crtfc_key": DART_API_KEY,
         "corp_code": corp_code,
         "bgn_de": start_date,
         "end_de": end_date,
         "page_count": page_count,
     }
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+    try:
+        data = get_client().get_json("list.json", params, timeout=30)
+    except DartAPIError:
+        # 재시도해도 안 되는 오류(키/요청 오류 등)는 기존처럼 빈 결과
+        return []
 
     status = data.get("status")
     if status != "000":
         # 예: 조회 결과 없음 013 등
-        msg = data.get("message", "unknown")
         return []
 
-    items = []
-    for it in data.get("list", []):
-        items.append(
-            DisclosureItem(
-                rcept_no=it.get("rcept_no", ""),
-                report_nm=it.get("report_nm", ""),
-                rcept_dt=it.get("rcept_dt", ""),
-            )
-        )
-    return items
+    return [_to_item(it) for it in data.get("list", [])]
+
+
+def _to_item(it: dict) -> DisclosureItem:
+    return DisclosureItem(
+        rcept_no=it.get("rcept_no", ""),
+        report_nm=it.get("report_nm", ""),
+        rcept_dt=it.get("rcept_dt", ""),
+        corp_code=it.get("corp_code", ""),
+        corp_name=it.get("corp_name", ""),
+    )
+
+
+def iter_disclosures(corp_code: str, start_date: str, end_date: str, page_count: int = 100) -> Iterator[DisclosureItem]:
+    """
+    공시 검색 결과 전체 페이지 순회 (list.json의 total_page까지)
+    - page_count 최대 100
+    - 013(데이터 없음)이면 아무것도 내지 않음, 그 외 API 오류는 DartAPIError
+    """
+    page_no = 1
+    while True:
+        params = {
+            "corp_code": corp_code,
+            "bgn_de": start_date,
+            "end_de": end_date,
+            "page_no": page_no,
+            "page_count": page_count,
+        }
+        data = get_client().get_json("list.json", params, timeout=30)
+        if data.get("status") != "000":
+            return
+
+        for it in data.get("list", []):
+            yield _to_item(it)
+
+        total_page = int(data.get("total_page") or 1)
+        if page_no >= total_page:
+            return
+        page_no += 1
+
+
+def safe_filename(name: str) -> str:
+    """보고서명에 들어가는 / : * 등 파일명에 못 쓰는 문자 치환"""
+    return re.sub(r'[\\/:*?"<>|]', "_", name).strip()
+
+
+def fetch_document_zip(rcept_no: str) -> bytes:
+    """
+    공시 원문 zip 바이트 (document API)
+    - 로컬 문서 캐시에 있으면 네트워크 호출 없이 반환, 없으면 받아서 캐시에 저장
+    """
+    content = document_cache.get(rcept_no)
+    if content is None:
+        with timed("download"):
+            content = get_client().get_bytes("document.xml", {"rcept_no": rcept_no}, timeout=60)
+        document_cache.put(rcept_no, content)
+    return content
 
 
 def download_disclosure_zip(rcept_no: str, report_nm: str) -> Path:
@@ -106,21 +177,27 @@ def download_disclosure_zip(rcept_no: str, report_nm: str) -> Path:
     """
     ensure_dirs()
 
-    url = "https://opendart.fss.or.kr/api/document.xml"
-    params = {
-        "crtfc_key": DART_API_KEY,
-        "rcept_no": rcept_no,
-    }
+    out_zip = DISCLOSURE_DIR / f"{rcept_no}_{safe_filename(report_nm)}.zip"
+    content = fetch_document_zip(rcept_no)
+
+    # 응답이 zip(바이너리), 같은 파일이 이미 있으면 다시 쓰지 않음
+    if not (out_zip.exists() and out_zip.stat().st_size == len(content)):
+        out_zip.write_bytes(content)
+    return out_zip
 
-    out_zip = DISCLOSURE_DIR / f"{rcept_no}_{report_nm}.zip"
-    res = requests.get(url, params=params, timeout=60)
-    res.raise_for_status()
 
-    # 응답이 zip(바이너리)
-    out_zip.write_bytes(res.content)
+def download_corp_codes_zip(out_zip: Path | None = None) -> Path:
+    """
+    고유번호(corpCode.xml) zip 다운로드
+    """
+    ensure_dirs()
+    out_zip = out_zip or DATA_DIR / "corp_codes" / "corpCode.zip"
+    content = get_client().get_bytes("corpCode.xml", {}, timeout=60)
+    out_zip.write_bytes(content)
     return out_zip
 
 
+@timed("extract")
 def extract_zip(zip_path: Path) -> Path:
     """
     zip 압축 해제 후 폴더 경로 반환
@@ -134,6 +211,35 @@ def extract_zip(zip_path: Path) -> Path:
     return out_dir
 
 
+def first_xml_member(zf: zipfile.ZipFile) -> str:
+    """압축 해제 폴더의 sorted(glob("*.xml"))와 같은 기준으로 첫 xml 멤버 선택"""
+    names = sorted(n for n in zf.namelist() if "/" not in n and n.lower().endswith(".xml"))
+    if not names:
+        raise FileNotFoundError(f"zip 안에서 XML 파일을 찾지 못했습니다: {zf.filename or '<memory>'}")
+    return names[0]
+
+
+@timed("parse")
+def write_xml_text(src: BinaryIO, out_txt: Path) -> Path:
+    """
+    xml 바이트 스트림 -> 텍스트 파일
+    - 태그는 버리고 섹션 제목(##)/표 행(a | b | c) 마커만 남김 (scripts/xml_text.py)
+    - iterparse로 흘려보내며 한 줄씩 쓰기 때문에 통째로 메모리에 올리지 않음
+    - 같은 패스에서 모은 표는 필드 저장소(<rcept_no>.fields.npz)로 저장 (scripts/table_store.py)
+    """
+    records: list[FieldRecord] = []
+    # 같은 공시를 동시에 load해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    tmp = out_txt.with_name(out_txt.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("w", encoding="utf-8") as dst:
+        for line in iter_text_lines(src, lambda t: records.extend(table_records(t))):
+            dst.write(line)
+            dst.write("\n")
+    os.replace(tmp, out_txt)
+
+    save_field_store(fields_path(out_txt), FieldStore.from_records(records))
+    return out_txt
+
+
 def parse_first_xml_to_text(extracted_dir: Path, rcept_no: str) -> Path:
     """
     압축 해제 폴더에서 첫 xml 찾아서 텍스트로 변환
@@ -146,8 +252,37 @@ def parse_first_xml_to_text(extracted_dir: Path, rcept_no: str) -> Path:
 
     xml_path = xml_files[0]
 
-    raw = xml_path.read_text(encoding="utf-8", errors="ignore")
+    with xml_path.open("rb") as src:
+        return write_xml_text(src, CLEAN_DIR / f"{rcept_no}.txt")
 
-    out_txt = CLEAN_DIR / f"{rcept_no}.txt"
-    out_txt.write_text(raw, encoding="utf-8")
-    return out_txt
+
+def load_disclosure_text(
+    rcept_no: str,
+    report_nm: str,
+    *,
+    keep_zip: bool | None = None,
+    progress: Callable[[str], None] | None = None,
+) -> Path:
+    """
+    다운로드 -> 압축해제 -> 텍스트 변환을 메모리에서 한 번에
+    - 응답 zip 바이트를 BytesIO로 열고 xml 멤버를 바로 읽어서 txt로 스트리밍
+    - 압축 해제 폴더를 만들지 않음, 원본 zip은 keep_zip(기본 KEEP_DISCLOSURE_ZIP)일 때만 저장
+    - progress: 단계가 바뀔 때마다 "download" / "extract" / "parse" 로 호출 (load job 진행률 표시용)
+    """
+    progress = progress or (lambda stage: None)
+    ensure_dirs()
+    progress("download")
+    content = fetch_document_zip(rcept_no)
+
+    if KEEP_DISCLOSURE_ZIP if keep_zip is None else keep_zip:
+        out_zip = DISCLOSURE_DIR / f"{rcept_no}_{safe_filename(report_nm)}.zip"
+        if not (out_zip.exists() and out_zip.stat().st_size == len(content)):
+            out_zip.write_bytes(content)
+
+    progress("extract")
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        with timed("extract"):
+            member = first_xml_member(zf)
+        with zf.open(member) as src:
+            progress("parse")
+            return write_xml_text(src, CLEAN_DIR / f"{rcept_no}.txt")
@@ -0,0 +1,481 @@
+"""
+dense_index.py
+
+목표:
+- BM25(단어 일치)만으로는 말을 바꾼 질문("얼마나 빌렸어?" vs "총발행금액")을 놓침
+  -> to_query_keyword 규칙을 손으로 계속 늘리는 대신, 청크 임베딩 검색을 BM25와 같이 씀 (hybrid)
+- 청크 벡터는 공시(또는 코퍼스)별 float16 행렬 파일(.dense.npy)로 저장하고 memmap으로 열어서 검색
+  - 메모리에 올려 두지 않아도 OS 페이지 캐시로 읽힘 (index_manager 예산에 벡터는 포함하지 않음)
+  - 검색은 블록 단위 행렬-벡터 곱 (float16 블록 -> float32로 바꿔서 q와 곱함)
+- 청크 수가 많으면(DENSE_IVF_MIN 이상) IVF 방식 coarse quantizer
+  - k-means 중심 nlist개, 질의와 가까운 중심 nprobe개의 리스트만 점수 계산
+- BM25 Top-N과 dense Top-N을 RRF(Reciprocal Rank Fusion)로 합침 (점수 스케일이 달라도 순위만 씀)
+- 임베딩 함수는 교체 가능
+  - hash   : 토큰 + 음절 bigram을 feature hashing (외부 호출 없음, 결정적 -> 오프라인 테스트용, 기본값)
+  - openai : OpenAI 임베딩 API (scripts/llm_client.py 공유 클라이언트)
+
+파일 구성 (txt 옆, pickle 없음):
+- <stem>.dense.npy : (청크 수, dim) float16, L2 정규화된 청크 벡터
+- <stem>.dense.npz : meta(json: 임베딩 이름/원문 해시/청크 span 해시 ...) + IVF 배열(centroids/list_ptr/list_ids)
+
+환경변수:
+- HYBRID_RETRIEVAL   1이면 /ask, /report 기본 검색이 BM25 + dense (요청의 hybrid 값이 우선)
+- EMBEDDER           hash | openai (기본 hash)
+- EMBED_DIM          hash 임베딩 차원 (기본 256)
+- OPENAI_EMBED_MODEL / OPENAI_EMBED_DIM   openai 임베딩 모델 / 차원 (기본 text-embedding-3-small / 512)
+- DENSE_IVF_MIN      이 청크 수 이상이면 IVF 생성 (기본 20000)
+- DENSE_NPROBE       IVF 검색 때 볼 리스트 수 (기본 8)
+- HYBRID_CANDIDATES  RRF에 넣을 BM25 / dense 후보 수 (기본 50)
+- RRF_K              RRF 상수 (기본 60)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Protocol, Sequence
+
+import numpy as np
+
+from scripts.bm25_index import Query, SparseBM25
+from scripts.chunker import ChunkStore
+from scripts.metrics import timed
+from scripts.tokenizer import Vocabulary, tokenizer
+
+
+DENSE_FORMAT = 1
+VECTORS_SUFFIX = ".dense.npy"
+META_SUFFIX = ".dense.npz"
+
+EMBED_BATCH = 2000     # 임베딩할 때 한 번에 처리할 텍스트 수
+SCORE_BLOCK = 32768    # 점수 계산 때 한 번에 float32로 바꿀 행 수
+
+IVF_MIN = int(os.getenv("DENSE_IVF_MIN", "20000"))
+NPROBE = int(os.getenv("DENSE_NPROBE", "8"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = float(os.getenv("RRF_K", "60"))
+
+
+def hybrid_enabled() -> bool:
+    return os.getenv("HYBRID_RETRIEVAL", "").strip().lower() in {"1", "true", "yes"}
+
+
+
+
+# 1. 임베딩 함수 (교체 가능)
+class Embedder(Protocol):
+    name: str  # 저장된 벡터와 같은 임베딩인지 확인하는 이름 (모델/차원/버전이 바뀌면 달라져야 함)
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32, 행마다 L2 정규화"""
+        ...
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    np.divide(m, norms, out=m, where=norms > 0)
+    return m
+
+
+class HashingEmbedder:
+    """
+    feature hashing 임베딩 (학습/네트워크 없음, 같은 입력이면 프로세스가 달라도 같은 벡터)
+    - feature: 공용 토크나이저 토큰 + 토큰의 음절 bigram ("총발행금액" / "발행금액"이 bigram을 공유)
+    - feature마다 crc32로 (차원, 부호)를 정하고 tf를 log로 눌러서 더함
+    """
+
+    def __init__(self, dim: int = 256, *, ngram: int = 2, ngram_weight: float = 0.5):
+        self.dim = dim
+        self.ngram = ngram
+        self.ngram_weight = ngram_weight
+
+    @property
+    def name(self) -> str:
+        # 토큰화 규칙이 바뀌면 벡터도 달라지므로 토크나이저 해시를 이름에 포함
+        from scripts.index_store import tokenizer_version  # index_store -> rag 모듈 순환 import 방지
+
+        return f"hash-{self.dim}-ng{self.ngram}-{tokenizer_version()}"
+
+    def _term_features(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """단어 사전 -> feature CSR (단어 t의 feature = ptr[t]:ptr[t+1] 구간의 (차원, 가중치))"""
+        n, dim = self.ngram, self.dim
+        ptr = [0]
+        cols: list[int] = []
+        vals: list[float] = []
+        for t in terms:
+            feats = [(t, 1.0)]
+            if len(t) > n:
+                feats += [(t[i:i + n], self.ngram_weight) for i in range(len(t) - n + 1)]
+            for f, w in feats:
+                h = zlib.crc32(f.encode("utf-8"))
+                cols.append(h % dim)
+                vals.append(w if h & 0x80000000 else -w)
+            ptr.append(len(cols))
+        return np.asarray(ptr, dtype=np.int64), np.asarray(cols, dtype=np.int64), np.asarray(vals, dtype=np.float32)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        n_texts, dim = len(texts), self.dim
+        vocab = Vocabulary()
+        ids, offsets = tokenizer.encode_batch(list(texts), vocab, workers=0)
+        ptr, cols, vals = self._term_features(vocab.terms)
+
+        # 토큰마다 feature 구간을 펼쳐서 (행, 차원) 키로 bincount 한 번에 합산
+        ids = np.asarray(ids, dtype=np.int64)
+        counts = ptr[ids + 1] - ptr[ids]
+        total = int(counts.sum())
+        group_start = np.repeat(np.cumsum(counts) - counts, counts)
+        gather = np.repeat(ptr[ids], counts) + (np.arange(total) - group_start)
+        row_of_token = np.repeat(np.arange(n_texts, dtype=np.int64), np.diff(np.asarray(offsets, dtype=np.int64)))
+        keys = np.repeat(row_of_token, counts) * dim + cols[gather]
+
+        m = np.bincount(keys, weights=vals[gather], minlength=n_texts * dim).reshape(n_texts, dim)
+        m = np.sign(m) * np.log1p(np.abs(m))  # 자주 나온 단어가 벡터를 독차지하지 않도록
+        return _normalize(m.astype(np.float32))
+
+
+class OpenAIEmbedder:
+    """OpenAI 임베딩 API (text-embedding-3-*는 dimensions로 차원 축소 가능)"""
+
+    def __init__(self, model: str = "text-embedding-3-small", dim: int = 512, *, batch: int = 256):
+        self.model = model
+        self.dim = dim
+        self.batch = batch
+
+    @property
+    def name(self) -> str:
+        return f"openai-{self.model}-{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from scripts.llm_client import get_openai_client
+
+        client = get_openai_client()
+        if client is None:
+            raise ValueError("LLM_STUB=1 에서는 openai 임베딩을 쓸 수 없습니다 (EMBEDDER=hash)")
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for s in range(0, len(texts), self.batch):
+            res = client.embeddings.create(model=self.model, input=list(texts[s:s + self.batch]), dimensions=self.dim)
+            out[s:s + len(res.data)] = [d.embedding for d in res.data]
+        return _normalize(out)
+
+
+EMBEDDERS: dict[str, Callable[[], Embedder]] = {
+    "hash": lambda: HashingEmbedder(int(os.getenv("EMBED_DIM", "256"))),
+    "openai": lambda: OpenAIEmbedder(
+        os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"),
+        int(os.getenv("OPENAI_EMBED_DIM", "512")),
+    ),
+}
+
+_embedder: Embedder | None = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embedder:
+    """프로세스 공유 임베딩 함수 (EMBEDDER 환경변수, 처음 쓸 때 생성)"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                kind = os.getenv("EMBEDDER", "hash").strip().lower()
+                if kind not in EMBEDDERS:
+                    raise ValueError(f"알 수 없는 EMBEDDER: {kind} (가능: {', '.join(EMBEDDERS)})")
+                _embedder = EMBEDDERS[kind]()
+    return _embedder
+
+
+def set_embedder(embedder: Embedder | None) -> None:
+    """임베딩 함수 교체 (None이면 다음 get_embedder()에서 환경변수로 다시 생성)"""
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+
+
+@timed("embed")
+def embed_query(text: str, embedder: Embedder | None = None) -> np.ndarray:
+    return (embedder or get_embedder()).embed([text])[0]
+
+
+
+
+# 2. Dense 인덱스 (float16 memmap + 선택적 IVF)
+def _top_k_scores(ids: np.ndarray, scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """점수 상위 k개 (동점이면 번호가 작은 것 우선, SparseBM25.top_k와 같은 순서)"""
+    k = min(k, len(ids))
+    if k <= 0:
+        return []
+    if k < len(ids):
+        part = np.argpartition(-scores, k - 1)[:k]
+        kth = scores[part].min()
+        cand = np.flatnonzero(scores >= kth)
+    else:
+        cand = np.arange(len(ids))
+    order = np.lexsort((ids[cand], -scores[cand]))[:k]
+    top = cand[order]
+    return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+class DenseIndex:
+    """
+    - vectors: (n, dim) float16 (보통 np.memmap), 행 i = 청크 i
+    - IVF(선택): centroids (nlist, dim) float32, list_ptr/list_ids = 리스트별 청크 번호 CSR
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        *,
+        embedder_name: str,
+        centroids: np.ndarray | None = None,
+        list_ptr: np.ndarray | None = None,
+        list_ids: np.ndarray | None = None,
+    ):
+        self.vectors = vectors
+        self.embedder_name = embedder_name
+        self.centroids = centroids if centroids is not None and len(centroids) else None
+        self.list_ptr = list_ptr
+        self.list_ids = list_ids
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        """프로세스 메모리에 따로 올라가는 배열 (memmap 벡터 제외)"""
+        if self.centroids is None:
+            return 0
+        return int(self.centroids.nbytes + self.list_ptr.nbytes + self.list_ids.nbytes)
+
+    def scores(self, q: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        """코사인 점수 (ids가 있으면 그 행만), 블록 단위 float16 -> float32 행렬-벡터 곱"""
+        q = np.asarray(q, dtype=np.float32)
+        n = len(self) if ids is None else len(ids)
+        out = np.empty(n, dtype=np.float32)
+        for s in range(0, n, SCORE_BLOCK):
+            rows = self.vectors[s:s + SCORE_BLOCK] if ids is None else self.vectors[ids[s:s + SCORE_BLOCK]]
+            np.matmul(np.asarray(rows, dtype=np.float32), q, out=out[s:s + len(rows)])
+        return out
+
+    def _probe(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        """질의와 가까운 IVF 리스트 nprobe개의 청크 번호 (오름차순 -> memmap 순차 읽기)"""
+        near = np.argsort(-(self.centroids @ q))[:nprobe]
+        parts = [self.list_ids[self.list_ptr[c]:self.list_ptr[c + 1]] for c in near]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def top_k(self, q: np.ndarray, k: int = 3, *, mask: np.ndarray | None = None, nprobe: int | None = None) -> list[tuple[int, float]]:
+        """
+        코사인 상위 k개 (idx, score)
+        - IVF가 있으면 가까운 리스트 nprobe개만, 후보가 k개보다 적으면 전체 검색으로
+        - mask(bool, 청크 수 길이)가 주어지면 True인 청크만 후보
+        """
+        q = np.asarray(q, dtype=np.float32)
+        ids = None
+        if self.centroids is not None:
+            ids = self._probe(q, nprobe or NPROBE)
+            if mask is not None:
+                ids = ids[mask[ids]]
+            if len(ids) < k:
+                ids = None
+        if ids is None:
+            ids = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+            if len(ids) == len(self):
+                return _top_k_scores(ids, self.scores(q), k)
+        return _top_k_scores(ids, self.scores(q, ids), k)
+
+
+def build_ivf(vectors: np.ndarray, nlist: int, *, iters: int = 10, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    구면 k-means(코사인)로 중심 nlist개 -> (centroids, list_ptr, list_ids)
+    - 중심 학습은 표본(nlist * 64개까지)으로, 배정은 전체를 블록 단위로
+    """
+    n = len(vectors)
+    rng = np.random.default_rng(seed)
+    sample_idx = np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))
+    sample = np.asarray(vectors[sample_idx], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        _normalize(centroids)
+
+    assign = np.empty(n, dtype=np.int64)
+    for s in range(0, n, SCORE_BLOCK):
+        block = np.asarray(vectors[s:s + SCORE_BLOCK], dtype=np.float32)
+        assign[s:s + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+    list_ptr = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=nlist), out=list_ptr[1:])
+    return centroids, list_ptr, list_ids
+
+
+def embed_texts(texts: Sequence[str], embedder: Embedder) -> np.ndarray:
+    """EMBED_BATCH개씩 임베딩 -> (n, dim) float16"""
+    out = np.zeros((len(texts), embedder.dim), dtype=np.float16)
+    for s in range(0, len(texts), EMBED_BATCH):
+        out[s:s + EMBED_BATCH] = embedder.embed(texts[s:s + EMBED_BATCH])
+    return out
+
+
+
+
+# 3. 저장 / 복원
+def dense_paths(stem_path: str | Path) -> tuple[Path, Path]:
+    """data/clean/<rcept_no>.txt -> (<rcept_no>.dense.npy, <rcept_no>.dense.npz)"""
+    p = Path(stem_path)
+    stem = p.stem if p.suffix == ".txt" else p.name
+    return p.with_name(stem + VECTORS_SUFFIX), p.with_name(stem + META_SUFFIX)
+
+
+def _tmp(path: Path) -> Path:
+    # 같은 공시를 동시에 만들어도 임시파일이 겹치지 않도록 스레드별 이름
+    return path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def save_dense(stem_path: str | Path, vectors: np.ndarray, meta: dict, *, ivf: bool | None = None) -> DenseIndex:
+    """
+    벡터(.npy) + 메타/IVF(.npz) 저장 후 memmap으로 다시 연 DenseIndex 반환
+    - ivf=None이면 청크 수가 DENSE_IVF_MIN 이상일 때만 IVF 생성
+    """
+    vec_path, meta_path = dense_paths(stem_path)
+    vectors = np.asarray(vectors, dtype=np.float16)
+    n = len(vectors)
+
+    if ivf is None:
+        ivf = n >= IVF_MIN
+    nlist = max(1, int(np.sqrt(n))) if ivf and n else 0
+    if nlist:
+        centroids, list_ptr, list_ids = build_ivf(vectors, nlist)
+    else:
+        centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        list_ptr = list_ids = np.zeros(0, dtype=np.int64)
+
+    meta = {"format": DENSE_FORMAT, "n": n, "dim": int(vectors.shape[1]), **meta}
+
+    # 메타를 마지막에 replace -> 메타가 가리키는 벡터 파일은 항상 완성된 것
+    tmp = _tmp(vec_path)
+    with tmp.open("wb") as f:
+        np.save(f, vectors, allow_pickle=False)
+    os.replace(tmp, vec_path)
+
+    tmp = _tmp(meta_path)
+    with tmp.open("wb") as f:
+        np.savez(
+            f,
+            meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+            centroids=centroids,
+            list_ptr=list_ptr,
+            list_ids=list_ids,
+        )
+    os.replace(tmp, meta_path)
+
+    return load_dense(stem_path, expect=meta)
+
+
+def load_dense(stem_path: str | Path, *, expect: dict) -> DenseIndex | None:
+    """
+    저장된 dense 인덱스를 memmap으로 열기
+    - expect의 키(임베딩 이름 / 원문 해시 / 코퍼스 시그니처 ...)가 하나라도 다르거나 파일이 깨졌으면 None
+    """
+    vec_path, meta_path = dense_paths(stem_path)
+    if not (vec_path.exists() and meta_path.exists()):
+        return None
+
+    try:
+        with np.load(meta_path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.get("format") != DENSE_FORMAT:
+                return None
+            if any(meta.get(k) != v for k, v in expect.items()):
+                return None
+            centroids, list_ptr, list_ids = z["centroids"], z["list_ptr"], z["list_ids"]
+
+        if meta["n"] == 0:
+            vectors = np.zeros((0, meta["dim"]), dtype=np.float16)  # 빈 파일은 memmap 불가
+        else:
+            vectors = np.load(vec_path, mmap_mode="r", allow_pickle=False)
+        if vectors.shape != (meta["n"], meta["dim"]):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return DenseIndex(
+        vectors,
+        embedder_name=meta["embedder"],
+        centroids=centroids,
+        list_ptr=list_ptr,
+        list_ids=list_ids,
+    )
+
+
+def chunk_signature(chunks: ChunkStore) -> dict:
+    """청크가 같은지 (원문 해시 + span 해시) -> BM25 인덱스가 다시 만들어져 청크가 바뀌면 벡터도 무효"""
+    h = hashlib.sha256(chunks.starts.tobytes())
+    h.update(chunks.ends.tobytes())
+    return {
+        "text_sha256": hashlib.sha256(chunks.text.encode("utf-8")).hexdigest(),
+        "spans_sha256": h.hexdigest(),
+    }
+
+
+@timed("dense_index")
+def load_or_build_dense(txt_path: str | Path, chunks: ChunkStore, embedder: Embedder | None = None) -> DenseIndex:
+    """txt 옆에 같은 청크/임베딩으로 만든 벡터가 있으면 memmap으로 열고, 없으면 임베딩해서 저장"""
+    embedder = embedder or get_embedder()
+    expect = {"embedder": embedder.name, **chunk_signature(chunks)}
+
+    cached = load_dense(txt_path, expect=expect)
+    if cached is not None:
+        return cached
+    return save_dense(txt_path, embed_texts(list(chunks), embedder), expect)
+
+
+
+
+# 4. 순위 결합 (RRF)
+def rrf_fuse(
+    rankings: Sequence[Sequence[int]],
+    *,
+    k: float = RRF_K,
+    weights: Sequence[float] | None = None,
+) -> list[tuple[int, float]]:
+    """
+    Reciprocal Rank Fusion: score(d) = Σ w / (k + rank(d)), rank는 1부터
+    - 동점이면 번호가 작은 것 우선
+    """
+    fused: dict[int, float] = {}
+    for r, ranking in enumerate(rankings):
+        w = weights[r] if weights else 1.0
+        for rank, idx in enumerate(ranking, 1):
+            fused[idx] = fused.get(idx, 0.0) + w / (k + rank)
+    return sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+
+
+def hybrid_top_k(
+    bm25: SparseBM25,
+    dense: DenseIndex,
+    q_tok: Query,
+    q_vec: np.ndarray,
+    k: int = 3,
+    *,
+    mask: np.ndarray | None = None,
+    candidates: int = HYBRID_CANDIDATES,
+) -> list[tuple[int, float]]:
+    """BM25 Top-N + dense Top-N -> RRF -> 상위 k개 (score = RRF 점수)"""
+    n = max(k, candidates)
+    # BM25 점수 0(질의 단어가 하나도 없는 청크)은 순위에서 뺌 -> 단어가 안 맞으면 dense 순위만 반영
+    lexical = [i for i, s in bm25.top_k(q_tok, k=n, mask=mask) if s > 0]
+    semantic = [i for i, _ in dense.top_k(q_vec, k=n, mask=mask)]
+    return rrf_fuse([lexical, semantic])[:k]
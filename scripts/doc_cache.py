@@ -0,0 +1,289 @@
+"""
+doc_cache.py
+
+목표:
+- 한 번 제출된 공시 원문(document.xml zip)은 바뀌지 않으므로 rcept_no 기준으로 로컬에 보관
+  -> 같은 공시를 다시 load 하면 네트워크 호출 없이 디스크에서 바로 반환
+- 무결성: manifest에 크기 + sha256 기록, 읽을 때 둘 다 맞아야 hit (아니면 지우고 miss)
+  - 파일 읽기 / 해시는 lock 밖에서 (bulk ingest 워커 여러 개의 hit가 서로 기다리지 않도록)
+- 용량 제한: 전체 크기가 max_bytes를 넘으면 마지막 접근 시각이 오래된 것부터 삭제 (LRU)
+  - hit 때 바뀐 last_access는 메모리에만 두고 manifest는 MANIFEST_FLUSH_S마다 한 번 저장
+    (put / 삭제 / 종료 때는 바로 저장, 중간에 죽으면 LRU 순서만 조금 오래된 값)
+- 여러 프로세스(uvicorn 워커 여러 개, 서버 + bulk_ingest)가 같은 캐시를 씀
+  - manifest 저장은 파일 lock(manifest.lock, fcntl) 안에서 디스크 manifest를 다시 읽고
+    이 프로세스의 변경(추가 / 삭제 / last_access)만 합쳐서 씀 -> 다른 프로세스 항목을 덮어쓰지 않음
+  - 조회 때 manifest 파일이 바뀌었으면 다시 읽음 (다른 프로세스가 받은 공시도 hit)
+  - fcntl이 없는 환경(Windows)은 프로세스 안에서만 직렬화
+
+구성:
+- data/cache/documents/<rcept_no>.zip
+- data/cache/documents/manifest.json  {rcept_no: {size, sha256, created, last_access}}
+- data/cache/documents/manifest.lock  manifest 읽기-수정-쓰기용 파일 lock
+
+환경변수:
+- DOC_CACHE=0          캐시 끄기 (기본 켜짐)
+- DOC_CACHE_MAX_MB     디스크 예산(MB, 기본 2048)
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 lock 없음 (워커 1개 기준)
+    fcntl = None
+
+
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = ROOT / "data" / "cache" / "documents"
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "manifest.lock"
+MANIFEST_FLUSH_S = 5.0  # hit의 last_access만 바뀌었을 때 manifest 저장 간격
+
+_RCEPT_NO = re.compile(r"^\d{14}$")
+
+
+class DocumentCache:
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR,
+        *,
+        max_bytes: int = 2048 * 2**20,
+        enabled: bool = True,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        self._entries: dict[str, dict] | None = None  # 처음 쓸 때 manifest 로드
+        self._stamp: tuple[int, int] | None = None   # 마지막으로 읽거나 쓴 manifest 파일 (inode, mtime_ns)
+        self._touched: dict[str, float] = {}          # 아직 저장 안 된 hit의 last_access
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "corrupt": 0,
+            "evictions": 0,
+            "bytes_saved": 0,       # hit으로 다운로드를 건너뛴 바이트
+            "bytes_downloaded": 0,  # miss 후 put된 바이트
+        }
+
+    # ---- 내부 ----
+    def _path(self, rcept_no: str) -> Path:
+        return self.cache_dir / f"{rcept_no}.zip"
+
+    @staticmethod
+    def _tmp(path: Path) -> Path:
+        # 워커 프로세스끼리 스레드 id가 겹칠 수 있으므로 프로세스/스레드별 이름
+        return path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def _manifest_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = (self.cache_dir / MANIFEST_NAME).stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _read_manifest(self) -> dict[str, dict]:
+        try:
+            data = json.loads((self.cache_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _apply_touched(self, entries: dict[str, dict]) -> None:
+        for rcept_no, t in self._touched.items():
+            if rcept_no in entries:
+                entries[rcept_no]["last_access"] = max(entries[rcept_no]["last_access"], t)
+
+    def _load_manifest(self) -> dict[str, dict]:
+        """(self._lock 안에서) manifest, 다른 프로세스가 다시 썼으면 다시 읽음"""
+        stamp = self._manifest_stamp()
+        if self._entries is None or stamp != self._stamp:
+            data = self._read_manifest()
+            if self._entries is None:
+                # 파일이 지워진 항목은 버림
+                data = {k: v for k, v in data.items() if self._path(k).exists()}
+            self._apply_touched(data)
+            self._entries, self._stamp = data, stamp
+        return self._entries
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """manifest 읽기-수정-쓰기를 프로세스 사이에서도 한 번에 하나씩"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with (self.cache_dir / LOCK_NAME).open("a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self, change: Callable[[dict[str, dict]], None] | None = None) -> bool:
+        """
+        (self._lock 안에서) 파일 lock -> 디스크 manifest 다시 읽기 -> 쌓인 last_access + change 적용 -> 저장
+        - 그 사이 다른 프로세스가 추가 / 삭제한 항목은 그대로 남음
+        - 저장까지 됐으면 True
+        """
+        self._saved_at = time.monotonic()
+        entries = None
+        try:
+            with self._file_lock():
+                entries = self._read_manifest()
+                self._apply_touched(entries)
+                self._touched.clear()
+                if change is not None:
+                    change(entries)
+
+                path = self.cache_dir / MANIFEST_NAME
+                tmp = self._tmp(path)
+                tmp.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, path)
+                self._stamp = self._manifest_stamp()
+            return True
+        except OSError:
+            # 디스크 캐시는 best-effort (읽기 전용 배포 환경 등)
+            return False
+        finally:
+            if entries is not None:
+                self._entries = entries
+
+    def _drop(self, entries: dict[str, dict], rcept_no: str) -> None:
+        entries.pop(rcept_no, None)
+        self._path(rcept_no).unlink(missing_ok=True)
+
+    def _evict_to_budget(self, entries: dict[str, dict], keep: str) -> None:
+        """다른 프로세스 항목까지 합친 manifest 기준 (예산은 캐시 디렉터리 전체)"""
+        total = sum(e["size"] for e in entries.values())
+        if total <= self.max_bytes:
+            return
+        for rcept_no, _ in sorted(entries.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if rcept_no == keep:
+                continue
+            total -= entries[rcept_no]["size"]
+            self._drop(entries, rcept_no)
+            self._counters["evictions"] += 1
+
+    # ---- 조회 / 저장 ----
+    def get(self, rcept_no: str) -> bytes | None:
+        """크기/sha256이 manifest와 일치할 때만 반환"""
+        if not self.enabled or not _RCEPT_NO.match(rcept_no):
+            return None
+
+        with self._lock:
+            entry = self._load_manifest().get(rcept_no)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            size, sha256, created = entry["size"], entry["sha256"], entry.get("created")
+
+        # 읽기 / 해시는 lock 밖 (파일은 os.replace로만 바뀌므로 이전 것이든 새 것이든 통째로 읽힘)
+        path = self._path(rcept_no)
+        try:
+            ok = path.stat().st_size == size
+            content = path.read_bytes() if ok else b""
+        except OSError:
+            ok, content = False, b""
+        ok = ok and len(content) == size and hashlib.sha256(content).hexdigest() == sha256
+
+        with self._lock:
+            if not ok:
+                def drop_corrupt(entries: dict[str, dict]) -> None:
+                    # 그 사이 put(이 프로세스든 다른 프로세스든)으로 바뀐 항목이면 새 항목은 건드리지 않음
+                    current = entries.get(rcept_no)
+                    if current is not None and (current["sha256"], current.get("created")) == (sha256, created):
+                        self._drop(entries, rcept_no)
+                        self._counters["corrupt"] += 1
+
+                self._sync(drop_corrupt)
+                self._counters["misses"] += 1
+                return None
+
+            now = time.time()
+            self._touched[rcept_no] = now
+            current = self._load_manifest().get(rcept_no)
+            if current is not None:
+                current["last_access"] = now
+            if time.monotonic() - self._saved_at >= MANIFEST_FLUSH_S:
+                self._sync()
+            self._counters["hits"] += 1
+            self._counters["bytes_saved"] += size
+            return content
+
+    def put(self, rcept_no: str, content: bytes) -> None:
+        if not self.enabled or not _RCEPT_NO.match(rcept_no):
+            return
+        if len(content) > self.max_bytes:
+            return  # 예산보다 큰 파일은 캐시하지 않음
+
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        def add(entries: dict[str, dict]) -> None:
+            # zip 교체도 파일 lock 안에서 (다른 프로세스의 손상 검사가 새 zip을 이전 항목으로 보고 지우지 않도록)
+            path = self._path(rcept_no)
+            tmp = self._tmp(path)
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+
+            now = time.time()
+            entries[rcept_no] = {
+                "size": len(content),
+                "sha256": sha256,
+                "created": now,
+                "last_access": now,
+            }
+            self._evict_to_budget(entries, keep=rcept_no)
+
+        with self._lock:
+            if self._sync(add):
+                self._counters["bytes_downloaded"] += len(content)
+
+    # ---- 관리 ----
+    def flush(self) -> None:
+        """저장 안 된 last_access 변경을 manifest에 (종료 때 자동 호출)"""
+        with self._lock:
+            if self._touched:
+                self._sync()
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counters)
+            entries = self._load_manifest() if self.enabled else {}
+            c["items"] = len(entries)
+            c["bytes"] = sum(e["size"] for e in entries.values())
+        lookups = c["hits"] + c["misses"]
+        c["hit_rate"] = round(c["hits"] / lookups, 4) if lookups else 0.0
+        c["max_bytes"] = self.max_bytes
+        c["enabled"] = self.enabled
+        return c
+
+    def clear(self) -> None:
+        def drop_all(entries: dict[str, dict]) -> None:
+            for rcept_no in list(entries):
+                self._drop(entries, rcept_no)
+
+        with self._lock:
+            self._sync(drop_all)
+
+
+document_cache = DocumentCache(
+    max_bytes=int(float(os.getenv("DOC_CACHE_MAX_MB", "2048")) * 2**20),
+    enabled=os.getenv("DOC_CACHE", "1").strip().lower() not in {"0", "false", "no"},
+)
+atexit.register(document_cache.flush)
@@ -0,0 +1,245 @@
+"""
+index_manager.py
+
+목표:
+- 백엔드가 load한 공시(rcept_no)별 인덱스(청크 + BM25 + 필드 저장소)를 메모리 예산 안에서만 들고 있기
+  - 기존 _chunks_map / _bm25_map 은 load한 공시 수만큼 계속 커져서 프로세스가 점점 부풀었음
+- 항목마다 크기(원문 + span 배열 + posting 배열 + 단어 사전 + 필드 컬럼)를 계산해서 합계가 max_bytes를 넘으면
+  가장 오래 안 쓴 것부터 메모리에서 내림 (LRU)
+  - 인덱스/필드는 load 때 이미 data/clean/<rcept_no>.bm25.npz / .fields.npz 로 저장돼 있으므로 내리기만 하면 됨
+- 내려간 공시를 다시 조회하면 디스크에서 자동으로 다시 올림 (재토큰화 없음, 서버 재시작 후에도 동일)
+  - 같은 공시를 동시에 조회하면 한 스레드만 올리고 나머지는 기다렸다가 그 결과를 씀 (single-flight)
+- 카운터: 상주 개수/바이트, hit/reload/eviction, reload 지연시간
+- hybrid 검색용 dense 벡터(<rcept_no>.dense.npy)는 memmap이라 예산에 넣지 않음 (처음 쓸 때 dense_of로 엶)
+  - 벡터가 없어서 임베딩해야 하면 같은 공시는 한 스레드만 (EMBEDDER=openai면 청크 전체 API 호출이라)
+
+환경변수:
+- INDEX_CACHE_MAX_MB   메모리 예산(MB, 기본 512)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from scripts.bm25_index import SparseBM25
+from scripts.chunker import ChunkStore
+from scripts.dense_index import DenseIndex, load_or_build_dense
+from scripts.index_store import load_or_build_index
+from scripts.table_store import FieldStore, load_field_store
+
+
+ROOT = Path(__file__).resolve().parents[1]
+CLEAN_DIR = ROOT / "data" / "clean"
+
+
+
+
+# 1. 항목 / 크기 계산
+@dataclass
+class LoadedIndex:
+    rcept_no: str
+    txt_path: Path
+    chunks: ChunkStore
+    bm25: SparseBM25
+    fields: FieldStore | None
+    nbytes: int
+    dense: DenseIndex | None = None  # hybrid 검색을 처음 쓸 때 채움
+
+
+_dense_loading: dict[str, threading.Lock] = {}  # 지금 dense를 열거나 만드는 중인 rcept_no -> 공시별 lock
+_dense_lock = threading.Lock()
+
+
+def dense_of(entry: LoadedIndex) -> DenseIndex:
+    """
+    항목의 dense 인덱스 (디스크 벡터가 있으면 memmap으로 열고, 없으면 임베딩해서 저장)
+    - 같은 공시는 한 스레드만 만들고 나머지는 공시별 lock에서 기다렸다가 그 결과를 씀 (IndexManager.get과 같은 방식)
+    """
+    if entry.dense is not None:
+        return entry.dense
+    with _dense_lock:
+        build_lock = _dense_loading.setdefault(entry.rcept_no, threading.Lock())
+
+    try:
+        with build_lock:
+            # 기다리는 사이 다른 요청이 먼저 만들었으면 그걸 씀
+            if entry.dense is None:
+                entry.dense = load_or_build_dense(entry.txt_path, entry.chunks)
+            return entry.dense
+    finally:
+        with _dense_lock:
+            if _dense_loading.get(entry.rcept_no) is build_lock:
+                del _dense_loading[entry.rcept_no]
+
+
+def _strings_nbytes(items) -> int:
+    # 문자열 객체 + 리스트/dict 슬롯(포인터)
+    return sum(sys.getsizeof(s) for s in items) + 8 * len(items)
+
+
+def index_nbytes(chunks: ChunkStore, bm25: SparseBM25, fields: FieldStore | None) -> int:
+    """항목 하나가 차지하는 메모리 추정치 (numpy 배열은 정확, 파이썬 문자열/dict는 getsizeof 기준)"""
+    n = sys.getsizeof(chunks.text) + chunks.nbytes
+    # 단어 사전: dict 본체 + 단어 문자열 + id int 객체
+    n += bm25.nbytes + sys.getsizeof(bm25.vocab) + _strings_nbytes(bm25.vocab) + 28 * len(bm25.vocab)
+    if fields is not None:
+        n += fields.table_id.nbytes + fields.row.nbytes + fields.num.nbytes
+        n += sum(_strings_nbytes(col) for col in fields.str_cols.values())
+    return int(n)
+
+
+
+
+# 2. LRU 관리자
+class IndexManager:
+    def __init__(self, *, max_bytes: int = 512 * 2**20, clean_dir: Path = CLEAN_DIR):
+        self.max_bytes = max_bytes
+        self.clean_dir = Path(clean_dir)
+
+        self._entries: OrderedDict[str, LoadedIndex] = OrderedDict()  # 앞쪽이 오래 안 쓴 것
+        self._paths: dict[str, Path] = {}  # 한 번이라도 올린 rcept_no -> txt (내려가도 유지)
+        self._loading: dict[str, threading.Lock] = {}  # 지금 디스크에서 올리는 중인 rcept_no -> 공시별 lock
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "reloads": 0,       # 메모리에 없어서 디스크에서 다시 올린 횟수
+            "reload_waits": 0,  # 다른 요청이 같은 공시를 올리는 동안 기다렸다가 그 결과를 쓴 횟수
+            "not_found": 0,     # txt도 없어서 올릴 수 없던 조회
+            "evictions": 0,
+            "evicted_bytes": 0,
+            "reload_s_total": 0.0,
+            "reload_s_max": 0.0,
+            "reload_s_last": 0.0,
+        }
+
+    # ---- 내부 ----
+    def _resident_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values())
+
+    def _insert(self, entry: LoadedIndex) -> LoadedIndex:
+        """lock 안에서 호출: 항목 추가 후 예산 초과분 제거 (방금 넣은 항목은 예산보다 커도 유지)"""
+        self._entries[entry.rcept_no] = entry
+        self._entries.move_to_end(entry.rcept_no)
+        self._paths[entry.rcept_no] = entry.txt_path
+
+        total = self._resident_bytes()
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            total -= old.nbytes
+            self._counters["evictions"] += 1
+            self._counters["evicted_bytes"] += old.nbytes
+        return entry
+
+    def _txt_path(self, rcept_no: str) -> Path:
+        return self._paths.get(rcept_no) or self.clean_dir / f"{rcept_no}.txt"
+
+    # ---- 조회 / 저장 ----
+    def put(
+        self,
+        rcept_no: str,
+        txt_path: str | Path,
+        chunks: ChunkStore,
+        bm25: SparseBM25,
+        fields: FieldStore | None,
+    ) -> LoadedIndex:
+        """load 직후 (이미 디스크에 저장된) 인덱스를 상주시킴"""
+        entry = LoadedIndex(rcept_no, Path(txt_path), chunks, bm25, fields, index_nbytes(chunks, bm25, fields))
+        with self._lock:
+            return self._insert(entry)
+
+    def get(self, rcept_no: str) -> LoadedIndex | None:
+        """
+        상주 중이면 그대로, 내려갔으면 디스크 인덱스에서 다시 올려서 반환
+        - txt가 없으면 None (한 번도 load 안 한 공시)
+        - 같은 공시는 한 스레드만 올림 (나머지는 공시별 lock에서 기다렸다가 올라온 항목을 씀)
+        """
+        with self._lock:
+            entry = self._hit(rcept_no)
+            if entry is not None:
+                return entry
+            txt_path = self._txt_path(rcept_no)
+            load_lock = self._loading.setdefault(rcept_no, threading.Lock())
+
+        try:
+            with load_lock:
+                with self._lock:
+                    # 기다리는 사이 다른 요청이 먼저 올렸으면 그걸 씀
+                    entry = self._entries.get(rcept_no)
+                    if entry is not None:
+                        self._entries.move_to_end(rcept_no)
+                        self._counters["reload_waits"] += 1
+                        return entry
+                return self._reload(rcept_no, txt_path)
+        finally:
+            with self._lock:
+                if self._loading.get(rcept_no) is load_lock:
+                    del self._loading[rcept_no]
+
+    def _hit(self, rcept_no: str) -> LoadedIndex | None:
+        """lock 안에서 호출: 상주 중이면 LRU 갱신 + hit"""
+        entry = self._entries.get(rcept_no)
+        if entry is not None:
+            self._entries.move_to_end(rcept_no)
+            self._counters["hits"] += 1
+        return entry
+
+    def _reload(self, rcept_no: str, txt_path: Path) -> LoadedIndex | None:
+        """공시별 lock 안에서 호출: 디스크 인덱스 -> 메모리 (파일 읽기는 전역 lock 밖, 다른 공시 조회를 막지 않도록)"""
+        if not txt_path.exists():
+            with self._lock:
+                self._counters["not_found"] += 1
+            return None
+
+        t0 = time.perf_counter()
+        chunks, bm25 = load_or_build_index(txt_path)
+        fields = load_field_store(txt_path)
+        nbytes = index_nbytes(chunks, bm25, fields)
+        elapsed = time.perf_counter() - t0
+
+        with self._lock:
+            c = self._counters
+            c["reloads"] += 1
+            c["reload_s_total"] += elapsed
+            c["reload_s_max"] = max(c["reload_s_max"], elapsed)
+            c["reload_s_last"] = elapsed
+            # 그 사이 load(put)가 새 인덱스를 넣었으면 그걸 씀
+            entry = self._entries.get(rcept_no)
+            if entry is not None:
+                self._entries.move_to_end(rcept_no)
+                return entry
+            return self._insert(LoadedIndex(rcept_no, txt_path, chunks, bm25, fields, nbytes))
+
+    def __contains__(self, rcept_no: str) -> bool:
+        """메모리에 상주 중인지 (LRU 순서는 바꾸지 않음)"""
+        with self._lock:
+            return rcept_no in self._entries
+
+    # ---- 관리 ----
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counters)
+            c["resident"] = len(self._entries)
+            c["resident_bytes"] = self._resident_bytes()
+            c["known"] = len(self._paths)
+            c["entries"] = [{"rcept_no": e.rcept_no, "bytes": e.nbytes} for e in reversed(self._entries.values())]
+        lookups = c["hits"] + c["reloads"]
+        c["hit_rate"] = round(c["hits"] / lookups, 4) if lookups else 0.0
+        c["reload_s_avg"] = round(c["reload_s_total"] / c["reloads"], 4) if c["reloads"] else 0.0
+        for k in ("reload_s_total", "reload_s_max", "reload_s_last"):
+            c[k] = round(c[k], 4)
+        c["max_bytes"] = self.max_bytes
+        return c
+
+    def clear(self) -> None:
+        """메모리에서만 내림 (디스크 인덱스는 그대로)"""
+        with self._lock:
+            self._entries.clear()
+
+
+index_manager = IndexManager(max_bytes=int(float(os.getenv("INDEX_CACHE_MAX_MB", "512")) * 2**20))
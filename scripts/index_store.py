@@ -0,0 +1,179 @@
+"""
+index_store.py
+
+목표:
+- 공시(rcept_no)별 청크 + BM25 posting 배열을 data/clean/<rcept_no>.bm25.npz 로 저장
+- 다음 load(또는 서버 재시작) 때는 토큰화 없이 파일에서 바로 복원
+
+무효화 규칙:
+- 원문 텍스트의 sha256이 바뀌면 다시 빌드
+- scripts/tokenizer.py 토큰화 규칙(소스)이 바뀌면 다시 빌드
+
+파일 구성 (npz, pickle 없음):
+- meta: json(포맷/토크나이저 해시/텍스트 해시/BM25 파라미터)을 utf-8 바이트로
+- span_starts/span_ends/span_sections/section_spans: 청크/섹션 제목은 원문 txt 위의 span으로만 저장
+  (청크 문자열은 저장하지 않음, 복원할 때 txt를 그대로 원문으로 씀)
+- vocab_blob/vocab_offsets: 단어 사전을 바이트 버퍼 + 오프셋으로
+- indptr/doc_ids/tfs/doc_len: SparseBM25 CSR 배열 그대로
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from scripts import tokenizer as tokenizer_module
+from scripts._rag_answer_with_citations import build_bm25
+from scripts.bm25_index import SparseBM25
+from scripts.chunker import ChunkStore, build_chunks
+from scripts.metrics import timed
+from scripts.string_table import pack_strings, unpack_strings
+
+
+INDEX_FORMAT = 3
+INDEX_SUFFIX = ".bm25.npz"
+
+
+
+
+# 1. 버전/해시
+def tokenizer_version() -> str:
+    """
+    토큰화 규칙이 바뀌면 값이 바뀌는 해시
+    - 토크나이저 모듈 소스를 그대로 해시하므로 규칙을 고치면 자동으로 인덱스가 무효화됨
+    - 용어 정규화 표는 사전 파일에서 읽으므로 따로 해시 (순서도 결과에 영향)
+    """
+    h = hashlib.sha256()
+    try:
+        h.update(inspect.getsource(tokenizer_module).encode("utf-8"))
+    except (OSError, TypeError):
+        pass
+    h.update(repr(list(tokenizer_module.FIN_TERM_REPLACEMENTS.items())).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_path(txt_path: str | Path) -> Path:
+    """data/clean/<rcept_no>.txt -> data/clean/<rcept_no>.bm25.npz"""
+    txt_path = Path(txt_path)
+    return txt_path.with_name(txt_path.stem + INDEX_SUFFIX)
+
+
+
+
+# 2. 저장 / 복원
+@timed("index_save")
+def save_index(path: Path, chunks: ChunkStore, bm25: SparseBM25, *, text_sha256: str) -> Path:
+    meta = {
+        "format": INDEX_FORMAT,
+        "tokenizer": tokenizer_version(),
+        "text_sha256": text_sha256,
+        "params": {"k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon},
+    }
+    # vocab dict는 삽입 순서 = 단어 번호 순서
+    vocab_blob, vocab_offsets = pack_strings(list(bm25.vocab))
+
+    # 쓰다가 죽어도 깨진 인덱스가 남지 않도록 임시파일 -> replace
+    # 같은 공시를 여러 스레드/워커가 동시에 저장해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez(
+            f,
+            meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            span_starts=chunks.starts,
+            span_ends=chunks.ends,
+            span_sections=chunks.section_ids,
+            section_spans=chunks.section_spans,
+            vocab_blob=vocab_blob,
+            vocab_offsets=vocab_offsets,
+            indptr=bm25.indptr,
+            doc_ids=bm25.doc_ids,
+            tfs=bm25.tfs,
+            doc_len=bm25.doc_len,
+        )
+    os.replace(tmp, path)
+    return path
+
+
+@timed("index_load")
+def load_index(path: Path, *, text: str, text_sha256: str) -> tuple[ChunkStore, SparseBM25] | None:
+    """
+    저장된 인덱스 복원
+    - 파일이 없거나, 텍스트/토크나이저가 바뀌었거나, 깨졌으면 None
+    - 청크는 text(원문) 위의 span으로 복원
+    """
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.get("format") != INDEX_FORMAT:
+                return None
+            if meta.get("tokenizer") != tokenizer_version():
+                return None
+            if meta.get("text_sha256") != text_sha256:
+                return None
+
+            chunks = ChunkStore(
+                text,
+                z["span_starts"],
+                z["span_ends"],
+                z["span_sections"],
+                z["section_spans"],
+            )
+            terms = unpack_strings(z["vocab_blob"], z["vocab_offsets"])
+            bm25 = SparseBM25(
+                {t: i for i, t in enumerate(terms)},
+                z["indptr"],
+                z["doc_ids"],
+                z["tfs"],
+                z["doc_len"],
+                **meta["params"],
+            )
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return chunks, bm25
+
+
+
+
+# 3. load 경로에서 쓰는 진입점
+def load_or_build_index(
+    txt_path: str | Path,
+    *,
+    progress: Callable[[str], None] | None = None,
+) -> tuple[ChunkStore, SparseBM25]:
+    """
+    txt 옆에 유효한 인덱스가 있으면 그대로 읽고,
+    없으면 청킹 + BM25를 만든 뒤 저장
+    - progress: "chunk" / "index" 단계 알림 (저장된 인덱스를 읽으면 "index"만)
+    """
+    progress = progress or (lambda stage: None)
+    txt_path = Path(txt_path)
+    text = txt_path.read_text(encoding="utf-8", errors="ignore")
+    sha = text_hash(text)
+    path = index_path(txt_path)
+
+    cached = load_index(path, text=text, text_sha256=sha)
+    if cached is not None:
+        progress("index")
+        return cached
+
+    progress("chunk")
+    chunks = build_chunks(text)
+    progress("index")
+    bm25 = build_bm25(chunks)
+    save_index(path, chunks, bm25, text_sha256=sha)
+    return chunks, bm25
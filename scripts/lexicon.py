@@ -0,0 +1,285 @@
+"""
+lexicon.py
+
+목표:
+- 질문 -> 가중치가 붙은 여러 단어 BM25 질의 ({토큰: 가중치})
+  - 예전 to_query_keyword는 rag / report에 규칙이 복사돼 있었고, 질문 전체를 키워드 1개로 바꿔서 나머지 단어를 버렸음
+  - 이제는 질문 토큰(가중치 1) + 질문에서 찾은 용어의 대표 용어(weight) + 같이 검색할 용어(expand_weight)
+- 규칙은 코드가 아니라 금융 용어 사전(data/lexicon/fin_lexicon.yaml, PyYAML)
+  - 시작할 때(처음 쓸 때) 별칭 전체를 문자 trie 하나로 컴파일
+  - 질문은 trie로 한 번 훑어서(single pass) 토큰 경계에서 시작하는 가장 긴 별칭부터 매칭
+    -> 용어가 수천 개여도 규칙을 하나씩 검사하지 않음
+    (질문 길이 x 별칭 최대 길이 만큼만 dict 조회)
+- 파일이 바뀌면 자동 반영(hot reload): LEXICON_CHECK_S마다 mtime 확인 -> 다시 컴파일해서 통째로 교체
+  - 고친 파일이 깨져 있으면 이전 사전을 계속 쓰고 stats()의 last_error에 남김
+  - normalize 섹션은 인덱스 토큰화와 맞아야 하므로 여기서 다시 읽지 않음 (scripts/tokenizer.py가 시작할 때 한 번)
+
+환경변수:
+- LEXICON_PATH      사전 파일 (기본 data/lexicon/fin_lexicon.yaml)
+- LEXICON_CHECK_S   파일 변경 확인 주기(초, 기본 2, 0이면 매번 확인)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+import yaml
+
+from scripts.tokenizer import LEXICON_PATH, tokenizer
+
+
+DEFAULT_WEIGHT = 2.0
+DEFAULT_EXPAND_WEIGHT = 0.5
+
+_END = ""  # trie 노드에서 별칭이 끝났다는 표시 (문자 1개짜리 키와 겹치지 않음)
+
+
+
+
+# 1. 사전 항목 / trie
+@dataclass(frozen=True)
+class LexiconEntry:
+    term: str
+    order: int  # 파일에서의 순서 (작을수록 우선)
+    weights: dict[str, float]  # 질의에 더할 {토큰: 가중치} (대표 용어 + expand)
+    field: bool = False
+
+
+def _alias_key(s: str) -> str:
+    """별칭/질문을 같은 형태로 (용어 정규화 + 소문자)"""
+    return tokenizer.normalize(s).lower()
+
+
+class _Trie:
+    def __init__(self):
+        self.root: dict[str, Any] = {}
+        self.size = 0
+
+    def add(self, word: str, value: LexiconEntry) -> None:
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if _END not in node:
+            self.size += 1
+            node[_END] = value  # 같은 별칭이 여러 항목에 있으면 먼저 나온 항목
+
+    def scan(self, text: str) -> Iterator[tuple[int, int, LexiconEntry]]:
+        """
+        왼쪽부터 겹치지 않게, 각 위치에서 가장 긴 별칭 (start, end, entry)
+        - 별칭은 토큰 경계(문장 처음 / 공백·문장부호 뒤)에서 시작할 때만 ('비상장'에서 '상장'은 안 잡음)
+        - 끝은 경계가 아니어도 됨 (한국어 조사: '만기가', '등급은')
+        """
+        root = self.root
+        i, n = 0, len(text)
+        while i < n:
+            node = root.get(text[i])
+            if node is None or (i > 0 and text[i - 1].isalnum()):
+                i += 1
+                continue
+            j = i + 1
+            best = None
+            while True:
+                if _END in node:
+                    best = (j, node[_END])
+                if j >= n:
+                    break
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+            if best is None:
+                i += 1
+            else:
+                yield i, best[0], best[1]
+                i = best[0]
+
+
+
+
+# 2. 컴파일된 사전
+@dataclass
+class QueryExpansion:
+    terms: dict[str, float]  # BM25 질의 {토큰: 가중치}
+    concepts: list[LexiconEntry] = field(default_factory=list)  # 질문에서 찾은 용어 (파일 순서)
+
+
+def _tokens_with_weight(terms: list[str], weight: float, out: dict[str, float]) -> None:
+    for t in terms:
+        for tok in tokenizer.tokenize(t):
+            out[tok] = max(out.get(tok, 0.0), weight)
+
+
+class CompiledLexicon:
+    def __init__(self, data: dict | None = None, *, source: str = ""):
+        data = data or {}
+        defaults = data.get("defaults") or {}
+        weight = float(defaults.get("weight", DEFAULT_WEIGHT))
+        expand_weight = float(defaults.get("expand_weight", DEFAULT_EXPAND_WEIGHT))
+
+        self.source = source
+        self.lookup_words = frozenset(tok for w in data.get("lookup_words") or [] for tok in tokenizer.tokenize(str(w)))
+        self.entries: list[LexiconEntry] = []
+        self._trie = _Trie()
+        for order, raw in enumerate(data.get("terms") or []):
+            term = str(raw["term"]).strip()
+            weights: dict[str, float] = {}
+            expand = raw.get("expand") or []
+            if isinstance(expand, dict):
+                for t, w in expand.items():
+                    _tokens_with_weight([str(t)], float(w), weights)
+            else:
+                _tokens_with_weight([str(t) for t in expand], expand_weight, weights)
+            _tokens_with_weight([term], float(raw.get("weight", weight)), weights)
+
+            entry = LexiconEntry(term=term, order=order, weights=weights, field=bool(raw.get("field", False)))
+            self.entries.append(entry)
+            for alias in (term, *(raw.get("aliases") or [])):
+                key = _alias_key(str(alias))
+                if key:
+                    self._trie.add(key, entry)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "CompiledLexicon":
+        data = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+        if data is not None and not isinstance(data, dict):
+            raise ValueError(f"사전 최상위는 mapping이어야 합니다: {path}")
+        return cls(data, source=str(path))
+
+    @property
+    def n_aliases(self) -> int:
+        return self._trie.size
+
+    def match(self, question: str) -> list[tuple[str, LexiconEntry]]:
+        """질문에서 찾은 (별칭, 항목), 질문 순서"""
+        text = _alias_key(question)
+        return [(text[s:e], entry) for s, e, entry in self._trie.scan(text)]
+
+    def lookup_field(self, question: str) -> str | None:
+        """
+        표 필드 값으로 바로 답해도 되는 질문이면 그 대표 용어, 아니면 None
+        - 찾은 용어가 정확히 1개(field: true)이고
+        - 별칭을 빼고 남은 토큰이 전부 lookup_words(얼마야 / 언제야 ...)일 때만
+          ("만기 전에 조기상환이 가능한가요?"처럼 조건이 붙은 질문은 검색 + LLM으로)
+        """
+        text = _alias_key(question)
+        spans = list(self._trie.scan(text))
+        entries = {entry.order: entry for _, _, entry in spans}
+        if len(entries) != 1:
+            return None
+        entry = next(iter(entries.values()))
+        if not entry.field:
+            return None
+
+        rest, prev = [], 0
+        for s, e, _ in spans:
+            rest.append(text[prev:s])
+            prev = e
+        rest.append(text[prev:])
+        extra = [t for t in tokenizer.tokenize(" ".join(rest)) if t not in self.lookup_words]
+        return None if extra else entry.term
+
+    def expand(self, question: str) -> QueryExpansion:
+        terms: dict[str, float] = {}
+        for tok in tokenizer.tokenize(question):
+            terms[tok] = terms.get(tok, 0.0) + 1.0  # 같은 단어가 여러 번이면 기존처럼 가중치 n
+
+        concepts: dict[int, LexiconEntry] = {}
+        for alias, entry in self.match(question):
+            # 조사가 붙은 '만기가' 같은 토큰 대신 별칭 자체도 질의에 넣음
+            _tokens_with_weight([alias], 1.0, terms)
+            concepts.setdefault(entry.order, entry)
+        for entry in concepts.values():
+            for tok, w in entry.weights.items():
+                terms[tok] = max(terms.get(tok, 0.0), w)
+
+        return QueryExpansion(terms=terms, concepts=sorted(concepts.values(), key=lambda e: e.order))
+
+
+
+
+# 3. 파일 변경 감지 (hot reload)
+class LexiconStore:
+    def __init__(self, path: Path = LEXICON_PATH, *, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lexicon: CompiledLexicon | None = None
+        self._stamp: tuple[int, int] | None = None  # (mtime_ns, size)
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.last_error = ""
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> CompiledLexicon:
+        now = time.monotonic()
+        lex = self._lexicon
+        if lex is not None and now - self._checked < self.check_interval:
+            return lex
+        with self._lock:
+            if self._lexicon is not None and now - self._checked < self.check_interval:
+                return self._lexicon
+            self._checked = now
+            stamp = self._file_stamp()
+            if self._lexicon is None or stamp != self._stamp:
+                self._reload(stamp)
+            return self._lexicon
+
+    def _reload(self, stamp: tuple[int, int] | None) -> None:
+        self._stamp = stamp
+        if stamp is None:
+            self.last_error = f"사전 파일 없음: {self.path}"
+            if self._lexicon is None:
+                self._lexicon = CompiledLexicon(source=str(self.path))
+            return
+        try:
+            lex = CompiledLexicon.from_file(self.path)
+        except (OSError, ValueError, KeyError, TypeError, yaml.YAMLError) as e:
+            # 고치는 중에 깨진 파일이면 이전 사전 유지 (다음 수정 때 다시 시도)
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self._lexicon is None:
+                self._lexicon = CompiledLexicon(source=str(self.path))
+            return
+        self._lexicon = lex
+        self.reloads += 1
+        self.last_error = ""
+
+    def stats(self) -> dict:
+        lex = self.get()
+        return {
+            "path": str(self.path),
+            "terms": len(lex.entries),
+            "aliases": lex.n_aliases,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+
+
+lexicon = LexiconStore(check_interval=float(os.getenv("LEXICON_CHECK_S", "2")))
+
+
+
+
+# 4. 질의 API
+def expand_query(question: str) -> QueryExpansion:
+    return lexicon.get().expand(question)
+
+
+def query_terms(question: str) -> dict[str, float]:
+    """질문 -> BM25 질의 {토큰: 가중치}"""
+    return expand_query(question).terms
+
+
+def lookup_field(question: str) -> str | None:
+    """표 필드로 바로 답해도 되는 단순 조회 질문이면 대표 용어 (CompiledLexicon.lookup_field)"""
+    return lexicon.get().lookup_field(question)
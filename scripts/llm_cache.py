@@ -0,0 +1,154 @@
+"""
+llm_cache.py
+
+목표:
+- 같은 공시에 같은 질문(예: /report의 고정 4문항)이면 OpenAI를 다시 부르지 않도록 답변 캐시
+- 키: model + temperature + sha256(system prompt + build_prompt 결과)
+  -> 근거(evidence)가 바뀌면 프롬프트가 바뀌므로 자동으로 다른 키
+
+2단 구조:
+- 1단: 프로세스 메모리 LRU (개수 제한 + TTL)
+- 2단: 디스크 data/cache/llm/<키 앞 2자리>/<키>.json (재시작 후에도 유지, TTL 적용)
+
+환경변수:
+- LLM_CACHE=0        캐시 끄기 (기본 켜짐)
+- LLM_CACHE_SIZE     메모리 LRU 최대 개수 (기본 512)
+- LLM_CACHE_TTL      유효기간(초, 기본 7일)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = ROOT / "data" / "cache" / "llm"
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        cache_dir: Path | None = CACHE_DIR,
+        *,
+        max_items: int = 512,
+        ttl: float = 7 * 24 * 3600,
+        enabled: bool = True,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_items = max_items
+        self.ttl = ttl
+        self.enabled = enabled
+
+        # key -> (저장 시각, 답변)
+        self._mem: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{model}|{temperature:.3f}|{digest}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    # ---- 조회 / 저장 ----
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if not self._expired(hit[0]):
+                    self._mem.move_to_end(key)
+                    self._counters["mem_hits"] += 1
+                    return hit[1]
+                del self._mem[key]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._mem_put(key, value[0], value[1])
+        return value[1]
+
+    def put(self, key: str, answer: str) -> None:
+        if not self.enabled or answer is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, now, answer)
+        self._disk_put(key, now, answer)
+
+    def bypass(self) -> None:
+        """캐시를 건너뛴 호출 수 집계용"""
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def _mem_put(self, key: str, created: float, answer: str) -> None:
+        self._mem[key] = (created, answer)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_get(self, key: str) -> tuple[float, str] | None:
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        created = float(data.get("created", 0))
+        if self._expired(created):
+            path.unlink(missing_ok=True)
+            return None
+        return created, data["answer"]
+
+    def _disk_put(self, key: str, created: float, answer: str) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 워커 프로세스끼리 스레드 id가 겹칠 수 있으므로 프로세스/스레드별 이름
+            tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"created": created, "answer": answer}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            # 디스크 캐시는 best-effort (읽기 전용 배포 환경 등)
+            pass
+
+    # ---- 관리 ----
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counters)
+            c["mem_items"] = len(self._mem)
+        lookups = c["mem_hits"] + c["disk_hits"] + c["misses"]
+        c["hit_rate"] = round((c["mem_hits"] + c["disk_hits"]) / lookups, 4) if lookups else 0.0
+        c["enabled"] = self.enabled
+        return c
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+
+
+answer_cache = AnswerCache(
+    max_items=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+    enabled=os.getenv("LLM_CACHE", "1").strip().lower() not in {"0", "false", "no"},
+)
@@ -0,0 +1,45 @@
+"""
+llm_client.py
+
+목표:
+- OpenAI 클라이언트를 import 시점이 아니라 처음 LLM을 부를 때 한 번만 만들어서 rag / report 모듈이 같이 씀
+  - 예전엔 두 모듈이 import 시점에 각자 OpenAI(...)를 만들고 키가 없으면 바로 ValueError
+    -> 키 없이는 backend.main을 import할 수 없었고(테스트, /health), 워커마다 openai 패키지 import 비용이 기동 시간에 들어감
+- openai 패키지도 처음 호출할 때 import
+- LLM_STUB=1 이면 클라이언트 없음(None) -> 호출하는 쪽이 가짜 LLM 사용
+
+환경변수:
+- OPENAI_API_KEY   실제 LLM 호출 때 필요 (없으면 그때 ValueError)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from scripts.llm_stub import stub_enabled
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+_client: OpenAI | None = None
+_lock = threading.Lock()
+
+
+def get_openai_client() -> OpenAI | None:
+    """프로세스 전체가 공유하는 OpenAI 클라이언트 (LLM_STUB=1 이면 None)"""
+    global _client
+    if stub_enabled():
+        return None
+    if _client is None:
+        with _lock:
+            if _client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY를 다시 확인해 주세요 (오프라인 테스트는 LLM_STUB=1)")
+                from openai import OpenAI  # 무거운 import는 실제로 LLM을 부를 때만
+
+                _client = OpenAI(api_key=api_key)
+    return _client
@@ -0,0 +1,48 @@
+"""
+llm_stub.py
+
+목표:
+- OpenAI 없이(오프라인/테스트) /ask, /ask/stream 을 돌려볼 수 있는 가짜 LLM
+- 프롬프트의 [S1] 근거 첫 줄을 그대로 인용해서 출력 형식(Answer/Evidence/Citations)을 흉내냄
+- 스트리밍은 단어 단위로 조금씩 내보내서 실제 토큰 스트림처럼 동작
+
+사용:
+LLM_STUB=1 uvicorn backend.main:app --port 8000
+LLM_STUB_DELAY=0.05 로 토큰 사이 지연(초) 조절
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from typing import Iterator
+
+
+def stub_enabled() -> bool:
+    return os.getenv("LLM_STUB", "").strip().lower() in {"1", "true", "yes"}
+
+
+def stub_answer(prompt: str) -> str:
+    m = re.search(r"^\[S1\] \(chunk_id=(\d+)[^)]*\)\n(.+)$", prompt, flags=re.MULTILINE)
+    if not m:
+        return "Answer:\n- 문서에서 확인되지 않음\nEvidence:\n- 없음\nCitations: 없음"
+
+    chunk_id, first_line = m.group(1), m.group(2).strip()
+    return (
+        "Answer:\n"
+        f"- (stub) {first_line}\n"
+        "Evidence:\n"
+        f"- [S1] chunk_id={chunk_id}: {first_line}\n"
+        "Citations: [S1]"
+    )
+
+
+def stub_stream(prompt: str, delay: float | None = None) -> Iterator[str]:
+    if delay is None:
+        delay = float(os.getenv("LLM_STUB_DELAY", "0.02"))
+    # 공백/줄바꿈을 보존한 채로 단어 단위로 쪼갬
+    for tok in re.findall(r"\S+\s*|\s+", stub_answer(prompt)):
+        if delay > 0:
+            time.sleep(delay)
+        yield tok
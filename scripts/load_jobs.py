@@ -0,0 +1,160 @@
+"""
+load_jobs.py
+
+목표:
+- 공시 load(다운로드 -> 압축해제 -> 파싱 -> 청킹 -> 인덱싱)를 요청 안에서 끝까지 돌리지 않고 백그라운드 작업으로
+  - POST는 job_id만 바로 돌려주고, 진행 상황은 상태 조회로 확인 (Streamlit이 polling)
+  - 요청 처리 스레드를 load 시간 내내 붙잡지 않으므로 동시 load가 많아도 API가 바로 응답
+- 단계별 진행률: download / extract / parse / chunk / index (단계마다 걸린 시간도 기록)
+- 같은 rcept_no의 load는 순서대로 (같은 txt/인덱스 파일을 동시에 쓰지 않도록), 다른 공시는 병렬
+  - 요청 안에서 바로 돌리는 load(wait=true)도 doc_lock으로 같은 순서에 들어감
+
+환경변수:
+- LOAD_WORKERS     동시에 돌릴 load 작업 수 (기본 4)
+- LOAD_JOBS_KEEP   끝난 작업 상태를 메모리에 남겨둘 개수 (기본 1000)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator
+
+
+STAGES = ("download", "extract", "parse", "chunk", "index")
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+
+
+@dataclass
+class LoadJob:
+    job_id: str
+    rcept_no: str
+    report_nm: str
+    status: str = QUEUED
+    stage: str = ""
+    progress: float = 0.0       # 0~1 (지나간 단계 수 / 전체 단계 수)
+    stage_s: dict[str, float] = field(default_factory=dict)  # 단계별 소요 시간(초)
+    result: dict[str, Any] | None = None
+    error: str = ""
+    created: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict[str, Any]:
+        d = asdict(self)
+        d["stages"] = list(STAGES)
+        d["elapsed_s"] = round(self.updated - self.created, 3)
+        d["stage_s"] = {k: round(v, 3) for k, v in self.stage_s.items()}
+        return d
+
+
+class LoadJobManager:
+    def __init__(self, *, max_workers: int = 4, keep: int = 1000):
+        self.keep = keep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load-job")
+        self._jobs: OrderedDict[str, LoadJob] = OrderedDict()
+        self._lock = threading.Lock()
+        # rcept_no -> (load 직렬화용 lock, 그 lock을 기다리거나 잡고 있는 수), 0이 되면 지움
+        self._doc_locks: dict[str, tuple[threading.Lock, int]] = {}
+        self._counters = {"submitted": 0, "done": 0, "error": 0}
+
+    # ---- 공시별 lock ----
+    @contextmanager
+    def doc_lock(self, rcept_no: str) -> Iterator[None]:
+        """같은 rcept_no의 load를 하나씩 (백그라운드 작업 / wait=true 요청 공통)"""
+        with self._lock:
+            lock, users = self._doc_locks.get(rcept_no, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._doc_locks[rcept_no] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._doc_locks[rcept_no]
+                if users <= 1:
+                    del self._doc_locks[rcept_no]
+                else:
+                    self._doc_locks[rcept_no] = (lock, users - 1)
+
+    # ---- 내부 ----
+
+    def _set_stage(self, job: LoadJob, stage: str) -> None:
+        now = time.time()
+        with self._lock:
+            if job.stage:
+                job.stage_s[job.stage] = job.stage_s.get(job.stage, 0.0) + now - job.updated
+            job.stage = stage
+            if stage in STAGES:
+                job.progress = STAGES.index(stage) / len(STAGES)
+            job.updated = now
+
+    def _finish(self, job: LoadJob, status: str, *, result: dict | None = None, error: str = "") -> None:
+        self._set_stage(job, "")
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            if status == DONE:
+                job.progress = 1.0
+            self._counters[status] += 1
+
+            # 끝난 작업은 최근 keep개만 유지 (진행 중인 작업은 지우지 않음)
+            finished = [jid for jid, j in self._jobs.items() if j.status in (DONE, ERROR)]
+            for jid in finished[: max(0, len(finished) - self.keep)]:
+                del self._jobs[jid]
+
+    def _run(self, job: LoadJob, fn: Callable[[Callable[[str], None]], dict]) -> None:
+        with self.doc_lock(job.rcept_no):
+            with self._lock:
+                job.status = RUNNING
+                job.updated = time.time()
+            try:
+                result = fn(lambda stage: self._set_stage(job, stage))
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job, ERROR, error=f"{type(e).__name__}: {e}")
+            else:
+                self._finish(job, DONE, result=result)
+
+    # ---- 제출 / 조회 ----
+    def submit(self, rcept_no: str, report_nm: str, fn: Callable[[Callable[[str], None]], dict]) -> LoadJob:
+        """
+        fn(progress) -> 결과 dict 를 백그라운드에서 실행
+        - fn은 단계가 바뀔 때마다 progress("download") 처럼 호출
+        """
+        job = LoadJob(job_id=uuid.uuid4().hex, rcept_no=rcept_no, report_nm=report_nm)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._counters["submitted"] += 1
+        # 제출한 요청의 컨텍스트(contextvars) 그대로 실행 -> 요청 단위 프로파일링 등이 작업 스레드까지 이어짐
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self._counters)
+            c["queued"] = sum(j.status == QUEUED for j in self._jobs.values())
+            c["running"] = sum(j.status == RUNNING for j in self._jobs.values())
+            c["doc_locks"] = len(self._doc_locks)
+        return c
+
+
+load_jobs = LoadJobManager(
+    max_workers=int(os.getenv("LOAD_WORKERS", "4")),
+    keep=int(os.getenv("LOAD_JOBS_KEEP", "1000")),
+)
@@ -0,0 +1,245 @@
+"""
+metrics.py
+
+목표:
+- load / ask 경로에서 시간이 어디에 쓰이는지 단계별로 측정 (외부 의존성 없는 가벼운 계측)
+  - 단계: download / extract / parse / chunk / bm25 / index_load / index_save / retrieve / llm ...
+- 단계별 latency 히스토그램 + 카운터(LLM 토큰 사용량 등) -> Prometheus 텍스트 포맷으로 /metrics
+- 요청 하나 안에서 걸린 단계별 시간은 Timings에 따로 모아서 응답의 debug 필드로 반환 가능
+
+사용:
+    @timed("chunk")
+    def build_chunks(...): ...
+
+    with timed("download"):
+        ...
+
+    with request_timings() as t:   # 이 블록 안(같은 스레드/컨텍스트)의 단계 시간이 t에 모임
+        ...
+    t.as_dict()
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+
+PREFIX = "dart_rag"
+
+# 초 단위 버킷 (파싱/청킹 ms 단위 ~ LLM 수십 초)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (이름, 타입, 라벨, 값) - 캐시 통계처럼 다른 모듈이 이미 들고 있는 값을 /metrics 때 읽어옴
+Sample = tuple[str, str, dict[str, str], float]
+
+
+
+
+# 1. 요청 단위 타이밍
+class Timings:
+    """요청 하나에서 단계별 누적 시간(초)과 카운터"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.counters: dict[str, float] = {}
+        self._lock = threading.Lock()  # 리포트처럼 요청 안에서 스레드 여러 개가 같이 기록
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def count(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            out = {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+                "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()},
+            }
+            multi = {k: n for k, n in self.calls.items() if n > 1}
+            if multi:
+                out["calls"] = multi
+            if self.counters:
+                out["counters"] = {k: int(v) if float(v).is_integer() else v for k, v in self.counters.items()}
+        return out
+
+
+_current: contextvars.ContextVar[Timings | None] = contextvars.ContextVar("timings", default=None)
+
+
+def current_timings() -> Timings | None:
+    return _current.get()
+
+
+@contextmanager
+def use_timings(timings: Timings | None) -> Iterator[Timings | None]:
+    """이 블록 안에서 기록되는 단계 시간을 timings에도 모음"""
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def request_timings() -> Iterator[Timings]:
+    with use_timings(Timings()) as t:
+        yield t
+
+
+
+
+# 2. 프로세스 전체 지표
+class _Histogram:
+    __slots__ = ("counts", "total", "n")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # 마지막 칸 = +Inf
+        self.total = 0.0
+        self.n = 0
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Metrics:
+    def __init__(self, buckets: tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._hist: dict[str, _Histogram] = {}
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._collectors: list[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            h = self._hist.get(stage)
+            if h is None:
+                h = self._hist[stage] = _Histogram(len(self.buckets))
+            h.counts[bisect_left(self.buckets, seconds)] += 1
+            h.total += seconds
+            h.n += 1
+        t = _current.get()
+        if t is not None:
+            t.add(stage, seconds)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """카운터 증가 (요청 타이밍이 있으면 'name.라벨값' 이름으로 거기에도 기록)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        t = _current.get()
+        if t is not None:
+            t.count(".".join([name, *labels.values()]), value)
+
+    def register_collector(self, fn: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(fn)
+
+    # ---- 출력 ----
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines: list[str] = []
+        name = f"{PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Latency of pipeline stages (download/parse/chunk/bm25/retrieve/llm ...)")
+        lines.append(f"# TYPE {name} histogram")
+        with self._lock:
+            hist = {k: (list(h.counts), h.total, h.n) for k, h in sorted(self._hist.items())}
+            counters = dict(sorted(self._counters.items()))
+
+        for stage, (counts, total, n) in hist.items():
+            acc = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                acc += c
+                lines.append(f"{name}_bucket{_fmt_labels({'stage': stage, 'le': str(le)})} {acc}")
+            lines.append(f"{name}_sum{_fmt_labels({'stage': stage})} {_fmt_value(total)}")
+            lines.append(f"{name}_count{_fmt_labels({'stage': stage})} {n}")
+
+        seen: set[str] = set()
+        for (cname, labels), v in counters.items():
+            full = f"{PREFIX}_{cname}"
+            if full not in seen:
+                seen.add(full)
+                lines.append(f"# TYPE {full} counter")
+            lines.append(f"{full}{_fmt_labels(dict(labels))} {_fmt_value(v)}")
+
+        for fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception:
+                continue  # 지표 수집 실패가 /metrics 전체를 깨지 않도록
+            for sname, stype, labels, v in samples:
+                full = f"{PREFIX}_{sname}"
+                if full not in seen:
+                    seen.add(full)
+                    lines.append(f"# TYPE {full} {stype}")
+                lines.append(f"{full}{_fmt_labels(labels)} {_fmt_value(v)}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+
+
+# 3. 계측 도우미
+class timed:
+    """
+    단계 시간 측정 (with 문 / 데코레이터 둘 다)
+    - 예외가 나도 걸린 시간은 기록
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._t0 = 0.0
+
+    def __enter__(self) -> "timed":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        metrics.observe(self.stage, time.perf_counter() - self._t0)
+
+    def __call__(self, fn: Callable) -> Callable:
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe(stage, time.perf_counter() - t0)
+
+        return wrapper
+
+
+def record_llm_usage(usage) -> None:
+    """OpenAI 응답의 usage(prompt_tokens / completion_tokens)를 토큰 카운터로"""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        n = getattr(usage, f"{kind}_tokens", None)
+        if n:
+            metrics.inc("llm_tokens_total", n, kind=kind)
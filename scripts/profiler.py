@@ -0,0 +1,242 @@
+"""
+profiler.py
+
+목표:
+- 특정 공시 load / 질문이 느릴 때 로컬에서 재현하지 않고, 운영 중인 백엔드에서 그 요청 하나만 프로파일링
+  - 관리자가 헤더(X-Profile: 1) 또는 쿼리(?profile=1)로 요청 -> 그 요청만 cProfile(결정적 프로파일러)로 실행
+  - 결과는 data/cache/profiles/<profile_id>.prof (pstats 형식) + .json (엔드포인트 / rcept_no / 소요 시간 / 상위 함수)
+  - 응답 헤더 X-Profile-Id로 profile_id 반환 -> /profiles 목록 / 다운로드
+- 꺼져 있으면(PROFILE_TOKEN 미설정) 오버헤드 0
+  - profiled(...) 데코레이터는 원래 함수를 그대로 돌려주고, 백엔드는 미들웨어도 등록하지 않음
+
+환경변수:
+- PROFILE_TOKEN   설정해야 켜짐. 요청에 같은 값(X-Profile-Token 헤더 또는 ?profile_token=)이 있어야 프로파일링
+- PROFILE_KEEP    보관할 프로파일 수 (기본 200, 넘으면 오래된 것부터 삭제)
+
+보기:
+python -m pstats data/cache/profiles/<profile_id>.prof   (또는 snakeviz 등)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import secrets
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+
+ROOT = Path(__file__).resolve().parents[1]
+PROFILE_DIR = ROOT / "data" / "cache" / "profiles"
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "").strip()
+ENABLED = bool(PROFILE_TOKEN)
+
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_\-]{8,64}$")
+
+TOP_N = 30  # 메타(.json)에 남길 상위 함수 수 (누적 시간 기준)
+
+
+
+
+# 1. 요청 단위 플래그
+@dataclass
+class ProfileRequest:
+    profile_id: str
+    started: bool = False  # 한 요청에서 한 번만 (중첩된 profiled 함수는 바깥 것만)
+
+
+_requested: contextvars.ContextVar[ProfileRequest | None] = contextvars.ContextVar("profile_request", default=None)
+
+
+def new_profile_id() -> str:
+    return f"{datetime.now():%Y%m%d_%H%M%S}_{secrets.token_hex(4)}"
+
+
+def authorized(token: str | None) -> bool:
+    return ENABLED and bool(token) and secrets.compare_digest(token, PROFILE_TOKEN)
+
+
+def request_profile() -> ProfileRequest:
+    """지금 컨텍스트(요청)를 프로파일링 대상으로 표시 (미들웨어에서 호출)"""
+    pr = ProfileRequest(new_profile_id())
+    _requested.set(pr)
+    return pr
+
+
+
+
+# 2. 저장소
+@dataclass
+class ProfileMeta:
+    profile_id: str
+    endpoint: str
+    rcept_no: str = ""
+    created: float = field(default_factory=time.time)
+    elapsed_s: float = 0.0
+    error: str = ""
+    top: list[dict[str, Any]] = field(default_factory=list)
+
+
+def _tmp(path: Path) -> Path:
+    # 같은 시각 / 같은 엔드포인트 요청이 동시에 저장해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    return path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _top_functions(stats: pstats.Stats, n: int = TOP_N) -> list[dict[str, Any]]:
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "func": f"{Path(filename).name}:{line}({func})",
+            "calls": nc,
+            "tottime_s": round(tt, 6),
+            "cumtime_s": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+    return rows[:n]
+
+
+class ProfileStore:
+    def __init__(self, profile_dir: Path = PROFILE_DIR, *, keep: int = 200):
+        self.profile_dir = Path(profile_dir)
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_id(profile_id: str | None) -> bool:
+        """파일 이름으로 쓰므로 형식이 맞는 id만 허용"""
+        return bool(profile_id) and bool(_PROFILE_ID.match(profile_id))
+
+    def path(self, profile_id: str, suffix: str = ".prof") -> Path | None:
+        if not self.valid_id(profile_id):
+            return None
+        p = self.profile_dir / f"{profile_id}{suffix}"
+        return p if p.exists() else None
+
+    def save(self, prof: cProfile.Profile, meta: ProfileMeta) -> ProfileMeta:
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stats = pstats.Stats(prof)
+        meta.top = _top_functions(stats)
+
+        prof_path = self.profile_dir / f"{meta.profile_id}.prof"
+        tmp = _tmp(prof_path)
+        stats.dump_stats(tmp)
+        os.replace(tmp, prof_path)
+
+        # 메타는 .prof 다음에 씀 -> 목록에 보이는 프로파일은 항상 다운로드 가능
+        meta_path = self.profile_dir / f"{meta.profile_id}.json"
+        tmp = _tmp(meta_path)
+        tmp.write_text(json.dumps(asdict(meta), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+        self._prune()
+        return meta
+
+    def _prune(self) -> None:
+        with self._lock:
+            metas = sorted(self.profile_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for p in metas[: max(0, len(metas) - self.keep)]:
+                p.unlink(missing_ok=True)
+                p.with_suffix(".prof").unlink(missing_ok=True)
+
+    def list(self, *, endpoint: str | None = None, rcept_no: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+        """최신순 메타 목록 (top 함수 목록은 빼고)"""
+        if not self.profile_dir.exists():
+            return []
+        out = []
+        for p in sorted(self.profile_dir.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+            try:
+                meta = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if endpoint and meta.get("endpoint") != endpoint:
+                continue
+            if rcept_no and meta.get("rcept_no") != rcept_no:
+                continue
+            meta.pop("top", None)
+            out.append(meta)
+            if len(out) >= limit:
+                break
+        return out
+
+    def text(self, profile_id: str, *, sort: str = "cumulative", limit: int = 50) -> str | None:
+        """pstats 표 (브라우저에서 바로 보기용)"""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        buf = io.StringIO()
+        pstats.Stats(str(path), stream=buf).sort_stats(sort).print_stats(limit)
+        return buf.getvalue()
+
+
+profile_store = ProfileStore(keep=int(os.getenv("PROFILE_KEEP", "200")))
+
+
+
+
+# 3. 계측 지점
+def _rcept_no_of(args: tuple, kwargs: dict, result: Any) -> str:
+    # 결과 dict(load/ask/report 응답) -> 요청 모델(req.rcept_no) -> rcept_no 인자 순서로 찾음
+    if isinstance(result, dict) and result.get("rcept_no"):
+        return str(result["rcept_no"])
+    for a in (*args, *kwargs.values()):
+        rn = getattr(a, "rcept_no", None)
+        if rn:
+            return str(rn)
+    return str(kwargs.get("rcept_no") or "")
+
+
+def profiled(endpoint: str) -> Callable[[Callable], Callable]:
+    """
+    요청이 프로파일링 대상이면 함수 전체를 cProfile로 실행하고 저장
+    - 꺼져 있으면 원래 함수를 그대로 반환 (래퍼 없음)
+    - cProfile은 스레드 단위라 함수 안에서 다른 스레드 풀에 넘긴 작업(리포트 문항 병렬 처리 등)은 대기 시간으로만 보임
+    """
+    if not ENABLED:
+        return lambda fn: fn
+
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            pr = _requested.get()
+            if pr is None or pr.started:
+                return fn(*args, **kwargs)
+            pr.started = True
+
+            prof = cProfile.Profile()
+            result, error = None, ""
+            t0 = time.perf_counter()
+            prof.enable()
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                prof.disable()
+                meta = ProfileMeta(
+                    profile_id=pr.profile_id,
+                    endpoint=endpoint,
+                    rcept_no=_rcept_no_of(args, kwargs, result),
+                    elapsed_s=round(time.perf_counter() - t0, 6),
+                    error=error,
+                )
+                try:
+                    profile_store.save(prof, meta)
+                except OSError:
+                    pass  # 저장 실패가 요청 자체를 깨지 않도록
+
+        return wrapper
+
+    return deco
@@ -0,0 +1,209 @@
+"""
+session_store.py
+
+목표:
+- "지금 어떤 공시로 질문하고 있는지"를 프로세스 전역 변수(CURRENT_*) 대신 세션별로 보관
+  -> 사용자 A의 load가 사용자 B의 /ask 대상 공시를 바꾸지 않음
+- session_id -> (rcept_no, report_nm, txt_path, viewer_url)
+- 메모리 LRU + 디스크(data/cache/sessions/<id>.json)
+  -> uvicorn 워커가 여러 개여도 같은 세션을 찾을 수 있음 (인덱스는 index_manager가 rcept_no로 디스크에서 복원)
+  - 디스크가 기준: 조회 때마다 파일 (inode, mtime)을 확인해서 다른 워커가 다시 load한 세션이면 다시 읽음
+  - 만료된 세션 파일은 put 때 SESSION_SWEEP_S마다 한 번씩 정리 (아무도 다시 안 읽는 세션이 쌓이지 않도록)
+
+환경변수:
+- SESSION_TTL      세션 유효기간(초, 기본 24시간, 마지막 load 기준)
+- SESSION_MAX      메모리에 들고 있을 최대 세션 수 (기본 10000, 넘으면 디스크에서 다시 읽음)
+- SESSION_SWEEP_S  만료 세션 파일 정리 주기(초, 기본 600)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+SESSION_DIR = ROOT / "data" / "cache" / "sessions"
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_\-]{16,64}$")
+
+
+@dataclass
+class DocSession:
+    session_id: str
+    rcept_no: str
+    report_nm: str = ""
+    txt_path: str = ""
+    viewer_url: str = ""
+    updated: float = field(default_factory=time.time)
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class SessionStore:
+    def __init__(
+        self,
+        session_dir: Path | None = SESSION_DIR,
+        *,
+        ttl: float = 24 * 3600,
+        max_items: int = 10_000,
+        sweep_interval: float = 600.0,
+    ):
+        self.session_dir = Path(session_dir) if session_dir else None
+        self.ttl = ttl
+        self.max_items = max_items
+        self.sweep_interval = sweep_interval
+
+        # session_id -> (세션, 읽거나 쓸 때의 디스크 파일 (inode, mtime_ns))
+        self._mem: OrderedDict[str, tuple[DocSession, tuple[int, int] | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._swept_at: float | None = None
+        self.swept = 0
+
+    def _disk_path(self, session_id: str) -> Path:
+        return self.session_dir / f"{session_id}.json"
+
+    def _disk_stamp(self, session_id: str) -> tuple[int, int] | None:
+        """
+        디스크 세션 파일 (inode, mtime_ns) (디스크를 안 쓰거나 파일이 없으면 None)
+        - put은 임시파일 -> replace라서 다시 쓰면 inode가 바뀜 (mtime 해상도가 거친 파일시스템 대비)
+        """
+        if self.session_dir is None:
+            return None
+        try:
+            st = self._disk_path(session_id).stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _expired(self, s: DocSession) -> bool:
+        return self.ttl > 0 and time.time() - s.updated > self.ttl
+
+    def _remember(self, s: DocSession, stamp: tuple[int, int] | None) -> None:
+        self._mem[s.session_id] = (s, stamp)
+        self._mem.move_to_end(s.session_id)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    @staticmethod
+    def valid_id(session_id: str | None) -> bool:
+        """파일 이름으로 쓰므로 형식이 맞는 id만 허용"""
+        return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+    # ---- 조회 / 저장 ----
+    def get(self, session_id: str | None) -> DocSession | None:
+        """없거나 만료됐거나 형식이 이상한 id면 None"""
+        if not self.valid_id(session_id):
+            return None
+
+        stamp = self._disk_stamp(session_id)
+        with self._lock:
+            cached = self._mem.get(session_id)
+            # 디스크 파일이 그대로면(또는 디스크를 못 쓰면) 메모리 것 사용
+            if cached is not None and (stamp is None or cached[1] == stamp):
+                s = cached[0]
+                if self._expired(s):
+                    del self._mem[session_id]
+                    return None
+                self._mem.move_to_end(session_id)
+                return s
+
+        # 다른 워커가 만들었거나 다시 load한 세션이므로 디스크에서 읽음
+        if stamp is None:
+            return None
+        try:
+            data = json.loads(self._disk_path(session_id).read_text(encoding="utf-8"))
+            s = DocSession(**{k: data[k] for k in DocSession.__dataclass_fields__ if k in data})
+        except (OSError, ValueError, TypeError):
+            return None
+        if self._expired(s):
+            self._disk_path(session_id).unlink(missing_ok=True)
+            with self._lock:
+                self._mem.pop(session_id, None)
+            return None
+
+        with self._lock:
+            self._remember(s, stamp)
+        return s
+
+    def put(self, s: DocSession) -> DocSession:
+        s.updated = time.time()
+
+        if self.session_dir is not None:
+            try:
+                self.session_dir.mkdir(parents=True, exist_ok=True)
+                path = self._disk_path(s.session_id)
+                # 워커 프로세스끼리 스레드 id가 겹칠 수 있으므로 프로세스/스레드별 이름
+                tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_text(json.dumps(asdict(s), ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, path)
+            except OSError:
+                # 디스크 저장은 best-effort (단일 워커면 메모리만으로 충분)
+                pass
+
+        # 지금 디스크에 있는 파일 기준으로 기억 (저장에 실패했으면 그 파일이 다시 바뀔 때까지 메모리 것 사용)
+        stamp = self._disk_stamp(s.session_id)
+        with self._lock:
+            self._remember(s, stamp)
+        self._maybe_sweep()
+        return s
+
+    # ---- 만료 세션 정리 ----
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._swept_at is not None and now - self._swept_at < self.sweep_interval:
+                return
+            self._swept_at = now
+        self.sweep()
+
+    def sweep(self) -> int:
+        """
+        만료된 세션(메모리 + 디스크 파일)과 남은 임시파일 삭제, 지운 파일 수
+        - 파일 mtime = 마지막 put 시각이라 JSON을 열지 않고 판단
+        """
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            for sid in [sid for sid, (s, _) in self._mem.items() if self._expired(s)]:
+                del self._mem[sid]
+        if self.session_dir is None or not self.session_dir.exists():
+            return 0
+
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for path in [*self.session_dir.glob("*.json"), *self.session_dir.glob("*.tmp")]:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass  # 다른 워커가 먼저 지웠거나 다시 썼음
+        with self._lock:
+            self.swept += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._mem),
+                "ttl": self.ttl,
+                "max_items": self.max_items,
+                "swept_files": self.swept,
+            }
+
+
+session_store = SessionStore(
+    ttl=float(os.getenv("SESSION_TTL", str(24 * 3600))),
+    max_items=int(os.getenv("SESSION_MAX", "10000")),
+    sweep_interval=float(os.getenv("SESSION_SWEEP_S", "600")),
+)
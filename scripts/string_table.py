@@ -0,0 +1,23 @@
+"""
+string_table.py
+
+문자열 리스트 <-> (utf-8 바이트 버퍼, 오프셋) 변환
+- npz에 pickle 없이 문자열 컬럼을 저장할 때 사용 (청크, 단어 사전, 회사명 등)
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def pack_strings(items: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list[str]:
+    raw = blob.tobytes()
+    return [raw[s:e].decode("utf-8") for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
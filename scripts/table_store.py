@@ -0,0 +1,306 @@
+"""
+table_store.py
+
+목표:
+- 공시 XML의 표(TABLE/TR/TD)를 "필드 단위 행 레코드"로 바꿔서 rcept_no별로 저장
+  -> 총발행금액 / 상환기일 / 신용평가등급 / 인수기관 같은 질문은
+     BM25 + LLM 없이 필드 조회 한 번으로 답할 수 있게
+- 텍스트 변환과 같은 패스에서 만듦 (xml_text.iter_text_lines의 on_table 콜백)
+
+표 해석 규칙:
+- "키 : | 값 | 키 : | 값" 처럼 ':'로 끝나는 셀이 있으면 -> (키, 값) 쌍
+- 그 외 2행 이상이면 첫 행을 헤더로 보고 -> 각 데이터 행 x 열 = 레코드
+- 헤더는 공백/괄호 단위 제거 후 FIELD_ALIASES로 대표 필드명에 맞춤 (회차별 발행총액 -> 총발행금액)
+- 값은 문자열 그대로 + 숫자(num, 없으면 NaN) + 날짜(YYYYMMDD, 없으면 "")
+
+저장 (npz, pickle 없음):
+- data/clean/<rcept_no>.fields.npz
+- 숫자 컬럼(table_id/row/num)은 배열, 문자열 컬럼은 string_table 버퍼 + 오프셋
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from scripts.string_table import pack_strings, unpack_strings
+from scripts.xml_text import RawTable
+
+
+FIELDS_FORMAT = 1
+FIELDS_SUFFIX = ".fields.npz"
+
+# 정규화된 헤더 -> 대표 필드명
+FIELD_ALIASES = {
+    "총발행금액": "총발행금액",
+    "발행금액": "총발행금액",
+    "발행총액": "총발행금액",
+    "회차별발행총액": "총발행금액",
+    "권면총액": "총발행금액",
+    "상환기일": "상환기일",
+    "만기일": "상환기일",
+    "만기": "상환기일",
+    "신용평가등급": "신용평가등급",
+    "평가등급": "신용평가등급",
+    "등급": "신용평가등급",
+    "신용평가기관": "신용평가기관",
+    "평가기관": "신용평가기관",
+    "인수기관": "인수기관",
+    "인수인": "인수기관",
+    "인수회사": "인수기관",
+    "주관회사": "인수기관",
+}
+
+TOTAL_LABELS = {"계", "합계", "소계", "총계", "합 계"}
+
+_STR_COLUMNS = ("field", "header", "value", "date", "unit", "section", "row_label")
+
+_NUM = re.compile(r"^\(?[-+]?\d[\d,]*(\.\d+)?\)?%?$")
+_DATE = re.compile(r"(\d{4})\s*[년.\-/]\s*(\d{1,2})\s*[월.\-/]\s*(\d{1,2})")
+
+
+
+
+# 1. 헤더 / 값 정규화
+def normalize_header(h: str) -> str:
+    """'비 율(%)' -> '비율', '총 발행금액 :' -> '총발행금액' -> 별칭이면 대표 필드명"""
+    h = re.sub(r"\([^)]*\)", "", h)
+    h = re.sub(r"[\s:：]", "", h)
+    return FIELD_ALIASES.get(h, h)
+
+
+def parse_number(s: str) -> float:
+    """'100,000' -> 100000, '(1,000)' -> -1000, '12.5%' -> 12.5, 숫자가 아니면 NaN"""
+    s = s.strip()
+    if not _NUM.match(s):
+        return float("nan")
+    neg = s.startswith("(") and s.endswith(")")
+    v = float(s.strip("()%").replace(",", ""))
+    return -v if neg else v
+
+
+def parse_date(s: str) -> str:
+    """'2026년 11월 27일' / '2026.11.27' -> '20261127', 날짜가 아니면 ''"""
+    m = _DATE.search(s)
+    if not m:
+        return ""
+    y, mo, d = m.groups()
+    return f"{y}{int(mo):02d}{int(d):02d}"
+
+
+@dataclass
+class FieldRecord:
+    table_id: int
+    row: int
+    field: str       # 대표 필드명 (예: 총발행금액)
+    header: str      # 원래 헤더 텍스트
+    value: str
+    num: float
+    date: str
+    unit: str
+    section: str
+    row_label: str   # 같은 행 첫 셀 (예: 신용평가등급 행의 "한국기업평가")
+
+    @property
+    def is_total(self) -> bool:
+        return self.row_label.replace(" ", "") in TOTAL_LABELS
+
+
+
+
+# 2. 표 -> 레코드
+def _record(table: RawTable, row: int, header: str, value: str, row_label: str) -> FieldRecord:
+    return FieldRecord(
+        table_id=table.table_id,
+        row=row,
+        field=normalize_header(header),
+        header=header,
+        value=value,
+        num=parse_number(value),
+        date=parse_date(value),
+        unit=table.unit,
+        section=table.section,
+        row_label=row_label,
+    )
+
+
+def table_records(table: RawTable) -> list[FieldRecord]:
+    rows = [r for r in table.rows if any(r)]
+    if not rows:
+        return []
+
+    # (1) "키 : | 값" 형태
+    if any(c.rstrip().endswith((":", "：")) for r in rows for c in r):
+        out = []
+        for i, r in enumerate(rows):
+            for j in range(len(r) - 1):
+                if r[j].rstrip().endswith((":", "：")) and r[j + 1]:
+                    out.append(_record(table, i, r[j], r[j + 1], ""))
+        return out
+
+    # (2) 첫 행 = 헤더
+    header = rows[0]
+    if len(rows) < 2 or not all(h and np.isnan(parse_number(h)) for h in header):
+        return []
+    out = []
+    for i, r in enumerate(rows[1:], 1):
+        for j, h in enumerate(header):
+            if j < len(r) and r[j]:
+                out.append(_record(table, i, h, r[j], r[0]))
+    return out
+
+
+
+
+# 3. 컬럼 저장소
+class FieldStore:
+    """
+    rcept_no 하나의 표 레코드 (컬럼 배열)
+    - _by_field: 대표 필드명 -> 레코드 번호 배열 (필드 조회는 dict 한 번)
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray | list]):
+        self.table_id = np.asarray(columns["table_id"], dtype=np.int32)
+        self.row = np.asarray(columns["row"], dtype=np.int32)
+        self.num = np.asarray(columns["num"], dtype=np.float64)
+        self.str_cols: dict[str, list[str]] = {k: list(columns[k]) for k in _STR_COLUMNS}
+
+        by_field: dict[str, list[int]] = {}
+        for i, f in enumerate(self.str_cols["field"]):
+            by_field.setdefault(f, []).append(i)
+        self._by_field = {f: np.asarray(ix, dtype=np.int32) for f, ix in by_field.items()}
+
+    @classmethod
+    def from_records(cls, records: list[FieldRecord]) -> "FieldStore":
+        cols: dict[str, list] = {k: [] for k in ("table_id", "row", "num", *_STR_COLUMNS)}
+        for r in records:
+            for k in cols:
+                cols[k].append(getattr(r, k))
+        return cls(cols)
+
+    @classmethod
+    def from_tables(cls, tables: list[RawTable]) -> "FieldStore":
+        return cls.from_records([rec for t in tables for rec in table_records(t)])
+
+    def __len__(self) -> int:
+        return len(self.table_id)
+
+    def fields(self) -> list[str]:
+        return sorted(self._by_field)
+
+    def record(self, i: int) -> FieldRecord:
+        return FieldRecord(
+            table_id=int(self.table_id[i]),
+            row=int(self.row[i]),
+            num=float(self.num[i]),
+            **{k: self.str_cols[k][i] for k in _STR_COLUMNS},
+        )
+
+    def lookup(self, field: str, *, include_totals: bool = False) -> list[FieldRecord]:
+        """대표 필드명(또는 별칭)으로 레코드 조회, 문서 순서"""
+        ix = self._by_field.get(normalize_header(field))
+        if ix is None:
+            return []
+        recs = [self.record(int(i)) for i in ix]
+        return recs if include_totals else [r for r in recs if not r.is_total]
+
+    def row_text(self, table_id: int, row: int) -> str:
+        """같은 표/행의 레코드를 '헤더: 값' 으로 이어 붙임 (근거 미리보기용)"""
+        ix = np.flatnonzero((self.table_id == table_id) & (self.row == row))
+        return " | ".join(f"{self.str_cols['header'][i].rstrip(' :：')}: {self.str_cols['value'][i]}" for i in ix)
+
+
+
+
+# 4. 저장 / 복원
+def fields_path(txt_path: str | Path) -> Path:
+    """data/clean/<rcept_no>.txt -> data/clean/<rcept_no>.fields.npz"""
+    txt_path = Path(txt_path)
+    return txt_path.with_name(txt_path.stem + FIELDS_SUFFIX)
+
+
+def save_field_store(path: Path, store: FieldStore) -> Path:
+    arrays = {
+        "meta": np.frombuffer(json.dumps({"format": FIELDS_FORMAT}).encode("utf-8"), dtype=np.uint8),
+        "table_id": store.table_id,
+        "row": store.row,
+        "num": store.num,
+    }
+    for k in _STR_COLUMNS:
+        arrays[f"{k}_blob"], arrays[f"{k}_offsets"] = pack_strings(store.str_cols[k])
+
+    # 같은 공시를 동시에 저장해도 임시파일이 겹치지 않도록 프로세스/스레드별 이름
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+def load_field_store(txt_path: str | Path) -> FieldStore | None:
+    """txt 옆의 필드 저장소 (없거나 포맷이 다르면 None)"""
+    path = fields_path(txt_path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.get("format") != FIELDS_FORMAT:
+                return None
+            cols = {k: z[k] for k in ("table_id", "row", "num")}
+            for k in _STR_COLUMNS:
+                cols[k] = unpack_strings(z[f"{k}_blob"], z[f"{k}_offsets"])
+    except (OSError, ValueError, KeyError):
+        return None
+    return FieldStore(cols)
+
+
+
+
+# 5. 필드 조회로 답하기
+def field_answer(store: FieldStore, field: str) -> tuple[str, list[dict]] | None:
+    """
+    대표 필드 하나로 답할 수 있으면 (answer, evidences), 아니면 None
+    - answer는 LLM 답변과 같은 형식 (Answer / Evidence / Citations), 근거 sid는 T1, T2 ...
+    """
+    recs = store.lookup(field)
+    if not recs:
+        return None
+
+    # 같은 값이 여러 표에 반복되므로 (예: 총 발행금액 / 회차별 발행총액) 처음 나온 표 기준
+    seen, uniq = set(), []
+    for r in recs:
+        if r.table_id == recs[0].table_id and (r.row_label, r.value) not in seen:
+            seen.add((r.row_label, r.value))
+            uniq.append(r)
+
+    def fmt(r: FieldRecord) -> str:
+        v = r.value
+        if r.unit and not np.isnan(r.num):
+            v += f" (단위: {r.unit})"
+        # 신용평가등급처럼 값이 여러 개면 행 라벨(평가기관)을 붙여서 구분
+        if len(uniq) > 1 and r.row_label and r.row_label not in (r.value, r.header):
+            v = f"{r.row_label}: {v}"
+        return v
+
+    evidences = [
+        {
+            "sid": f"T{rank}",
+            "chunk_id": -1,
+            "table_id": r.table_id,
+            "row": r.row,
+            "score": 1.0,
+            "preview": (f"[{r.section}] " if r.section else "") + store.row_text(r.table_id, r.row),
+        }
+        for rank, r in enumerate(uniq, 1)
+    ]
+    lines = ["Answer:", f"- {normalize_header(field)}: " + ", ".join(fmt(r) for r in uniq), "Evidence:"]
+    lines += [f"- [{ev['sid']}] table={ev['table_id']} row={ev['row']}: {ev['preview']}" for ev in evidences]
+    lines.append("Citations: " + " ".join(f"[{ev['sid']}]" for ev in evidences))
+    return "\n".join(lines), evidences
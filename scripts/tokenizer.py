@@ -0,0 +1,256 @@
+"""
+tokenizer.py
+
+목표:
+- 공시용 토큰화(normalize_fin_terms + tokenize_ko_fin)를 한 곳으로 (rag / report / 04 스크립트 / 인덱스가 같이 사용)
+- 정규식은 모듈 로드 때 한 번만 컴파일, 불용어 집합도 한 번만 생성
+- 용어 정규화("신용평가 등급" -> "신용평가등급" ...)는 str.replace 체인 대신 정규식 한 번(single pass)
+- 토큰 문자열 대신 정수 id(Vocabulary에 intern)로도 뽑을 수 있음
+  -> BM25 빌드는 청크별 문자열 토큰 리스트를 만들지 않고 (ids, offsets) CSR 배열로 바로 만듦
+- batch API: 청크 수천 개를 한 번에, TOKENIZE_WORKERS>1 이면 프로세스 풀로 나눠서
+- 정규화 규칙은 금융 용어 사전(data/lexicon/fin_lexicon.yaml)의 normalize 섹션에서 시작할 때 한 번 읽음
+  (질문 확장 규칙은 scripts/lexicon.py)
+
+토큰화 규칙 (기존 tokenize_ko_fin과 같은 결과):
+1) 금융 용어 띄어쓰기 정규화
+2) 소문자화, 숫자 사이 콤마 제거 (100,000 -> 100000)
+3) 한글/영문/숫자 덩어리 추출
+4) 불용어 / 1글자 토큰 제거
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+import yaml
+
+
+ROOT = Path(__file__).resolve().parents[1]
+LEXICON_PATH = Path(os.getenv("LEXICON_PATH") or ROOT / "data" / "lexicon" / "fin_lexicon.yaml")
+
+
+def load_fin_term_replacements(path: Path = LEXICON_PATH) -> dict[str, str]:
+    """사전 파일의 normalize 섹션 (위에서부터 순서대로 str.replace 하던 규칙)"""
+    try:
+        data = yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}
+    except (OSError, yaml.YAMLError) as e:
+        warnings.warn(f"금융 용어 사전을 읽지 못해 용어 정규화 없이 토큰화합니다: {path} ({e})")
+        return {}
+    return {str(a): str(b) for a, b in (data.get("normalize") or {}).items()}
+
+
+# 문서 인덱스와 질문이 같은 규칙을 써야 하므로 프로세스 시작 때 한 번만 읽음
+# (바꾸면 index_store.tokenizer_version이 바뀌어 인덱스가 다시 빌드됨)
+FIN_TERM_REPLACEMENTS = load_fin_term_replacements()
+
+STOPWORDS = frozenset({"입니다", "합니다", "관한", "사항", "보고서", "주식회사", "회사", "회차"})
+
+MIN_TOKEN_LEN = 2
+
+# 청크가 이 개수보다 적으면 프로세스 풀을 쓰지 않음 (풀에 넘기는 비용이 더 큼)
+POOL_MIN_TEXTS = 2000
+POOL_BATCH = 500
+
+_DIGIT_COMMA = re.compile(r"(\d),(\d)")
+
+
+
+
+# 1. 용어 정규화 (single pass)
+def _compile_replacements(replacements: dict[str, str]) -> tuple[re.Pattern, dict[str, str]]:
+    """
+    순차 치환 규칙 -> 정규식 1개 + (매칭 문자열 -> 결과) 표
+    - 앞 규칙의 결과가 뒤 규칙의 패턴을 새로 만드는 경우('총 발행 금액' -> '총 발행금액' -> '총발행금액')도
+      같은 결과가 나오도록, 그런 입력을 패턴으로 미리 추가해둠
+    - 긴 패턴 우선으로 매칭
+    """
+
+    def sequential(s: str) -> str:
+        for a, b in replacements.items():
+            s = s.replace(a, b)
+        return s
+
+    items = list(replacements.items())
+    patterns = {a for a, _ in items}
+    for j, (a_j, _) in enumerate(items):
+        for a_i, b_i in items[:j]:
+            if b_i in a_j:
+                patterns.add(a_j.replace(b_i, a_i))
+
+    table = {p: sequential(p) for p in patterns}
+    if not table:
+        return re.compile(r"(?!)"), table  # 규칙이 없으면 아무것도 매칭하지 않음
+    alternation = "|".join(re.escape(p) for p in sorted(table, key=len, reverse=True))
+    return re.compile(alternation), table
+
+
+
+
+# 2. 단어 사전 (token-id intern)
+class Vocabulary:
+    """
+    단어 <-> 정수 id
+    - ids: 단어 -> id (삽입 순서 = id 순서, SparseBM25.vocab으로 그대로 씀)
+    - terms: id -> 단어
+    """
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.ids: dict[str, int] = {}
+        self.terms: list[str] = []
+        for t in terms:
+            self.intern(t)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.ids
+
+    def intern(self, term: str) -> int:
+        tid = self.ids.get(term)
+        if tid is None:
+            tid = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return tid
+
+    def lookup(self, tokens: Iterable[str]) -> list[int]:
+        """사전에 있는 단어만 id로 (새 단어는 추가하지 않음, 질의용)"""
+        ids = self.ids
+        return [ids[t] for t in tokens if t in ids]
+
+
+
+
+# 3. 토크나이저
+class Tokenizer:
+    def __init__(
+        self,
+        replacements: dict[str, str] = FIN_TERM_REPLACEMENTS,
+        stopwords: frozenset[str] = STOPWORDS,
+        min_len: int = MIN_TOKEN_LEN,
+    ):
+        self.replacements = dict(replacements)
+        self.stopwords = frozenset(stopwords)
+        self.min_len = min_len
+        self._term_re, self._term_table = _compile_replacements(self.replacements)
+        # 덩어리가 항상 최대 길이로 잡히므로 {min_len,}로 뽑는 것 = 뽑은 뒤 짧은 토큰을 거르는 것
+        self._token_re = re.compile(rf"[가-힣]{{{min_len},}}|[a-zA-Z]{{{min_len},}}|\d{{{min_len},}}")
+
+    def normalize(self, s: str) -> str:
+        return self._term_re.sub(lambda m: self._term_table[m.group()], s)
+
+    def tokenize(self, s: str) -> list[str]:
+        s = self.normalize(s).lower()
+        if "," in s:
+            s = _DIGIT_COMMA.sub(_join_digits, s)  # 100,000 -> 100000
+        stop = self.stopwords
+        return [t for t in self._token_re.findall(s) if t not in stop]
+
+    def encode(self, s: str, vocab: Vocabulary, *, add: bool = True) -> list[int]:
+        """토큰 id 리스트 (add=False면 사전에 없는 단어는 버림)"""
+        if not add:
+            return vocab.lookup(self.tokenize(s))
+        intern = vocab.intern
+        return [intern(t) for t in self.tokenize(s)]
+
+    # ---- batch ----
+    def tokenize_batch(self, texts: Sequence[str], *, workers: int | None = None) -> list[list[str]]:
+        vocab = Vocabulary()
+        ids, offsets = self.encode_batch(texts, vocab, workers=workers)
+        terms = vocab.terms
+        return [[terms[i] for i in ids[s:e]] for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def encode_batch(
+        self,
+        texts: Sequence[str],
+        vocab: Vocabulary,
+        *,
+        workers: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        텍스트 여러 개 -> (ids, offsets) CSR 배열
+        - 텍스트 i의 토큰 id = ids[offsets[i]:offsets[i+1]]
+        - 새 단어는 처음 나온 순서대로 vocab에 추가 (프로세스 풀을 써도 순서 같음)
+        - workers: None이면 TOKENIZE_WORKERS 환경변수, 1 이하면 현재 프로세스에서
+        """
+        workers = default_workers() if workers is None else workers
+        if workers > 1 and len(texts) >= POOL_MIN_TEXTS:
+            # 각 프로세스는 자기 배치의 로컬 사전 + 로컬 id만 돌려주고, 전역 id로 바꾸는 건 여기서
+            batches = [texts[i:i + POOL_BATCH] for i in range(0, len(texts), POOL_BATCH)]
+            parts = list(_pool(workers).map(partial(_encode_local, self), batches))
+        else:
+            parts = [_encode_local(self, texts)]
+
+        all_ids, all_lens = [], []
+        for terms, ids, lens in parts:
+            local_to_global = np.fromiter((vocab.intern(t) for t in terms), dtype=np.int32, count=len(terms))
+            all_ids.append(local_to_global[ids])
+            all_lens.append(lens)
+
+        lens = np.concatenate(all_lens) if all_lens else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        ids = np.concatenate(all_ids) if all_ids else np.zeros(0, dtype=np.int32)
+        return ids, offsets
+
+
+def _join_digits(m: re.Match) -> str:
+    # r"\1\2" 템플릿 치환보다 빠름
+    return m.group(1) + m.group(2)
+
+
+def _encode_local(tokenizer: Tokenizer, texts: Sequence[str]) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """배치 하나 -> (로컬 사전 단어들, 로컬 id 배열, 텍스트별 토큰 수)"""
+    vocab = Vocabulary()
+    intern = vocab.intern
+    ids: list[int] = []
+    lens = np.zeros(len(texts), dtype=np.int64)
+    for i, s in enumerate(texts):
+        tokens = tokenizer.tokenize(s)
+        lens[i] = len(tokens)
+        ids.extend(intern(t) for t in tokens)
+    return vocab.terms, np.asarray(ids, dtype=np.int32), lens
+
+
+def default_workers() -> int:
+    return int(os.getenv("TOKENIZE_WORKERS", "0"))
+
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    """프로세스 풀은 한 번 만들어서 재사용 (bulk ingest처럼 문서마다 빌드할 때 풀 생성 비용 반복 방지)"""
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ProcessPoolExecutor(max_workers=workers)
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+
+
+# 4. 공용 인스턴스 + 기존 함수 이름
+tokenizer = Tokenizer()
+
+
+def normalize_fin_terms(s: str) -> str:
+    """질문/문서에서 표현이 달라도 같은 의미로 맞추기. 예: '신용평가 등급' == '신용평가등급'"""
+    return tokenizer.normalize(s)
+
+
+def tokenize_ko_fin(s: str) -> list[str]:
+    return tokenizer.tokenize(s)
@@ -0,0 +1,184 @@
+"""
+xml_text.py
+
+목표:
+- DART document.xml -> 검색용 텍스트 (태그/속성 제거)
+- etree.parse + //text() 처럼 트리 전체를 올리지 않고 iterparse로 흘려보내면서
+  처리가 끝난 노드는 바로 비움 -> 대형 사업보고서도 메모리 일정
+- 구조는 가벼운 마커로만 남김
+  - 문서명:         "# 증권발행실적보고서"
+  - 섹션 제목:      "## Ⅰ. 발행개요" (SECTION-1), "### 1. 기업개요" (SECTION-2) ...
+  - 표 한 행:       "인수기관 | 인수수량 | 인수금액" (셀 = " | ", 표 앞뒤는 빈 줄)
+  - 문단(P) 등:     한 줄
+- 같은 패스에서 표(TABLE)는 행 리스트로도 넘겨줌 (on_table 콜백 -> scripts/table_store.py)
+
+DART 태그 참고:
+- DOCUMENT > BODY > SECTION-1 > TITLE / P / TABLE > TBODY > TR > TD|TH|TE|TU
+- 셀 안에 P/SPAN이 또 들어 있는 경우가 많아서, 셀/문단은 바깥쪽 블록 하나로만 모아서 출력
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+from lxml import etree
+
+
+CELL_TAGS = {"TD", "TH", "TE", "TU"}
+LINE_TAGS = {"P", "TITLE", "COVER-TITLE"}
+BLOCK_TAGS = CELL_TAGS | LINE_TAGS
+
+CELL_SEP = " | "
+
+_UNIT = re.compile(r"단위\s*[:：]\s*([^)）]+)")
+
+
+@dataclass
+class RawTable:
+    """표 하나 (셀 텍스트 그대로, 헤더 판별/타입 변환은 table_store에서)"""
+    table_id: int
+    section: str          # "Ⅰ. 발행개요 > 2. 발행 개요"
+    unit: str             # 표 바로 앞 "(단위 : 백만원)" 의 "백만원"
+    rows: list[list[str]] = field(default_factory=list)
+
+
+def _clean(s: str) -> str:
+    return " ".join(s.split())
+
+
+def _block_text(el) -> str:
+    if len(el) == 0:
+        return _clean(el.text or "")
+    for br in el.iter("BR"):
+        br.text = " "  # 줄바꿈 태그 앞뒤 글자가 붙지 않게
+    return _clean("".join(el.itertext()))
+
+
+def iter_xml_lines(
+    source: str | Path | BinaryIO,
+    on_table: Callable[[RawTable], None] | None = None,
+) -> Iterator[str]:
+    """
+    XML을 한 번 훑으면서 텍스트 줄을 순서대로 내보냄
+    - 깨진 XML(정의 안 된 엔티티 등)은 recover로 최대한 읽음
+    - 블록(P/TITLE/셀) 밖에 있는 텍스트는 자식이 없는 노드(DOCUMENT-NAME, COMPANY-NAME 등)만 한 줄로 출력
+    - on_table이 있으면 표가 끝날 때마다 RawTable로 호출 (셀 안에 중첩된 표는 셀 텍스트로만)
+    """
+    if isinstance(source, Path):
+        source = str(source)
+
+    section_depth = 0
+    block_depth = 0     # 열려 있는 블록 수 (셀 안의 P처럼 중첩되면 바깥 것만 출력)
+    row: list[str] | None = None
+    table: RawTable | None = None
+    table_depth = 0
+    n_tables = 0
+    titles: list[str] = []  # 현재 섹션 제목 경로
+    unit = ""
+
+    context = etree.iterparse(source, events=("start", "end"), recover=True, huge_tree=True)
+    for event, el in context:
+        tag = el.tag
+        if tag.__class__ is not str:
+            tag = ""  # 주석/처리명령 노드
+
+        if event == "start":
+            if tag.startswith("SECTION-"):
+                section_depth += 1
+            elif tag in BLOCK_TAGS:
+                block_depth += 1
+            elif tag == "TR" and block_depth == 0:
+                row = []
+            elif tag == "TABLE" and block_depth == 0:
+                table_depth += 1
+                if on_table is not None and table_depth == 1:
+                    table = RawTable(n_tables, " > ".join(titles), unit)
+                    n_tables += 1
+                yield ""
+            continue
+
+        # ---- end ----
+        if tag in BLOCK_TAGS:
+            block_depth -= 1
+            if block_depth > 0:
+                continue  # 바깥 블록이 itertext로 같이 가져감
+
+            text = _block_text(el)
+            m = _UNIT.search(text) if "단위" in text else None
+            if m:
+                unit = m.group(1).strip()
+
+            if tag in CELL_TAGS:
+                if row is not None:
+                    row.append(text)
+                elif text:
+                    yield text
+            elif text:
+                if tag == "TITLE":
+                    del titles[max(section_depth, 1) - 1:]
+                    titles.append(text)
+                    unit = ""
+                    yield "#" * (max(section_depth, 1) + 1) + " " + text
+                elif tag == "COVER-TITLE":
+                    yield "# " + text
+                else:
+                    yield text
+
+        elif block_depth > 0:
+            continue  # 블록 안의 SPAN 등은 블록이 끝날 때 처리
+
+        elif tag == "TR":
+            if row is not None and any(row):
+                yield CELL_SEP.join(row)
+                if table is not None:
+                    table.rows.append(row)
+            row = None
+
+        elif tag == "TABLE":
+            table_depth -= 1
+            if table is not None and table_depth == 0:
+                if table.rows:
+                    on_table(table)
+                table = None
+            yield ""
+
+        elif tag.startswith("SECTION-"):
+            section_depth -= 1
+            yield ""
+
+        elif len(el) == 0 and el.text and el.text.strip():
+            text = _clean(el.text)
+            yield "# " + text if tag == "DOCUMENT-NAME" else text
+
+        # 처리 끝난 노드와 앞 형제들을 비워서 메모리를 일정하게 유지
+        el.clear(keep_tail=True)
+        parent = el.getparent()
+        if parent is not None:
+            while el.getprevious() is not None:
+                del parent[0]
+
+    del context
+
+
+def iter_text_lines(
+    source: str | Path | BinaryIO,
+    on_table: Callable[[RawTable], None] | None = None,
+) -> Iterator[str]:
+    """iter_xml_lines + 연속 빈 줄 / 앞쪽 빈 줄 정리 (파일로 쓸 때 사용)"""
+    blank = True
+    for line in iter_xml_lines(source, on_table):
+        if not line:
+            if blank:
+                continue
+            blank = True
+        else:
+            blank = False
+        yield line
+
+
+def xml_to_text(source: str | Path | BinaryIO) -> str:
+    """iter_xml_lines 결과를 하나의 텍스트로 (빈 줄 연속은 1개로)"""
+    return "\n".join(iter_text_lines(source))